@@ -1,10 +1,19 @@
+import copy
 import logging
 
 from argparse import Namespace
 from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait
 from tqdm import tqdm
 
-from ..utils.log import train_ckpt, move_log_file, construct_task_folder
+from ..memories.base_mem import DeferredWriteMem, ReadOnlyMem, apply_memory_writes
+from ..reasoning.base_lm_reasoning import BaseLMReasoning
+from ..utils.log import (
+    train_ckpt, move_log_file, construct_task_folder, extra_log_path, setup_extra_file_handler, remove_file_handler
+)
+from ..utils.task_scope import current_task_scope, task_scope, run_in_task_scope
+from ..utils.tracing import enable_tracing
+from ..utils.ckpt_writer import enable_ckpt_writer, get_ckpt_writer
 
 logger = logging.getLogger("logger")
 
@@ -29,6 +38,10 @@ class BaseAgent:
         debug_mode (bool): Flag indicating if the agent is in debug mode.
         verbose (bool): Flag indicating if verbose logging is enabled.
         task (str): Description of the current task.
+        train_concurrency (int): Number of training rollouts run concurrently (see parallel_train_loop).
+        attr_per_worker (list): Attributes copied per concurrent rollout, as they hold per-task state.
+        env_interface_factory (callable): Optional, builds an env_interface per concurrent rollout.
+            Defaults to a shallow copy of env_interface.
         procedural_mem (object): Procedural memory module.
         semantic_mem (object): Semantic memory module.
         episodic_mem (object): Episodic memory module.
@@ -36,8 +49,10 @@ class BaseAgent:
     Methods:
         print_doc_count(): Prints the document count from each memory module if verbose logging is enabled.
         reset(full_task): Resets the agent's state for a new task.
+        set_memories_read_only(): Drops writes to the long term memories, eg for evaluation workers.
         train_step(): Abstract method for implementing a single training step.
-        train_loop(): Abstract method for implementing the training loop.
+        train_loop(): Runs train_step for each training iteration, with checkpointing.
+        parallel_train_loop(): As train_loop, with train_concurrency rollouts in flight.
     """
     def __init__(self, args: Namespace, components: Dict[str, Any], handler: Any):
         # misc args
@@ -49,6 +64,7 @@ class BaseAgent:
         # params
         self.max_task_attempts = args.max_attempts_per_task
         self.max_train_iter = args.max_train_iter
+        self.train_concurrency = getattr(args, 'train_concurrency', 1)
 
         # checkpointing
         self.task_id = None
@@ -61,10 +77,15 @@ class BaseAgent:
         self.eval_later = args.eval_later
         self.use_public_tests = args.use_public_tests
         self.env_interface = None
+        self.env_interface_factory = None
 
         # debug n print
         self.debug_mode = args.debug_mode
         self.verbose = args.verbose
+        if getattr(args, 'trace', False):
+            enable_tracing()
+        if getattr(args, 'async_ckpt', False):
+            enable_ckpt_writer()
 
         # holds the full task details esp those relevant for eval in env
         self.full_task = {}
@@ -73,6 +94,7 @@ class BaseAgent:
         Working Memory: short term memory reflecting current circumstances
         """
         self.task = ''
+        self.attr_per_worker = ['env_interface', 'handler']
 
         """
         Long term memory modules
@@ -97,6 +119,15 @@ class BaseAgent:
             if mem:
                 mem.print_doc_count()
 
+    def set_memories_read_only(self):
+        """
+        Wraps the long term memories so that their writes are dropped, eg for evaluation workers sharing them.
+        """
+        for attr in ['procedural_mem', 'semantic_mem', 'episodic_mem']:
+            mem = getattr(self, attr)
+            if mem is not None and not isinstance(mem, ReadOnlyMem):
+                setattr(self, attr, ReadOnlyMem(mem))
+
     def reset(self, full_task):
         """
         Resets the agent's state for a new task, including task ID and description,
@@ -124,7 +155,57 @@ class BaseAgent:
         """
         pass
 
+    def worker_view(self, train_iter, write_log):
+        """
+        Shallow copy of the agent to run one train step concurrently with others.
+
+        Per-task state (attr_per_worker) is copied, and the LMs of copied reasoning modules report to the view's
+        handler. Long term memories are shared for reads but their writes are recorded to write_log, to be
+        applied by the caller.
+
+        Args:
+            train_iter (int): The training iteration the view runs.
+            write_log (list): Receives the memory writes of the view.
+
+        Returns:
+            BaseAgent: The view.
+        """
+        view = copy.copy(self)
+        for attr in self.attr_per_worker:
+            setattr(view, attr, copy.copy(getattr(self, attr)))
+        for attr in self.attr_per_worker:
+            module = getattr(view, attr)
+            if isinstance(module, BaseLMReasoning):
+                module.rebind_callback(self.handler, view.handler)
+        if self.env_interface_factory is not None:
+            view.env_interface = self.env_interface_factory()
+        for attr in ['procedural_mem', 'semantic_mem', 'episodic_mem']:
+            mem = getattr(self, attr)
+            if mem is not None:
+                setattr(view, attr, DeferredWriteMem(mem, write_log))
+        view.train_iter = train_iter
+        view.task_id = train_iter
+        view.handler.task_id = train_iter
+        return view
+
+    def end_train_step(self):
+        """
+        Postprocessing after a train step: moves the task log and checkpoints
+        """
+        task_folder = construct_task_folder(self.result_dir, 'train', self.task_id)
+        move_log_file(f"{task_folder}/logfile.log", self.result_dir, scope=current_task_scope())
+
+        self.train_iter += 1
+        train_ckpt(self)
+        if self.verbose:
+            self.print_doc_count()
+
     def train_loop(self):
+        if self.train_concurrency > 1:
+            self.parallel_train_loop()
+            get_ckpt_writer().flush()
+            return
+
         for i in tqdm(range(self.train_iter, self.max_train_iter), leave=False):
             logger.info(f'[train iter]: {self.train_iter}/{self.max_train_iter} \n')
 
@@ -135,11 +216,51 @@ class BaseAgent:
             # fill in your train step
             self.train_step()
 
-            # postprocessing
-            task_folder = construct_task_folder(self.result_dir, 'train', self.task_id)
-            move_log_file(f"{task_folder}/logfile.log", self.result_dir)
+            self.end_train_step()
+        # checkpoints are complete on disk once training returns, eg for evaluation
+        get_ckpt_writer().flush()
+
+    def parallel_train_loop(self):
+        """
+        Runs the train steps in rounds of train_concurrency steps, each round concurrently in worker threads on
+        worker_views of the agent, so that LM waits overlap (the LM scheduler still bounds in-flight requests).
+
+        This thread is the single memory writer: once a round is done, its steps are committed strictly in
+        train_iter order, applying each step's memory writes then checkpointing, as train_loop would. So every
+        step sees the memory of exactly the previous rounds, whatever order the workers finish in, and runs are
+        reproducible (and hit the LM cache) given the same train_concurrency.
+
+        Each step runs and is committed in its own task scope (its train_iter, see utils/task_scope.py), so its
+        extra log (extra_log_{train_iter}.log, moved to its logfile.log on commit), timings and LM metrics hold
+        that step only.
+        """
+        with ThreadPoolExecutor(max_workers=self.train_concurrency) as executor, \
+                tqdm(total=self.max_train_iter - self.train_iter, leave=False) as pbar:
+            while self.train_iter < self.max_train_iter:
+                steps = []
+                round_end = min(self.max_train_iter, self.train_iter + self.train_concurrency)
+                for train_iter in range(self.train_iter, round_end):
+                    setup_extra_file_handler(logger, extra_log_path(self.result_dir, train_iter), scope=train_iter)
+                    with task_scope(train_iter):
+                        logger.info(f'[train iter]: {train_iter}/{self.max_train_iter} \n')
+                        write_log = []
+                        view = self.worker_view(train_iter, write_log)
+                    future = executor.submit(run_in_task_scope, train_iter, view.train_step)
+                    steps.append((train_iter, view, write_log, future))
+                wait([future for _, _, _, future in steps])
 
-            self.train_iter += 1
-            train_ckpt(self)
-            if self.verbose:
-                self.print_doc_count()
+                try:
+                    for train_iter, view, write_log, future in steps:
+                        # an error stops the loop after committing the steps before it, as train_loop would
+                        future.result()
+                        with task_scope(train_iter):
+                            apply_memory_writes(write_log)
+                            for attr in self.attr_to_save:
+                                if attr != 'train_iter':
+                                    setattr(self, attr, getattr(view, attr))
+                            self.end_train_step()
+                        pbar.update(1)
+                finally:
+                    # steps left uncommitted by an error keep their extra log file
+                    for train_iter, _, _, _ in steps:
+                        remove_file_handler(logger, extra_log_path(self.result_dir, train_iter))
@@ -0,0 +1,168 @@
+"""
+Batched evaluation: runs agent.test_one over a test set in worker processes and aggregates the results.
+
+Memory is read-only at test time, so every worker opens the same checkpointed memories (resume) and wraps them
+with ReadOnlyMem, which drops the writes a rollout still makes (eg finishing an episode). Tasks are handed out
+one at a time, so a slow task does not hold up a whole shard. TaskLogger writes each task's outputs to
+{result_dir}/test_outputs/{task_id} as usual, and the driver collects them into test_results.json and
+test_summary.json. Workers send their LM metrics back with each result, and the driver merges them into
+lm_metrics.json, which the workers would otherwise each overwrite with their own.
+
+The agent is built once per worker by agent_factory, which must be picklable (eg a module level fn or a
+functools.partial of one), since workers are spawned rather than forked:
+
+    results = batch_evaluate(functools.partial(build_agent, args), test_tasks, num_workers=8)
+"""
+import logging
+import multiprocessing
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from ..utils import dump_json, load_json
+from ..utils.ckpt_writer import get_ckpt_writer
+from ..utils.lm_metrics import get_lm_metrics
+
+logger = logging.getLogger("logger")
+
+# the agent of a worker process, built once by _init_worker
+_worker_agent = None
+
+"""
+helper fns
+"""
+
+
+def prepare_eval_agent(agent):
+    agent.train = False
+    agent.set_memories_read_only()
+    return agent
+
+
+def _init_worker(agent_factory):
+    global _worker_agent
+    _worker_agent = prepare_eval_agent(agent_factory())
+
+
+def eval_one(agent, full_task):
+    """
+    Runs test_one on a task, catching errors so that one task cannot take down a worker.
+
+    Returns:
+        dict: task_id, success and error (None unless test_one raised).
+    """
+    success, error = False, None
+    try:
+        success, _ = agent.test_one(full_task)
+    except Exception as e:
+        logger.error(f"[task_id]: {full_task['task_id']} eval failed: {repr(e)}")
+        error = repr(e)
+    return {'task_id': full_task['task_id'], 'success': bool(success), 'error': error}
+
+
+def _eval_in_worker(full_task):
+    result = eval_one(_worker_agent, full_task)
+    result['worker'] = os.getpid()
+    # the LM metrics of the task (and any made since the worker's last task), merged by the driver
+    result['lm_stats'] = get_lm_metrics().take_run_stats()
+    return result
+
+
+def merge_worker_lm_metrics(results, result_dir):
+    """
+    Merges the LM metrics the workers sent with their results into this process's run metrics, and writes them
+    to lm_metrics.json.
+    """
+    metrics = get_lm_metrics()
+    for result in results:
+        metrics.merge_run_stats(result.pop('lm_stats'))
+    dump_json(metrics.run_metrics(), f"{result_dir}/lm_metrics.json", indent=4)
+
+
+def with_task_ids(tasks):
+    """
+    Copies of the tasks, with their index as task_id where missing so that task folders stay distinct.
+    """
+    return [{**full_task, 'task_id': full_task.get('task_id', str(idx))} for idx, full_task in enumerate(tasks)]
+
+
+def aggregate_results(results, result_dir, wall_time=None, num_workers=1):
+    """
+    Attaches each task's final output (the output.json TaskLogger wrote) to its result, and writes
+    test_results.json (per task, in test set order) and test_summary.json to result_dir.
+
+    Args:
+        results (list): Per task results of eval_one, in test set order.
+        result_dir (str): The result directory the agents wrote to.
+        wall_time (float, optional): Seconds the evaluation took.
+        num_workers (int): Number of worker processes.
+
+    Returns:
+        dict: The summary.
+    """
+    for result in results:
+        output_file = f"{result_dir}/test_outputs/{str(result['task_id']).replace('/', '_')}/output.json"
+        result['output'] = load_json(output_file) if os.path.isfile(output_file) else {}
+
+    num_success = sum(result['success'] for result in results)
+    summary = {
+        'num_tasks': len(results),
+        'num_success': num_success,
+        'pass_rate': num_success / len(results) if results else 0.0,
+        'num_errors': sum(result['error'] is not None for result in results),
+        'num_workers': num_workers,
+        'wall_time_s': wall_time,
+    }
+    dump_json(results, f"{result_dir}/test_results.json", indent=4)
+    dump_json(summary, f"{result_dir}/test_summary.json", indent=4)
+    return summary
+
+
+"""
+driver
+"""
+
+
+def batch_evaluate(agent_factory, tasks, num_workers=1, result_dir=None):
+    """
+    Evaluates the agent on every task, in num_workers processes each with its own agent on shared read-only
+    memories. With num_workers=1 the tasks run in this process.
+
+    Args:
+        agent_factory (callable): Builds the agent, with its env_interface attached. Picklable.
+        tasks (list): Full tasks, as passed to test_one.
+        num_workers (int): Number of worker processes.
+        result_dir (str, optional): Where to write the aggregated results, defaults to the agent's result_dir.
+
+    Returns:
+        tuple: (results, summary), results being per task dicts in the order of tasks.
+    """
+    # workers read the memories from disk
+    get_ckpt_writer().flush()
+    tasks = with_task_ids(tasks)
+    start = time.perf_counter()
+    if num_workers <= 1:
+        agent = prepare_eval_agent(agent_factory())
+        result_dir = result_dir or agent.result_dir
+        results = [eval_one(agent, full_task) for full_task in tqdm(tasks, leave=False)]
+    else:
+        if result_dir is None:
+            raise ValueError("result_dir is required with several workers")
+        # spawn: forked workers would inherit the parent's db connections and background threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=context, initializer=_init_worker, initargs=(agent_factory,)
+        ) as executor:
+            results = list(tqdm(executor.map(_eval_in_worker, tasks), total=len(tasks), leave=False))
+        merge_worker_lm_metrics(results, result_dir)
+    wall_time = time.perf_counter() - start
+
+    summary = aggregate_results(results, result_dir, wall_time, num_workers)
+    logger.info(
+        f"[eval] {summary['num_success']}/{summary['num_tasks']} passed in {wall_time:.1f}s "
+        f"with {num_workers} workers"
+    )
+    return results, summary
@@ -0,0 +1,17 @@
+"""
+Benchmark suites (asv style, see harness.py) for the memory, db and loader hot paths.
+
+Run from the folder containing the cognitive_base package:
+    python -m cognitive_base.benchmarks --output benchmark_results/latest.json
+    python -m cognitive_base.benchmarks --suites nx_db procedural_mem --max_param 10000
+
+Results are written as JSON tagged with the git commit, so runs can be compared across commits.
+Embeddings default to the local fake provider (EMBEDDING_PROVIDER=fake) so no API calls are made.
+"""
+# suite name -> (module, suite classes), imported lazily so a missing optional dependency only skips its suite
+SUITES = {
+    'vector_db': ('bench_vector_db', ['ChromaVectorDBSuite']),
+    'book_loader': ('bench_book_loader', ['BookLoaderIngest']),
+    'procedural_mem': ('bench_procedural_mem', ['ProceduralMemRetrieveByScore']),
+    'nx_db': ('bench_nx_db', ['NxDbLookups', 'NxDbScans', 'NxDbBatchInsert']),
+}
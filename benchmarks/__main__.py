@@ -0,0 +1,50 @@
+import argparse
+import importlib
+import logging
+import os
+
+from . import SUITES
+from .harness import run_suite, write_results
+
+logger = logging.getLogger("logger")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run cognitive_base benchmarks and write the results as JSON')
+    parser.add_argument("--suites", nargs='*', default=list(SUITES), choices=list(SUITES))
+    parser.add_argument("--filter", type=str, default='', help="only run benchmarks whose name contains this")
+    parser.add_argument(
+        "--max_param", type=int, default=None, help="skip cases with a size param above this, eg 10000"
+    )
+    parser.add_argument("--repeat", type=int, default=None, help="override the number of samples per benchmark")
+    parser.add_argument("--output", type=str, default='benchmark_results/latest.json')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    # time the dbs, not the embedding API
+    os.environ.setdefault('EMBEDDING_PROVIDER', 'fake')
+    os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+    results = []
+    skipped = {}
+    for suite_name in args.suites:
+        module_name, class_names = SUITES[suite_name]
+        try:
+            module = importlib.import_module(f'.{module_name}', __package__)
+            for class_name in class_names:
+                results.extend(run_suite(
+                    getattr(module, class_name), name_filter=args.filter, max_param=args.max_param,
+                    repeat=args.repeat,
+                ))
+        except ImportError as e:
+            # eg chromadb not installed (langchain only imports it when the db is built)
+            logger.warning(f'Skipping suite {suite_name}: {e}\n')
+            skipped[suite_name] = str(e)
+
+    write_results(results, args.output, extra_metadata={'skipped': skipped})
+
+
+if __name__ == '__main__':
+    main()
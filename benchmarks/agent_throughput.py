@@ -0,0 +1,306 @@
+"""
+End-to-end throughput of the CoALA coding agent against a local fake env and fake LLM.
+
+Drives CoalaAgent.train_loop (train mode: rollout + summarize / reflect / skill ingest + checkpointing) or
+CoalaAgent.test_one (test mode) over synthetic tasks, and reports tasks per minute, the time split between
+phases (lm, retrieval, ingest, env, checkpointing, logging, other) and peak RSS. Run from the folder containing
+the cognitive_base package:
+
+    python -m cognitive_base.benchmarks.agent_throughput --num_tasks 20 --lm_latency 0.2
+    python -m cognitive_base.benchmarks.agent_throughput --mode test --pass_rate 0.3 --output results.json
+    python -m cognitive_base.benchmarks.agent_throughput --num_tasks 20 --lm_latency 0.2 --train_concurrency 4
+    python -m cognitive_base.benchmarks.agent_throughput --mode test --num_tasks 40 --lm_latency 0.2 --eval_workers 4
+
+Nothing leaves the machine: the LM is FakeChatModel and embeddings are HashEmbeddings (utils/fake_llm.py).
+"""
+import functools
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+from unittest import mock
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from ..agents.batch_eval import batch_evaluate
+from ..utils.argparsers import get_base_parser
+from ..utils.log import setup_extra_file_handler
+from .harness import peak_rss_mb, write_results
+
+logger = logging.getLogger("logger")
+
+PHASES = ['lm', 'retrieval', 'ingest', 'env', 'checkpointing', 'logging']
+
+FN_NAME = 'solve'
+
+# one response serves every LM call in the loop: analysis text plus a code block that parse_ai_code accepts
+FAKE_RESPONSE = f"""
+The task asks for a transformation of the input, so we apply it element by element.
+
+```python
+def helper(x):
+    return x * 2
+
+
+def {FN_NAME}(xs):
+    return [helper(x) for x in xs]
+```
+"""
+
+
+class FakeEnvInterface:
+    """
+    Stand-in for an env_interface: step returns pass / fail at random after a fixed latency. Seeded per task,
+    so outcomes do not depend on the order concurrent rollouts step in.
+    """
+    def __init__(self, pass_rate=0.5, latency=0.0, seed=0):
+        self.pass_rate = pass_rate
+        self.latency = latency
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.full_task = {}
+
+    def reset(self, full_task):
+        self.full_task = full_task
+        self.rng = random.Random(f"{self.seed}-{full_task.get('task_id')}")
+
+    def step(self, full_code, use_public_tests=False):
+        time.sleep(self.latency)
+        reward = self.rng.random() < self.pass_rate
+        obs = 'All tests passed' if reward else 'Test failed: expected [2, 4] but got [1, 2]'
+        return obs, reward, True, {}
+
+
+class FakeDataPipeline:
+    def __init__(self, num_tasks):
+        self.num_tasks = num_tasks
+
+    @staticmethod
+    def make_task(idx):
+        return {
+            'task_id': f'task_{idx}',
+            'task': f'Problem {idx}: given a list of integers, return each value doubled. Family {idx % 7}.',
+            'gt_fn_name': FN_NAME,
+            'code': f'def {FN_NAME}(xs):\n    return [2 * x for x in xs]\n',
+        }
+
+    def get_next_task(self, train_iter):
+        return self.make_task(train_iter)
+
+
+class TaskIdHandler(BaseCallbackHandler):
+    """
+    The agent sets handler.task_id per task, as the real logging handlers expect.
+    """
+    task_id = None
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time per phase. Nested phases are exclusive: time in an inner phase is not also counted
+    for the outer one (eg the LM calls inside skill ingest count as lm).
+
+    Phases are nested per thread. With concurrent rollouts, phase times add up over threads and can exceed the
+    wall time.
+    """
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._stack
+        child_seconds = [0.0]
+        stack.append(child_seconds)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self.seconds[name] += elapsed - child_seconds[0]
+                self.calls[name] += 1
+            if stack:
+                stack[-1][0] += elapsed
+
+    def timed(self, fn, name):
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def patch(self, stack, target, attr, name):
+        """
+        Times target.attr (an instance, class or module attribute) as the given phase, until stack is closed.
+        """
+        stack.enter_context(mock.patch.object(target, attr, self.timed(getattr(target, attr), name)))
+
+
+def get_args(argv=None):
+    parser = get_base_parser()
+    parser.description = 'Benchmark CoalaAgent throughput against a fake env and fake LLM'
+    parser.add_argument("--mode", type=str, default='train', choices=['train', 'test'])
+    parser.add_argument("--num_tasks", type=int, default=10)
+    parser.add_argument("--max_attempts_per_task", type=int, default=2)
+    parser.add_argument("--retrieval_top_k", type=int, default=5)
+    parser.add_argument("--agent_type", type=str, default='coala')
+    parser.add_argument("--save_every", type=int, default=5)
+    parser.add_argument("--lm_latency", type=float, default=0.0, help="seconds per fake LM call")
+    parser.add_argument("--lm_latency_per_token", type=float, default=0.0)
+    parser.add_argument("--lm_failure_rate", type=float, default=0.0)
+    parser.add_argument("--env_latency", type=float, default=0.0, help="seconds per env step")
+    parser.add_argument("--pass_rate", type=float, default=0.5, help="probability an env step passes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work_dir", type=str, default='', help="defaults to a temp dir, removed afterwards")
+    parser.add_argument("--output", type=str, default='benchmark_results/agent_throughput.json')
+    return parser.parse_args(argv)
+
+
+def build_agent(args, work_dir, resume=False):
+    """
+    CoalaAgent on fresh memories in work_dir (or those already there if resume), with the fake LM / embedding
+    providers.
+    """
+    from ..examples.coala_coder.coala_agent import CoalaAgent
+
+    args.result_dir = os.path.join(work_dir, 'results')
+    args.ckpt_dir = os.path.join(work_dir, 'ckpt')
+    args.max_train_iter = args.num_tasks
+    args.eval_later = False
+    args.use_public_tests = False
+    args.resume = resume
+    args.lm_provider = 'fake'
+    os.makedirs(args.result_dir, exist_ok=True)
+
+    agent = CoalaAgent(args, components={}, handler=TaskIdHandler())
+    agent.env_interface = FakeEnvInterface(args.pass_rate, args.env_latency, args.seed)
+    agent.data_pipeline = FakeDataPipeline(args.num_tasks)
+    for module in (agent.reasoning_module, agent.desc_module):
+        module.llm.responses = [FAKE_RESPONSE]
+        module.llm.latency = args.lm_latency
+        module.llm.latency_per_token = args.lm_latency_per_token
+        module.llm.failure_rate = args.lm_failure_rate
+        module.llm.seed = args.seed
+    return agent
+
+
+def instrument(agent, timer, stack):
+    """
+    Wraps the agent's phase boundaries with the timer.
+    """
+    from ..agents import base_agent
+    from ..examples.coala_coder.utils import TaskLogger
+
+    for module in (agent.reasoning_module, agent.desc_module):
+        timer.patch(stack, module, 'lm_reason', 'lm')
+    timer.patch(stack, agent, 'retrieve_for_coding', 'retrieval')
+    timer.patch(stack, agent.env_interface, 'step', 'env')
+    timer.patch(stack, agent.episodic_mem, 'add_transition', 'ingest')
+    timer.patch(stack, agent.episodic_mem, 'finish_episode', 'ingest')
+    timer.patch(stack, agent.semantic_mem, 'update_summaries', 'ingest')
+    timer.patch(stack, agent.semantic_mem, 'update_reflections', 'ingest')
+    timer.patch(stack, agent.procedural_mem, 'add_skill', 'ingest')
+    timer.patch(stack, base_agent, 'train_ckpt', 'checkpointing')
+    timer.patch(stack, base_agent, 'move_log_file', 'logging')
+    for method in ('log_iteration', 'log_rollout', 'log_train'):
+        timer.patch(stack, TaskLogger, method, 'logging')
+
+
+def run(args):
+    # the fake embedding provider is read from the env when memories build their dbs
+    os.environ.setdefault('EMBEDDING_PROVIDER', 'fake')
+    os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_agent_')
+    timer = PhaseTimer()
+    try:
+        agent = build_agent(args, work_dir)
+        # per task log files are part of the measured logging cost
+        logger.setLevel(logging.INFO)
+        setup_extra_file_handler(logger, os.path.join(args.result_dir, 'extra_log.log'))
+
+        with ExitStack() as stack:
+            instrument(agent, timer, stack)
+            start = time.perf_counter()
+            if args.mode == 'train':
+                agent.train_loop()
+            elif args.eval_workers > 1:
+                # workers build their own agents on the memories created above, phases are not timed there
+                tasks = [FakeDataPipeline.make_task(idx) for idx in range(args.num_tasks)]
+                batch_evaluate(
+                    functools.partial(build_agent, args, work_dir, resume=True), tasks,
+                    num_workers=args.eval_workers, result_dir=args.result_dir,
+                )
+            else:
+                agent.train = False
+                for idx in range(args.num_tasks):
+                    agent.test_one(FakeDataPipeline.make_task(idx))
+            total_seconds = time.perf_counter() - start
+        # LM calls made in eval workers are not counted
+        num_lm_calls = sum(module.llm.num_calls for module in (agent.reasoning_module, agent.desc_module))
+    finally:
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename.startswith(os.path.abspath(work_dir)):
+                handler.close()
+                logger.removeHandler(handler)
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    phases = {}
+    for phase in PHASES:
+        phases[phase] = {
+            'seconds': timer.seconds[phase],
+            'fraction': timer.seconds[phase] / total_seconds if total_seconds else 0.0,
+            'calls': timer.calls[phase],
+        }
+    # concurrent rollouts overlap, so the phases can add up to more than the wall time
+    other_seconds = max(0.0, total_seconds - sum(timer.seconds.values()))
+    phases['other'] = {'seconds': other_seconds, 'fraction': other_seconds / total_seconds if total_seconds else 0.0}
+
+    return {
+        'name': f'CoalaAgent.{args.mode}',
+        'params': {
+            key: getattr(args, key) for key in (
+                'num_tasks', 'max_attempts_per_task', 'lm_latency', 'lm_latency_per_token', 'lm_failure_rate',
+                'env_latency', 'pass_rate', 'seed', 'train_concurrency', 'eval_workers',
+            )
+        },
+        'total_seconds': total_seconds,
+        'tasks_per_minute': 60 * args.num_tasks / total_seconds if total_seconds else 0.0,
+        'num_lm_calls': num_lm_calls,
+        'phases': phases,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def print_report(result):
+    print(f"{result['name']}: {result['tasks_per_minute']:.1f} tasks/min over {result['params']['num_tasks']} "
+          f"tasks ({result['total_seconds']:.2f}s, {result['num_lm_calls']} LM calls, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB)")
+    for phase, stats in result['phases'].items():
+        print(f"  {phase:<14} {stats['seconds']:8.3f}s  {100 * stats['fraction']:5.1f}%")
+
+
+def main():
+    args = get_args()
+    result = run(args)
+    print_report(result)
+    write_results([result], args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+BookLoader ingest of the bundled examples/data corpus (the competitive programming books).
+
+time_transform measures loading and chunking only. time_ingest also writes every chunk into a fresh semantic
+memory (fake hash embeddings unless EMBEDDING_PROVIDER says otherwise), as when an agent is run with --load_db.
+"""
+import logging
+import shutil
+import tempfile
+
+from types import SimpleNamespace
+
+from ..knowledge_sources.loaders.comp_prog import create_comp_prog_loader
+from ..memories.semantic.base_semantic_mem import BaseSemanticMem
+
+
+class BookLoaderIngest:
+    # number of entries per book to load, None for the whole corpus
+    params = [20, None]
+    param_names = ['debug_subset']
+    repeat = 1
+    number = 1
+
+    def setup(self, debug_subset):
+        self.loader = create_comp_prog_loader(debug_mode=debug_subset is not None, debug_subset=debug_subset)
+        self.tmp_dirs = []
+        # per-chunk update logs would dominate the timings
+        self.log_level = logging.getLogger("logger").level
+        logging.getLogger("logger").setLevel(logging.WARNING)
+
+    def teardown(self, debug_subset):
+        logging.getLogger("logger").setLevel(self.log_level)
+        for tmp_dir in self.tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def time_transform(self, debug_subset):
+        for source in self.loader.sources:
+            for book_index, entry in enumerate(source.load_entries()):
+                source.transform_content(book_index, entry)
+                if debug_subset is not None and book_index == debug_subset:
+                    break
+
+    def time_ingest(self, debug_subset):
+        tmp_dir = tempfile.mkdtemp(prefix='bench_book_')
+        self.tmp_dirs.append(tmp_dir)
+        agent = SimpleNamespace(semantic_mem=BaseSemanticMem(ckpt_dir=tmp_dir, resume=False))
+        self.loader.load_into_agent(agent)
@@ -0,0 +1,81 @@
+"""
+NxDb lookups on graphs of increasing size.
+"""
+import random
+
+from ..utils.database.graph_db.nx_db import NxDb
+
+
+def build_graph(num_nodes, edges_per_node=3, seed=0):
+    rng = random.Random(seed)
+    db = NxDb()
+    db.add_nodes_from(
+        (f'node_{i}', {'type': f'type_{i % 10}', 'description': f'skill number {i} for task family {i % 97}'})
+        for i in range(num_nodes)
+    )
+    db.add_edges_from(
+        (f'node_{i}', f'node_{rng.randrange(num_nodes)}', 'depends_on')
+        for i in range(num_nodes)
+        for _ in range(edges_per_node)
+    )
+    return db
+
+
+class NxDbLookups:
+    params = [1000, 10000, 100000]
+    param_names = ['num_nodes']
+    repeat = 5
+    number = 100
+
+    def setup(self, num_nodes):
+        self.db = build_graph(num_nodes)
+        self.rng = random.Random(1)
+        self.num_nodes = num_nodes
+
+    def random_node(self):
+        return f'node_{self.rng.randrange(self.num_nodes)}'
+
+    def time_get_node(self, num_nodes):
+        self.db.get_node(self.random_node())
+
+    def time_get_neighbors(self, num_nodes):
+        self.db.get_neighbors(self.random_node())
+
+    def time_get_path(self, num_nodes):
+        try:
+            self.db.get_path(self.random_node(), self.random_node())
+        except Exception:
+            # no path between the pair
+            pass
+
+
+class NxDbScans:
+    """
+    Full-graph operations, timed once per repeat.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['num_nodes']
+    repeat = 3
+    number = 1
+
+    def setup(self, num_nodes):
+        self.db = build_graph(num_nodes)
+
+    def time_get_nodes_by_attribute(self, num_nodes):
+        self.db.get_nodes_by_attribute('type', 'type_3')
+
+    def time_search_keyword(self, num_nodes):
+        self.db.search_keyword('family 42')
+
+    def time_adjacency_snapshot(self, num_nodes):
+        self.db.adjacency_snapshot()
+
+
+class NxDbBatchInsert:
+    params = [1000, 10000, 100000]
+    param_names = ['num_nodes']
+    repeat = 3
+    number = 1
+
+    def time_build_graph(self, num_nodes):
+        build_graph(num_nodes)
@@ -0,0 +1,40 @@
+"""
+BaseProceduralMem.retrieve_by_score over large rule sets.
+"""
+import random
+import shutil
+import tempfile
+
+from ..memories.procedural.base_procedural_mem import BaseProceduralMem
+
+CONDITION_KEYS = [f'cond_{i}' for i in range(20)]
+CONDITION_VALUES = [f'value_{i}' for i in range(10)]
+
+
+def synthetic_rule(rng, num_conditions=5):
+    keys = rng.sample(CONDITION_KEYS, num_conditions)
+    return {
+        'rigid_conditions': {key: rng.choice(CONDITION_VALUES) for key in keys},
+        'action': f'action_{rng.randrange(1000)}',
+    }
+
+
+class ProceduralMemRetrieveByScore:
+    params = [[1000, 10000, 100000], [0.5, 0.9]]
+    param_names = ['num_rules', 'threshold']
+    repeat = 5
+    number = 1
+
+    def setup(self, num_rules, threshold):
+        self.tmp_dir = tempfile.mkdtemp(prefix='bench_procedural_')
+        self.mem = BaseProceduralMem(ckpt_dir=self.tmp_dir, resume=False)
+        rng = random.Random(0)
+        # set directly, add_rule rewrites rules.json on every call
+        self.mem.rules = [synthetic_rule(rng) for _ in range(num_rules)]
+        self.cue = synthetic_rule(rng)
+
+    def teardown(self, num_rules, threshold):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def time_retrieve_by_score(self, num_rules, threshold):
+        self.mem.retrieve_by_score(self.cue, threshold=threshold)
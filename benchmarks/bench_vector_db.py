@@ -0,0 +1,61 @@
+"""
+ChromaVectorDB update / retrieve at increasing collection sizes.
+
+Uses the fake hash embeddings (see utils/fake_llm.py) unless EMBEDDING_PROVIDER says otherwise, so the timings
+measure the db and not the embedding API.
+"""
+import shutil
+import tempfile
+
+from ..utils.database.vector_db.chroma_vector_db import ChromaVectorDB
+
+# chroma rejects batches above ~5k
+ADD_BATCH_SIZE = 5000
+
+
+def synthetic_doc(i):
+    return f'def skill_{i}(x):\n    """helper {i} for task family {i % 97}"""\n    return x + {i}\n'
+
+
+def fill_vector_db(vector_db, num_docs):
+    for start in range(0, num_docs, ADD_BATCH_SIZE):
+        stop = min(num_docs, start + ADD_BATCH_SIZE)
+        vector_db.db.add_texts(
+            texts=[synthetic_doc(i) for i in range(start, stop)],
+            metadatas=[{'name': f'skill_{i}', 'family': i % 97} for i in range(start, stop)],
+            ids=[f'skill_{i}' for i in range(start, stop)],
+        )
+
+
+class ChromaVectorDBSuite:
+    params = [1000, 10000, 100000]
+    param_names = ['num_docs']
+    repeat = 5
+    number = 10
+
+    def setup(self, num_docs):
+        self.tmp_dir = tempfile.mkdtemp(prefix='bench_chroma_')
+        self.vector_db = ChromaVectorDB(vectordb_name='bench', ckpt_dir=self.tmp_dir)
+        fill_vector_db(self.vector_db, num_docs)
+        self.num_updates = 0
+
+    def teardown(self, num_docs):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def time_update(self, num_docs):
+        # new ids each call, so this measures inserts into a collection of (roughly) num_docs
+        self.num_updates += 1
+        i = num_docs + self.num_updates
+        self.vector_db.update(synthetic_doc(i), metadata={'name': f'skill_{i}'}, doc_id=f'skill_{i}')
+
+    def time_upsert_existing(self, num_docs):
+        self.vector_db.update(synthetic_doc(0), metadata={'name': 'skill_0'}, doc_id='skill_0')
+
+    def time_retrieve(self, num_docs):
+        self.vector_db.retrieve('helper for task family 42', k=5)
+
+    def time_retrieve_with_scores(self, num_docs):
+        self.vector_db.retrieve('helper for task family 42', k=5, with_scores=True)
+
+    def time_count(self, num_docs):
+        self.vector_db.count()
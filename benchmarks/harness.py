@@ -0,0 +1,160 @@
+"""
+Minimal asv-style runner, so the suites run without extra dependencies.
+
+A suite is a class with optional `params` (list of values, or list of lists for several params), `param_names`,
+`repeat` and `number` attributes, `setup(*params)` / `teardown(*params)` hooks, and `time_*` methods.
+This is the same layout asv uses, so the suites can also be pointed at asv directly.
+"""
+import gc
+import inspect
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from datetime import datetime, timezone
+
+logger = logging.getLogger("logger")
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit(repo_dir=None):
+    """
+    Current commit hash of the repo, or None if not in a git repo.
+    """
+    repo_dir = repo_dir or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        out = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=repo_dir, capture_output=True, text=True, check=True, timeout=10
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_metadata():
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def time_fn(fn, repeat=5, number=1):
+    """
+    Times fn, asv / timeit style: `repeat` samples, each the mean over `number` calls. gc is off while timing.
+
+    Returns:
+        dict: Per call seconds: 'min', 'median', 'mean', 'stdev', plus 'repeat' and 'number'.
+    """
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def param_combinations(suite_cls):
+    params = getattr(suite_cls, 'params', None)
+    if params is None:
+        return [()]
+    # a flat list is a single param
+    if not params or not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def run_suite(suite_cls, name_filter='', max_param=None, repeat=None):
+    """
+    Runs all time_* methods of a suite over its param grid.
+
+    Args:
+        suite_cls: The suite class.
+        name_filter (str): Only run benchmarks whose full name contains this.
+        max_param (int): Skips param combinations with a numeric param above this (eg to leave out 100k docs).
+        repeat (int): Overrides the suite's repeat.
+
+    Returns:
+        list: One dict per benchmark and param combination.
+    """
+    methods = [name for name, _ in inspect.getmembers(suite_cls, inspect.isfunction) if name.startswith('time_')]
+    param_names = getattr(suite_cls, 'param_names', None)
+    results = []
+    for combo in param_combinations(suite_cls):
+        if max_param is not None and any(isinstance(p, int) and p > max_param for p in combo):
+            continue
+        selected = [m for m in methods if name_filter in f'{suite_cls.__name__}.{m}']
+        if not selected:
+            continue
+
+        suite = suite_cls()
+        setup_start = time.perf_counter()
+        if hasattr(suite, 'setup'):
+            suite.setup(*combo)
+        setup_time = time.perf_counter() - setup_start
+        try:
+            for method in selected:
+                name = f'{suite_cls.__name__}.{method}'
+                logger.info(f'Running {name} {combo}\n')
+                fn = getattr(suite, method)
+                stats = time_fn(
+                    lambda: fn(*combo),
+                    repeat=repeat or getattr(suite, 'repeat', 5),
+                    number=getattr(suite, 'number', 1),
+                )
+                results.append({
+                    'name': name,
+                    'params': dict(zip(param_names, combo)) if param_names else list(combo),
+                    'setup_seconds': setup_time,
+                    'peak_rss_mb': peak_rss_mb(),
+                    **stats,
+                })
+                print(f"{name} {combo}: median {stats['median'] * 1000:.3f} ms")
+        finally:
+            if hasattr(suite, 'teardown'):
+                suite.teardown(*combo)
+    return results
+
+
+def write_results(results, output_path, extra_metadata=None):
+    """
+    Writes results as JSON together with run metadata (commit, time, python), for tracking across commits.
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    payload = {**run_metadata(), **(extra_metadata or {}), 'results': results}
+    with open(output_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f'Wrote {len(results)} results to {output_path}')
+    return payload
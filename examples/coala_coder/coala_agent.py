@@ -20,9 +20,10 @@ from ...memories.semantic.base_semantic_mem import BaseSemanticMem
 from .coala_reasoning import CoalaReasoning
 from .coala_desc import CoalaDesc
 
-from ...utils.log import handle_rollout_error
+from ...utils.log import handle_rollout_error, save_lm_metrics
 from ...utils.code_parse import append_dependencies
 from ...utils.formatting import truncate_str
+from ...utils.tracing import span
 
 from .utils import TaskLogger
 from .utils.coala_message_thread import CoalaMessageThread
@@ -59,6 +60,8 @@ class CoalaAgent(BaseAgent):
         """
         self.reasoning_module = CoalaReasoning(callbacks=[handler], **self.args)
         self.desc_module = CoalaDesc(callbacks=[handler], **self.args)
+        # reset per task, so each concurrent rollout needs its own
+        self.attr_per_worker += ['reasoning_module', 'desc_module']
 
         """
         decision procedure modules
@@ -153,13 +156,14 @@ class CoalaAgent(BaseAgent):
                 if not parsed_result:
                     continue
 
-                full_code = append_dependencies(parsed_result, self.procedural_mem.fn_str_map)
+                full_code = append_dependencies(parsed_result, self.procedural_mem)
                 message_thread.update_full_code(full_code)
                 
                 if self.eval_later and not self.train and not use_public_tests:
                     break
 
-                obs, reward, _, info = self.env_interface.step(full_code, use_public_tests)
+                with span('env.step'):
+                    obs, reward, _, info = self.env_interface.step(full_code, use_public_tests)
                 message_thread.record_env_out(obs, reward, info)
                 
                 transition_info, iteration_data = message_thread.get_latest_data()
@@ -205,4 +209,5 @@ class CoalaAgent(BaseAgent):
 
     def test_one(self, full_task):
         success, parsed_result, _ = self.rollout(full_task, self.use_public_tests)
+        save_lm_metrics(self.result_dir, {'mode': 'test', 'task_id': self.task_id})
         return success, parsed_result
@@ -13,6 +13,7 @@ import logging
 from typing import Dict, Any, Tuple, List
 
 from ..voyager_coder.base_coding_module import BaseCodingModule
+from ...utils.lm_scheduler import PRIORITY_HIGH, PRIORITY_LOW
 from .utils.coala_message_thread import CoalaMessageThread
 
 logger = logging.getLogger("logger")
@@ -171,6 +172,8 @@ class CoalaReasoning(BaseCodingModule):
         parsed_result = self.lm_reason(
             messages=message_thread.to_msg_with_temp(),
             parse_fn=self.parse_ai_code,
+            priority=PRIORITY_HIGH,
+            stream_fn=self.code_stream_fn(),
         )
 
         message_thread.record_raw_msg(parsed_result)
@@ -183,7 +186,7 @@ class CoalaReasoning(BaseCodingModule):
     ) -> str:
         """Generate reflection on solution attempt"""
         message_thread.add("user", reflection_prompt.format(official_solution), is_temp=True)
-        reflection = self.lm_reason(messages=message_thread.to_msg_with_temp())
+        reflection = self.lm_reason(messages=message_thread.to_msg_with_temp(), priority=PRIORITY_LOW)
         message_thread.record_reflection(reflection)
         return reflection
 
@@ -193,7 +196,7 @@ class CoalaReasoning(BaseCodingModule):
     ) -> str:
         """Generate a summary of the solution attempt"""
         message_thread.add("user", summarize_prompt, is_temp=True)
-        summary = self.lm_reason(messages=message_thread.to_msg_with_temp())
+        summary = self.lm_reason(messages=message_thread.to_msg_with_temp(), priority=PRIORITY_LOW)
         message_thread.record_summary(summary)
         return summary
 
@@ -8,7 +8,7 @@ import logging
 
 from ...reasoning.base_lm_reasoning import BaseLMReasoning
 
-from ...knowledge_sources.parsers import extract_blocks
+from ...knowledge_sources.parsers import extract_blocks, StreamingBlockExtractor
 
 from ...utils.formatting import truncate_str
 from ...utils.code_parse import extract_from_ast, assert_modules_in_whitelist
@@ -28,6 +28,8 @@ class BaseCodingModule(BaseLMReasoning):
         debug_mode=False,
         name='coding',
         generic_code_env=False,
+        stream_code=False,
+        max_preamble_chars=None,
         **kwargs,
     ):
         super().__init__(
@@ -48,6 +50,10 @@ class BaseCodingModule(BaseLMReasoning):
         self.assert_fns = not generic_code_env
         self.rebuild_code_from_ast = False
 
+        # stream code generation and stop at the end of the first python block
+        self.stream_code = stream_code
+        self.max_preamble_chars = max_preamble_chars
+
     """
     helper fns
     """
@@ -56,6 +62,20 @@ class BaseCodingModule(BaseLMReasoning):
         self.task_prompt = full_task.get('task_prompt', full_task['task'])
         logger.info(f'The task prompt is {truncate_str(self.task_prompt)}\n')
 
+    def code_block_extractor(self):
+        """
+        Fresh extractor for one streamed response, used as stream_fn in lm_reason.
+        Stops at the end of the first python block, which is the only block parse_ai_code reads.
+        """
+        return StreamingBlockExtractor(identifier='python|py', max_preamble_chars=self.max_preamble_chars)
+
+    def code_stream_fn(self):
+        """
+        Returns:
+            callable: stream_fn for lm_reason calls that are parsed with parse_ai_code, or None if not streaming.
+        """
+        return self.code_block_extractor if self.stream_code else None
+
     def validate_code(self, imported_modules, functions, main_fns, fn_name):
         """
         Validates the generated code by checking imports, functions, and main function name.
@@ -91,7 +111,8 @@ class BaseCodingModule(BaseLMReasoning):
 
     def parse_ai_code(self, message):
         """
-        Parses AI-generated code from a message, extracting functions, imports, and dependencies.
+        Parses AI-generated code from the first python block of a message, extracting functions, imports, and
+        dependencies.
 
         Parameters:
             message (AIMessage): The message containing the AI-generated code.
@@ -100,7 +121,9 @@ class BaseCodingModule(BaseLMReasoning):
             dict: A dictionary containing parsed code information, including program code, program name, dependencies,
             and more.
         """
-        code = extract_blocks(message.content, identifier='python|py')
+        # only the first python block, so streamed (cut off after that block) and full responses parse the same
+        blocks = extract_blocks(message.content, identifier='python|py', concat=False)
+        code = blocks[0] if blocks else ''
         assert code, 'regex fails to extract Python code. check your formatting and try again\n'
 
         functions, import_statements, dependencies, imported_modules = extract_from_ast(code)
@@ -116,7 +139,7 @@ class BaseCodingModule(BaseLMReasoning):
         no_parent = self.validate_code(imported_modules, functions, main_fns, fn_name)
 
         if self.rebuild_code_from_ast:
-            program_code = "\n".join(import_statements) + "\n\n".join(fn["body"] for fn in main_fns)
+            program_code = "\n".join(import_statements) + "\n\n" + "\n\n".join(fn["body"] for fn in main_fns)
         else:
             program_code = code
 
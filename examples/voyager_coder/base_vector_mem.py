@@ -8,6 +8,7 @@ from ...memories.base_mem import BaseMem
 
 from ...utils import dump_json, load_json
 from ...utils.code_parse import get_fn_name
+from ...utils.ckpt_writer import get_ckpt_writer
 
 logger = logging.getLogger("logger")
 
@@ -24,6 +25,8 @@ class BaseVectorMem(BaseMem):
         ckpt_dir (str): The directory path for saving and loading checkpoints.
         vectordb_name (str): The name of the vector database.
         fn_str_map (dict): A mapping from function names to their string representations.
+        dependents (dict): Skill dependency DAG as reverse edges, name -> names of the skills depending on it
+            (also for names not in fn_str_map yet).
     
     Methods:
         log_content(docs): Logs the content of documents.
@@ -32,7 +35,10 @@ class BaseVectorMem(BaseMem):
                  id_key='doc_hash', log_docs=True): Retrieves documents based on a query.
         retrieve_code(query, metadata_filter=None, k_new=0, new_only=False, return_formatted=False): Retrieves code snippets based on a query.
         add_code(raw_data, mapping, description, prevent_duplicates=False): Adds a new code snippet to the database.
+        resolve_dependencies(dependencies): Code of the skills a program depends on, in dependency order.
     """
+    write_methods = BaseMem.write_methods + ('add_code',)
+
     def __init__(
         self,
         retrieval_top_k=5,
@@ -64,6 +70,12 @@ class BaseVectorMem(BaseMem):
         else:
             self.fn_str_map = {}
 
+        # skill dependency DAG, with a cached bundle of transitive dependencies per skill
+        self.dependents = {}
+        self._bundles = {}
+        for name in self.fn_str_map:
+            self._add_dependency_edges(name)
+
     """
     helper fns
     """
@@ -87,6 +99,58 @@ class BaseVectorMem(BaseMem):
     def get_docs(self, query, db, k, **kwargs):
         return db.similarity_search(query, k=k)
 
+    def _add_dependency_edges(self, name):
+        for dep in self.fn_str_map[name].get('dependencies', []):
+            self.dependents.setdefault(dep, set()).add(name)
+
+    def _invalidate_bundles(self, name):
+        """Drops the cached bundles of a skill and of every skill depending on it, directly or not"""
+        stack, seen = [name], set()
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            self._bundles.pop(node, None)
+            stack.extend(self.dependents.get(node, ()))
+
+    def _build_bundle(self, name):
+        """Post order DFS over dependencies, skipping back edges of any cycle"""
+        order, missing, visited = [], [], set()
+        stack = [(name, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                order.append(node)
+                continue
+            if node in visited:
+                continue
+            visited.add(node)
+            if node not in self.fn_str_map:
+                missing.append(node)
+                continue
+            stack.append((node, True))
+            for dep in reversed(self.fn_str_map[node].get('dependencies', [])):
+                if dep not in visited:
+                    stack.append((dep, False))
+        return tuple(order), tuple(missing)
+
+    def dependency_bundle(self, name):
+        """
+        The skill and its transitive dependencies, cached until a skill it depends on changes.
+
+        Args:
+            name (str): The skill name.
+
+        Returns:
+            tuple: (names, missing). names in dependency order ending with the skill itself (empty if it is not
+            a skill), missing the dependencies not in fn_str_map.
+        """
+        bundle = self._bundles.get(name)
+        if bundle is None:
+            bundle = self._bundles[name] = self._build_bundle(name)
+        return bundle
+
     """
     Retrieval Actions (to working mem / decision procedure)
     """
@@ -149,6 +213,27 @@ class BaseVectorMem(BaseMem):
         entries = [self.fn_str_map[doc.metadata['name']] for doc in docs]
         return entries
 
+    def resolve_dependencies(self, dependencies):
+        """
+        Code of the skills a program depends on (transitively), each once and in dependency order, from the
+        cached bundles. A lookup for the usual single dependency.
+
+        Args:
+            dependencies (list): Names the program calls that it does not define.
+
+        Returns:
+            tuple: (dependent_code, missing), the list of code strings and the dependencies not in fn_str_map.
+        """
+        if len(dependencies) == 1:
+            names, missing = self.dependency_bundle(dependencies[0])
+        else:
+            names, missing = {}, {}
+            for dep in dependencies:
+                dep_names, dep_missing = self.dependency_bundle(dep)
+                names.update(dict.fromkeys(dep_names))
+                missing.update(dict.fromkeys(dep_missing))
+        return [self.fn_str_map[name]['code'] for name in names], list(missing)
+
     """
     Learning Actions (from working mem)
     """
@@ -164,7 +249,8 @@ class BaseVectorMem(BaseMem):
             prevent_duplicates (bool, optional): Whether to prevent duplicate entries. Defaults to False.
 
         Returns:
-            str: The name of the added code snippet.
+            str: The name of the added code snippet, renamed if the name was taken. None if skipped as a
+                duplicate, or if called on a DeferredWriteMem view (the write is recorded, not applied).
         """
         processed_data = {}
         for source_key, destination_key in mapping:
@@ -179,18 +265,26 @@ class BaseVectorMem(BaseMem):
 
         update_processed_data(processed_data, name, old_name, description)
 
-        self.vectordb.add_texts(
-            texts=[description],
-            ids=[name],
-            metadatas=[{"name": name}],
-        )
+        writer = get_ckpt_writer()
+        with writer.db_write():
+            self.vectordb.add_texts(
+                texts=[description],
+                ids=[name],
+                metadatas=[{"name": name}],
+            )
+            self.vectordb.persist()
+        if 'lexical' in self.update_methods:
+            self.update_methods['lexical'].update(description, metadata={"name": name}, doc_id=name)
 
         self.fn_str_map[name] = {k: v for k, v in processed_data.items() if k != "name"}
+        self._add_dependency_edges(name)
+        self._invalidate_bundles(name)
         
         self._check_vectordb_sync("vectordb is not synced with entries.json")
         
-        dump_json(self.fn_str_map, f"{self.ckpt_dir}/{self.vectordb_name}/entries.json", indent=4)
-        self.vectordb.persist()
+        # shallow copy: entries are replaced, never changed in place
+        entries_path = f"{self.ckpt_dir}/{self.vectordb_name}/entries.json"
+        writer.submit(dump_json, dict(self.fn_str_map), entries_path, key=entries_path, indent=4)
         
         return name
 
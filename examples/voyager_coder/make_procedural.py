@@ -10,6 +10,7 @@ from typing import Type, TypeVar
 from .base_vector_mem import BaseVectorMem
 
 from ...utils import dump_text, f_mkdir
+from ...utils.ckpt_writer import get_ckpt_writer
 
 T = TypeVar('T', bound=BaseVectorMem)
 
@@ -18,6 +19,8 @@ T = TypeVar('T', bound=BaseVectorMem)
 # class VoyagerProceduralMem(BaseVectorMem):
 def make_voyager_procedural(base_class: Type[T]) -> Type[T]:
     class VoyagerProcedural(base_class):
+        write_methods = base_class.write_methods + ('add_skill',)
+
         def __init__(
             self,
             retrieval_top_k=5,
@@ -91,7 +94,10 @@ def make_voyager_procedural(base_class: Type[T]) -> Type[T]:
 
             if self.no_skill_files:
                 return
-            dump_text(program_code, f"{self.ckpt_dir}/skill/code/{dumped_prog_name}.py")
-            dump_text(skill_description, f"{self.ckpt_dir}/skill/description/{dumped_prog_name}.txt")
+            writer = get_ckpt_writer()
+            code_path = f"{self.ckpt_dir}/skill/code/{dumped_prog_name}.py"
+            description_path = f"{self.ckpt_dir}/skill/description/{dumped_prog_name}.txt"
+            writer.submit(dump_text, program_code, code_path, key=code_path)
+            writer.submit(dump_text, skill_description, description_path, key=description_path)
 
     return VoyagerProcedural
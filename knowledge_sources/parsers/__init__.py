@@ -71,3 +71,80 @@ def extract_blocks(text, identifier='', concat=True):
     if concat:
         return "\n".join(pattern_list)
     return pattern_list
+
+
+class MalformedStreamError(ValueError):
+    """
+    Raised by StreamingBlockExtractor when a streamed response is clearly not going to contain the expected block.
+    Carries the text received so far, so it can be shown to the LM as a parse error.
+    """
+    def __init__(self, message, text=''):
+        super().__init__(message)
+        self.text = text
+
+
+class StreamingBlockExtractor:
+    """
+    Incremental version of extract_blocks for streamed LM responses, which only keeps the first block.
+
+    Feed it text chunks as they arrive; feed returns True once the first matching block has closed, so the caller
+    can stop generation there. The opening fence only counts once its line is complete, so that eg ```py is not
+    taken as the start of a block that turns out to be ```python.
+
+    Attributes:
+        text (str): All text fed so far.
+        block (str): Contents of the first block once closed (same as extract_blocks gives for it), else None.
+        max_preamble_chars (int): Fails fast if no opening fence is seen within this many chars. None for no limit.
+        max_block_chars (int): Fails fast if the block is still open after this many chars. None for no limit.
+    """
+    def __init__(self, identifier='', max_preamble_chars=None, max_block_chars=None):
+        self.open_pattern = re.compile(rf"```(?:{identifier})" if identifier else r"```")
+        # longest a partially received opening fence can be, so a fence split across chunks is still found
+        self.lookbehind = len(identifier) + 3
+        self.max_preamble_chars = max_preamble_chars
+        self.max_block_chars = max_block_chars
+
+        self.text = ''
+        self.block = None
+        self._block_start = None
+        self._scan_pos = 0
+
+    def feed(self, chunk):
+        """
+        Parameters:
+            chunk (str): The next piece of the response.
+
+        Returns:
+            bool: True once the first block is complete.
+
+        Raises:
+            MalformedStreamError: If a size limit is exceeded before the block is found or closed.
+        """
+        if self.block is not None:
+            return True
+        self.text += chunk
+
+        if self._block_start is None:
+            match = self.open_pattern.search(self.text, self._scan_pos)
+            if match is None or '\n' not in self.text[match.end():]:
+                if match is None:
+                    self._scan_pos = max(0, len(self.text) - self.lookbehind)
+                if self.max_preamble_chars is not None and len(self.text) > self.max_preamble_chars:
+                    raise MalformedStreamError(
+                        f'no code block found in the first {self.max_preamble_chars} characters', self.text
+                    )
+                return False
+            self._block_start = match.end()
+            self._scan_pos = match.end()
+
+        close = self.text.find('```', self._scan_pos)
+        if close == -1:
+            # a closing fence may be split across chunks
+            self._scan_pos = max(self._block_start, len(self.text) - 2)
+            if self.max_block_chars is not None and len(self.text) - self._block_start > self.max_block_chars:
+                raise MalformedStreamError(
+                    f'code block not closed within {self.max_block_chars} characters', self.text
+                )
+            return False
+        self.block = self.text[self._block_start:close]
+        return True
@@ -0,0 +1,22 @@
+from .base_update import BaseUpdate
+from ..utils.ckpt_writer import get_ckpt_writer
+
+
+class LexicalUpdate(BaseUpdate):
+    def __init__(self, db, table_name='lexical', verbose=False, debug_mode=False):
+        super().__init__(db)
+        self.table_name = table_name
+        self.verbose = verbose
+        self.debug_mode = debug_mode
+
+    def update(self, entry, metadata=None, doc_id=None, **kwargs):
+        """
+        Indexes an entry for lexical (BM25) search.
+
+        Args:
+            entry: The text to index.
+            metadata (dict): Optional metadata associated with the entry.
+            doc_id (str): Optional id, usually the id of the same entry in the vector db.
+        """
+        with get_ckpt_writer().db_write():
+            self.db.fts_update(self.table_name, entry, doc_id=doc_id, metadata=metadata)
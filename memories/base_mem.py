@@ -16,21 +16,31 @@ Args:
     vectordb_name (str): The name of the vector database to use. Defaults to "base".
     resume (bool): Whether to resume from an existing checkpoint. Defaults to True.
     **kwargs: Additional keyword arguments passed to the database factory.
+        lexical_search (bool): If True, also index entries in a SQLite FTS5 db for 'lexical' (BM25)
+            and 'hybrid' (BM25 + vector) retrieval. Defaults to False.
 """
+import copy
 import logging
 
 from ..retrieval.vector_retrieval import VectorRetrieval
+from ..retrieval.lexical_retrieval import LexicalRetrieval, HybridRetrieval
 from ..learning.vector_update import VectorUpdate
+from ..learning.lexical_update import LexicalUpdate
 
 from ..utils.formatting import tag_indent_format
+from ..utils.tracing import span
 from ..utils.database.database_wrapper import DatabaseWrapper
 from ..utils.database.vector_db.chroma_vector_db import ChromaVectorDB
+from ..utils.database.relational_db.sqlite_db import SQLiteDB
 
 
 logger = logging.getLogger("logger")
 
 
 class BaseMem:
+    # methods that change the memory, deferred by DeferredWriteMem. Subclasses extend with their learning actions
+    write_methods = ('update',)
+
     def __init__(
         self,
         retrieval_top_k=5,
@@ -72,6 +82,9 @@ class BaseMem:
             'vector': VectorUpdate(self.dbs[vectordb_name])
         }
 
+        if kwargs.get('lexical_search', False):
+            self.register_lexical_db(vectordb_name)
+
     """
     helper fns
     """
@@ -128,9 +141,65 @@ class BaseMem:
             vectordb_name: VectorUpdate(self.dbs[vectordb_name])
         })
 
+    def register_lexical_db(self, vectordb_name, table_name='lexical'):
+        """
+        Registers a SQLite FTS5 db mirroring the given vector db, and sets up 'lexical' and 'hybrid'
+        retrieval methods and a 'lexical' update method. Backfills the index from the vector db if it is empty.
+
+        Args:
+            vectordb_name (str): The name of the vector database to mirror.
+            table_name (str): The name of the FTS5 table.
+        """
+        lexical_db = SQLiteDB(db_path=f"{self.ckpt_dir}/{vectordb_name}/lexical.db")
+        lexical_db.create_fts_table(table_name)
+
+        vectordb = self.dbs[vectordb_name]
+        if not lexical_db.fts_count(table_name) and vectordb.count():
+            data = vectordb.db.get()
+            lexical_db.fts_update_many(table_name, data['documents'], data['ids'], data['metadatas'])
+
+        lexical_db_name = f'{vectordb_name}_lexical'
+        self.register_db(lexical_db_name, DatabaseWrapper(lexical_db, lambda x: x.fts_count(table_name)))
+        self.retrieval_methods['lexical'] = LexicalRetrieval(
+            lexical_db,
+            table_name=table_name,
+            retrieval_top_k=self.retrieval_top_k,
+        )
+        self.retrieval_methods['hybrid'] = HybridRetrieval(
+            self.retrieval_methods['vector'],
+            self.retrieval_methods['lexical'],
+            retrieval_top_k=self.retrieval_top_k,
+        )
+        self.update_methods['lexical'] = LexicalUpdate(lexical_db, table_name=table_name)
+
     """
     Retrieval Actions (to working mem / decision procedure)
     """
+    def retrieve_by_lexical(self, query, **kwargs):
+        """
+        Retrieves entries by BM25 keyword match, without an embedding call. Needs lexical_search enabled.
+
+        Args:
+            query: The query text.
+
+        Returns:
+            list: A list of documents retrieved from the database.
+        """
+        return self.retrieval_methods['lexical'].retrieve(query, **kwargs)
+
+    def retrieve_hybrid(self, query, **kwargs):
+        """
+        Retrieves entries by reciprocal-rank fusion of BM25 and vector similarity. Needs lexical_search enabled.
+        Exact identifier cues found lexically skip the vector db.
+
+        Args:
+            query: The query text.
+
+        Returns:
+            list: A list of documents retrieved from the database.
+        """
+        return self.retrieval_methods['hybrid'].retrieve(query, **kwargs)
+
     # unless kwargs are v custom
     def retrieve_by_ebd(self, query, **kwargs):
         """
@@ -154,7 +223,8 @@ class BaseMem:
         Returns:
             list: A list of documents retrieved from the database.
         """
-        return self.retrieve_by_ebd(query, **kwargs)
+        with span('mem.retrieve'):
+            return self.retrieve_by_ebd(query, **kwargs)
 
     def _retrieve_and_format(self, query, retrieval_method, tag, transform_fn=None, **kwargs):
         """
@@ -173,7 +243,8 @@ class BaseMem:
                 - A list of formatted strings with proper indentation
                 - A list of tuples (formatted_string, score) if scores were requested
         """
-        docs = self.retrieval_methods[retrieval_method].retrieve(query, **kwargs)
+        with span('mem.retrieve'):
+            docs = self.retrieval_methods[retrieval_method].retrieve(query, **kwargs)
         
         if transform_fn is None:
             transform_fn = lambda doc_obj: doc_obj.page_content
@@ -205,18 +276,26 @@ class BaseMem:
             metadata (dict): Optional metadata associated with the embedding.
             db: The database where the embedding should be stored. If None, the default database is used.
         """
-        self.update_methods['vector'].update(entry, **kwargs)
+        return self.update_methods['vector'].update(entry, **kwargs)
 
     def update(self, entry, **kwargs):
         """
         default update Stores an embedding in the vector database.
+        Also indexes the entry for lexical search if lexical_search is enabled.
 
         Args:
             entry: The embedding to store.
             metadata (dict): Optional metadata associated with the embedding.
             db: The database where the embedding should be stored. If None, the default database is used.
         """
-        self.update_ebd(entry, **kwargs)
+        with span('mem.update'):
+            ids = self.update_ebd(entry, **kwargs)
+            if 'lexical' in self.update_methods:
+                self.update_methods['lexical'].update(
+                    entry,
+                    metadata=kwargs.get('metadata'),
+                    doc_id=ids[0] if ids else kwargs.get('doc_id'),
+                )
 
 
 def conditional_memory_op(func):
@@ -225,3 +304,50 @@ def conditional_memory_op(func):
             return [] if func.__name__.startswith('retrieve') else None
         return func(self, *args, **kwargs)
     return wrapper
+
+
+class DeferredWriteMem:
+    """
+    Read-through view of a memory for concurrent rollouts. Calls to the memory's write_methods are recorded to
+    write_log (args snapshotted) instead of applied, so that a single writer can replay them with
+    apply_memory_writes in a fixed order. Everything else is forwarded to the memory.
+
+    Recorded calls return None, as the write has not happened yet. Of the write_methods, only
+    BaseVectorMem.add_code (and so the skill memories' add_code) returns a result, the name the entry was
+    stored under, which may differ from the name passed in when it is renamed on apply. Rollouts on a view
+    must not rely on it: the skill is retrievable by that name only once the write is committed.
+    """
+    def __init__(self, mem, write_log):
+        self._mem = mem
+        self._write_log = write_log
+
+    def __getattr__(self, name):
+        if name in self._mem.write_methods:
+            def record(*args, **kwargs):
+                self._write_log.append((self._mem, name, copy.deepcopy(args), copy.deepcopy(kwargs)))
+            return record
+        return getattr(self._mem, name)
+
+
+class ReadOnlyMem:
+    """
+    View of a memory that drops calls to its write_methods, eg to share a memory's stores between evaluation
+    workers. Everything else is forwarded to the memory.
+    """
+    def __init__(self, mem):
+        self._mem = mem
+
+    def __getattr__(self, name):
+        if name in self._mem.write_methods:
+            def skip(*args, **kwargs):
+                logger.debug(f'read only memory, skipped {name}')
+            return skip
+        return getattr(self._mem, name)
+
+
+def apply_memory_writes(write_log):
+    """
+    Replays the writes recorded by DeferredWriteMem views, in the order they were made.
+    """
+    for mem, name, args, kwargs in write_log:
+        getattr(mem, name)(*args, **kwargs)
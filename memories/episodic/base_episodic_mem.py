@@ -5,6 +5,7 @@ from typing import Dict
 from ..base_mem import BaseMem, conditional_memory_op
 
 from ...utils import load_json, dump_json
+from ...utils.ckpt_writer import get_ckpt_writer
 
 
 class BaseEpisodicMem(BaseMem):
@@ -26,6 +27,8 @@ class BaseEpisodicMem(BaseMem):
     - Partial matching (eg part of cue or part of transition)
     - Retrieve sequence of transitions
     """
+    write_methods = BaseMem.write_methods + ('add_transition', 'finish_episode', 'save_episode_state')
+
     def __init__(
         self,
         retrieval_top_k=5,
@@ -73,9 +76,11 @@ class BaseEpisodicMem(BaseMem):
         state = {
             "episode_id": self.episode_id,
             "transition_id": self.transition_id,
-            "curr_episode": self.curr_episode,
+            # transitions are appended, never changed
+            "curr_episode": list(self.curr_episode),
         }
-        dump_json(state, f"{self.ckpt_dir}/episodic/episode_state.json", indent=4)
+        path = f"{self.ckpt_dir}/episodic/episode_state.json"
+        get_ckpt_writer().submit(dump_json, state, path, key=path, indent=4)
     
     def finish_episode(self):
         """Mark current episode as complete and increment episode counter"""
@@ -6,6 +6,7 @@ from ..base_mem import BaseMem
 from .scoring_strategies.jaccard_scoring_strategy import JaccardScoringStrategy
 
 from ...utils import load_json, dump_json
+from ...utils.ckpt_writer import get_ckpt_writer
 
 
 class BaseProceduralMem(BaseMem):
@@ -14,6 +15,8 @@ class BaseProceduralMem(BaseMem):
     retrieval top k, checkpoint directory, vectordb name, and a flag to resume from the last checkpoint. 
     It also loads rules from a JSON file if the resume flag is set.
     """
+    write_methods = BaseMem.write_methods + ('add_rule',)
+
     def __init__(
         self,
         scoring_strategy=JaccardScoringStrategy(),
@@ -101,7 +104,7 @@ class BaseProceduralMem(BaseMem):
     """
     def add_rule(self, rule):
         self.rules.append(rule)
-        dump_json(self.rules, self.rules_path)
+        get_ckpt_writer().submit(dump_json, list(self.rules), self.rules_path, key=self.rules_path)
 
     # TODO: weights, priority
     # def add_rule(self, conditions, action, weights=None, priority=1):
@@ -6,6 +6,8 @@ from ..base_mem import BaseMem
 
 
 class BaseSemanticMem(BaseMem):
+    write_methods = BaseMem.write_methods + ('update_summaries', 'update_reflections', 'add_knowledge_source')
+
     def __init__(
         self,
         retrieval_top_k=5,
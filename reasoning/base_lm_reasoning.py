@@ -7,6 +7,8 @@ The class is designed to be extended for specific reasoning tasks that require i
 """
 import asyncio
 
+from functools import lru_cache
+
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema import HumanMessage, SystemMessage
 from langchain.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate
@@ -18,6 +20,8 @@ from ..knowledge_sources.parsers import extract_blocks
 from ..utils import pydantic_parse_fn
 from ..utils.llm import construct_chat_model
 from ..utils.retry_loops import async_parse_retry_loop, parse_retry_loop
+from ..utils.event_loop import run_coroutine_sync
+from ..utils.lm_scheduler import PRIORITY_NORMAL, configure_scheduler
 
 
 class BaseLMReasoning:
@@ -49,6 +53,11 @@ class BaseLMReasoning:
         debug_mode=False,
         name='base_reasoning',
         parallel_api=False,
+        priority=PRIORITY_NORMAL,
+        max_in_flight=None,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        lm_provider=None,
         **kwargs,
     ):
         """
@@ -62,6 +71,12 @@ class BaseLMReasoning:
             callbacks (list): A list of callback functions to be called on the language model's response.
             debug_mode (bool): Enables debug mode if True, providing additional output for debugging.
             name (str): The name of the reasoning instance.
+            parallel_api (bool): Runs multiple message threads concurrently if True.
+            priority (int): Default scheduling priority of this module's LM calls, see utils/lm_scheduler.py.
+            max_in_flight (int): If given, sets the shared LM scheduler's max concurrent requests.
+            requests_per_minute (int): If given, sets the shared LM scheduler's RPM limit.
+            tokens_per_minute (int): If given, sets the shared LM scheduler's TPM limit.
+            lm_provider (str): 'openai' or 'fake' (local, see utils/fake_llm.py). Defaults to the LM_PROVIDER env var.
             **kwargs: Additional keyword arguments for future extensions.
         """
         # Models
@@ -71,6 +86,7 @@ class BaseLMReasoning:
             request_timeout=request_timeout,
             verbose=verbose,
             callbacks=callbacks,
+            provider=lm_provider,
         )
 
         # misc settings
@@ -78,6 +94,10 @@ class BaseLMReasoning:
         self.debug_mode = debug_mode
         self.verbose = verbose
         self.parallel_api = parallel_api
+        self.priority = priority
+
+        if any(limit is not None for limit in (max_in_flight, requests_per_minute, tokens_per_minute)):
+            configure_scheduler(max_in_flight, requests_per_minute, tokens_per_minute)
 
         self.post_init()
 
@@ -96,6 +116,20 @@ class BaseLMReasoning:
             print(f'{self.name}\n')
             pp(self.llm.dict())
 
+    def rebind_callback(self, old, new):
+        """
+        Makes the LM report to new instead of old, eg the per-task logging handler of a copy of this module.
+        The LM is copied (sharing its client), so other modules using it are unaffected.
+
+        Args:
+            old: The callback handler to replace.
+            new: The callback handler replacing it.
+        """
+        callbacks = self.llm.callbacks
+        if isinstance(callbacks, list) and any(callback is old for callback in callbacks):
+            callbacks = [new if callback is old else callback for callback in callbacks]
+            self.llm = self.llm.copy(update={'callbacks': callbacks})
+
     # TODO: eventually deprecate this when refactor legacy code
     @staticmethod
     def extract_blocks(text, identifier=''):
@@ -138,25 +172,26 @@ class BaseLMReasoning:
             Raises:
                 AssertionError: If 'format_instructions' is expected in the system template but not found in the variables or parser.
             """
-            if single_sys_vars or ('{format_instructions}' in sys_template):
-                sys_prompt_template = SystemMessagePromptTemplate.from_template(sys_template)
+            if single_sys_vars or needs_format_instructions:
+                sys_prompt_template = compile_sys_template(sys_template)
                 if single_sys_vars is None:
                     single_sys_vars = {}
-                if ('{format_instructions}' in sys_template) and ('format_instructions' not in single_sys_vars):
+                if needs_format_instructions and ('format_instructions' not in single_sys_vars):
                     assert parser is not None, "format_instructions expected but not found in vars or parser"
-                    single_sys_vars['format_instructions'] = parser.get_format_instructions()
+                    single_sys_vars['format_instructions'] = get_format_instructions(parser)
                 sys_message = sys_prompt_template.format(**single_sys_vars)
             else:
                 sys_message = SystemMessage(content=sys_template)
 
             if single_human_vars:
-                human_prompt_template = HumanMessagePromptTemplate.from_template(human_template)
+                human_prompt_template = compile_human_template(human_template)
                 human_message = human_prompt_template.format(**single_human_vars)
             else:
                 human_message = HumanMessage(content=human_template)
 
             return [sys_message, human_message]
 
+        needs_format_instructions = '{format_instructions}' in sys_template
         if isinstance(sys_vars, list) or isinstance(human_vars, list):
             if isinstance(sys_vars, list) and isinstance(human_vars, list):
                 assert len(sys_vars) == len(human_vars), "sys_vars and human_vars lists must have the same length"
@@ -174,8 +209,7 @@ class BaseLMReasoning:
     Reasoning Actions (from and to working mem)
     """
 
-    # TODO: allow LCEL (so can parallel chain)
-    def lm_reason(
+    def _prepare_lm_call(
         self,
         sys_template='',
         human_template='',
@@ -183,10 +217,7 @@ class BaseLMReasoning:
         llm=None,
         sys_vars=None,
         human_vars=None,
-        parse_tries=3,
-        fallback=None,
         parser=None,
-        return_messages=False,
         return_json=False,
         pydantic_model=None,
         messages=None,
@@ -194,25 +225,10 @@ class BaseLMReasoning:
         messages_list=None,
     ):
         """
-        Performs reasoning by interacting with the language model using provided templates.
-
-        This method sends messages to the language model based on the provided system and human templates, 
-        parses the response, and optionally retries if parsing fails.
-
-        Parameters:
-            sys_template (str): The str template for system messages.
-            human_template (str): The str template for human messages.
-            parse_fn (callable): The function to parse the language model's response.
-            llm: The language model instance to use. If None, uses the instance initialized during class instantiation.
-            parse_tries (int): The number of retries for parsing the language model's response.
-            fallback: A fallback value to return in case parsing fails after all retries.
-            parser: An optional parser to use instead of the default.
-            return_messages (bool): If True, returns the messages sent to and received from the language model.
-            return_json (bool): If True, returns the response in JSON format.
-            pydantic_model: An optional Pydantic model to validate the parsed response.
+        Shared setup for lm_reason and alm_reason: resolves the parse fn, parser, messages and LM binding.
 
         Returns:
-            The parsed response from the language model, optionally validated by a Pydantic model.
+            dict: kwargs 'messages', 'messages_list', 'parse_fn', 'llm', 'parser' and 'return_type'.
         """
         # structured_lm_reason stuff here
         if structured:
@@ -239,47 +255,179 @@ class BaseLMReasoning:
         elif return_json:
             llm = llm.bind(response_format={"type": "json_object"})
 
+        return {
+            'messages': messages,
+            'messages_list': messages_list,
+            'parse_fn': parse_fn,
+            'llm': llm,
+            'parser': parser,
+            'return_type': return_type,
+        }
+
+    # TODO: allow LCEL (so can parallel chain)
+    def lm_reason(
+        self,
+        sys_template='',
+        human_template='',
+        parse_fn=None,
+        llm=None,
+        sys_vars=None,
+        human_vars=None,
+        parse_tries=3,
+        fallback=None,
+        parser=None,
+        return_messages=False,
+        return_json=False,
+        pydantic_model=None,
+        messages=None,
+        structured=False,
+        messages_list=None,
+        priority=None,
+        stream_fn=None,
+    ):
+        """
+        Performs reasoning by interacting with the language model using provided templates.
+
+        This method sends messages to the language model based on the provided system and human templates, 
+        parses the response, and optionally retries if parsing fails.
+
+        Parameters:
+            sys_template (str): The str template for system messages.
+            human_template (str): The str template for human messages.
+            parse_fn (callable): The function to parse the language model's response.
+            llm: The language model instance to use. If None, uses the instance initialized during class instantiation.
+            parse_tries (int): The number of retries for parsing the language model's response.
+            fallback: A fallback value to return in case parsing fails after all retries.
+            parser: An optional parser to use instead of the default.
+            return_messages (bool): If True, returns the messages sent to and received from the language model.
+            return_json (bool): If True, returns the response in JSON format.
+            pydantic_model: An optional Pydantic model to validate the parsed response.
+            priority (int): Scheduling priority of this call. Defaults to self.priority.
+            stream_fn (callable): If given, streams the response and stops generation once stream_fn()'s extractor
+                has what it needs, eg StreamingBlockExtractor for the first code block. Not for pydantic_model calls.
+
+        Returns:
+            The parsed response from the language model, optionally validated by a Pydantic model.
+        """
+        call = self._prepare_lm_call(
+            sys_template=sys_template,
+            human_template=human_template,
+            parse_fn=parse_fn,
+            llm=llm,
+            sys_vars=sys_vars,
+            human_vars=human_vars,
+            parser=parser,
+            return_json=return_json,
+            pydantic_model=pydantic_model,
+            messages=messages,
+            structured=structured,
+            messages_list=messages_list,
+        )
+        call['priority'] = self.priority if priority is None else priority
+        assert stream_fn is None or call['return_type'] == 'ai_message', 'streaming needs plain text responses'
+        call['stream_fn'] = stream_fn
+
         # TODO: langgraph for retries
         # TODO: handle case where forgot to turn on parallel_api
-        if self.parallel_api and messages_list is not None:
-            async def async_eval_loop():
-                tasks = []
-                for msgs in messages_list:
-                    tasks.append(
-                        async_parse_retry_loop(
-                            msgs,
-                            parse_fn,
-                            llm,
-                            parse_tries=parse_tries,
-                            fallback=fallback,
-                            debug_mode=self.debug_mode,
-                            parser=parser,
-                            return_messages=return_messages,
-                            verbose=self.verbose,
-                            return_type=return_type,
-                            name=self.name,
-                        )
-                    )
-                results = await asyncio.gather(*tasks)
-                return results
-            out = asyncio.run(async_eval_loop())
+        if self.parallel_api and call['messages_list'] is not None:
+            # runs on the shared background loop so the LM client's connections stay warm across calls
+            out = run_coroutine_sync(
+                self._async_eval_loop(call, parse_tries=parse_tries, fallback=fallback, return_messages=return_messages)
+            )
         else:
             out = parse_retry_loop(
-                messages,
-                parse_fn,
-                llm,
+                call['messages'],
+                call['parse_fn'],
+                call['llm'],
                 parse_tries=parse_tries,
                 fallback=fallback,
                 debug_mode=self.debug_mode,
-                parser=parser,
+                parser=call['parser'],
                 return_messages=return_messages,
                 verbose=self.verbose,
-                return_type=return_type,
+                return_type=call['return_type'],
                 name=self.name,
+                priority=call['priority'],
+                stream_fn=call['stream_fn'],
             )
 
         return out
 
+    async def alm_reason(
+        self,
+        sys_template='',
+        human_template='',
+        parse_fn=None,
+        llm=None,
+        sys_vars=None,
+        human_vars=None,
+        parse_tries=3,
+        fallback=None,
+        parser=None,
+        return_messages=False,
+        return_json=False,
+        pydantic_model=None,
+        messages=None,
+        structured=False,
+        messages_list=None,
+        priority=None,
+        stream_fn=None,
+    ):
+        """
+        Async version of lm_reason, for callers that already run in an event loop.
+        Args are as in lm_reason. Returns a list of results if there are multiple message threads.
+        """
+        call = self._prepare_lm_call(
+            sys_template=sys_template,
+            human_template=human_template,
+            parse_fn=parse_fn,
+            llm=llm,
+            sys_vars=sys_vars,
+            human_vars=human_vars,
+            parser=parser,
+            return_json=return_json,
+            pydantic_model=pydantic_model,
+            messages=messages,
+            structured=structured,
+            messages_list=messages_list,
+        )
+        call['priority'] = self.priority if priority is None else priority
+        assert stream_fn is None or call['return_type'] == 'ai_message', 'streaming needs plain text responses'
+        call['stream_fn'] = stream_fn
+        if call['messages_list'] is not None:
+            return await self._async_eval_loop(
+                call, parse_tries=parse_tries, fallback=fallback, return_messages=return_messages
+            )
+        return await self._async_retry_loop(
+            call, call['messages'], parse_tries=parse_tries, fallback=fallback, return_messages=return_messages
+        )
+
+    async def _async_retry_loop(self, call, msgs, parse_tries=3, fallback=None, return_messages=False):
+        return await async_parse_retry_loop(
+            msgs,
+            call['parse_fn'],
+            call['llm'],
+            parse_tries=parse_tries,
+            fallback=fallback,
+            debug_mode=self.debug_mode,
+            parser=call['parser'],
+            return_messages=return_messages,
+            verbose=self.verbose,
+            return_type=call['return_type'],
+            name=self.name,
+            priority=call['priority'],
+            stream_fn=call['stream_fn'],
+        )
+
+    async def _async_eval_loop(self, call, parse_tries=3, fallback=None, return_messages=False):
+        tasks = [
+            self._async_retry_loop(
+                call, msgs, parse_tries=parse_tries, fallback=fallback, return_messages=return_messages
+            )
+            for msgs in call['messages_list']
+        ]
+        return await asyncio.gather(*tasks)
+
     # TODO: eventually deprecate below for having lm_reason with structured=True
     def structured_lm_reason(
         self,
@@ -334,3 +482,29 @@ class BaseLMReasoning:
 
 def return_content(x):
     return x.content
+
+
+# compiled templates are immutable, so they are shared across calls instead of re-parsed per message thread
+@lru_cache(maxsize=512)
+def compile_sys_template(template):
+    return SystemMessagePromptTemplate.from_template(template)
+
+
+@lru_cache(maxsize=512)
+def compile_human_template(template):
+    return HumanMessagePromptTemplate.from_template(template)
+
+
+def get_format_instructions(parser):
+    """
+    parser.get_format_instructions(), computed once per pydantic model for PydanticOutputParsers
+    (structured calls build a new parser each time, so caching on the parser object would not hit).
+    """
+    if type(parser) is PydanticOutputParser:
+        return pydantic_format_instructions(parser.pydantic_object)
+    return parser.get_format_instructions()
+
+
+@lru_cache(maxsize=128)
+def pydantic_format_instructions(pydantic_object):
+    return PydanticOutputParser(pydantic_object=pydantic_object).get_format_instructions()
@@ -0,0 +1,153 @@
+"""
+Graph-augmented retrieval: vector hits are mapped to graph nodes, then a bounded k-hop neighbourhood is expanded
+"""
+import heapq
+import logging
+
+from .base_retrieval import BaseRetrieval
+
+logger = logging.getLogger("logger")
+
+
+class GraphVectorRetrieval(BaseRetrieval):
+    """
+    Retrieves the top-k documents from a vector db, maps each to an NxDb node via a metadata id,
+    then expands a bounded k-hop neighbourhood ranked by edge relation weights.
+
+    Expansion runs on a precomputed adjacency snapshot (see NxDb.adjacency_snapshot) so it never touches networkx
+    at query time. The snapshot is rebuilt when the graph db's version changes (any change made through NxDb's
+    methods) or when refresh_snapshot is called (call it yourself after editing graph_db.graph directly).
+
+    Attributes:
+        graph_db (NxDb): The graph database holding the nodes.
+        id_key (str): Metadata key on the vector docs that holds the node id.
+        num_hops (int): Max hops to expand from each seed node.
+        max_nodes (int): Max number of expanded nodes returned.
+        hop_decay (float): Multiplier applied to the score at each hop.
+        relation_weights (dict): Mapping of relation to weight. Relations with weight <= 0 are not traversed.
+        default_relation_weight (float): Weight of relations not in relation_weights.
+    """
+    def __init__(
+        self,
+        db,
+        graph_db,
+        id_key='node_id',
+        num_hops=1,
+        max_nodes=10,
+        hop_decay=0.5,
+        relation_weights=None,
+        default_relation_weight=1.0,
+        undirected=True,
+        transform=None,
+        verbose=False,
+        debug_mode=False,
+        retrieval_top_k=5,
+    ):
+        super().__init__(
+            db,
+            transform=transform,
+            verbose=verbose,
+            debug_mode=debug_mode,
+            retrieval_top_k=retrieval_top_k,
+        )
+        self.graph_db = graph_db
+        self.id_key = id_key
+        self.num_hops = num_hops
+        self.max_nodes = max_nodes
+        self.hop_decay = hop_decay
+        self.relation_weights = relation_weights or {}
+        self.default_relation_weight = default_relation_weight
+        self.undirected = undirected
+
+        self._adjacency = {}
+        self._snapshot_version = None
+
+    """
+    helper fns
+    """
+    def refresh_snapshot(self):
+        """
+        Rebuilds the adjacency snapshot from the graph db.
+        """
+        self._adjacency = self.graph_db.adjacency_snapshot(
+            relation_weights=self.relation_weights,
+            default_weight=self.default_relation_weight,
+            undirected=self.undirected,
+        )
+        self._snapshot_version = self.graph_db.version
+
+    def get_adjacency(self):
+        if self._snapshot_version != self.graph_db.version:
+            self.refresh_snapshot()
+        return self._adjacency
+
+    def expand(self, seed_ids, num_hops=None, max_nodes=None):
+        """
+        Expands the neighbourhood of the seed nodes. A node's score is the best product of
+        edge weights (times hop_decay per hop) over all paths from any seed.
+
+        Args:
+            seed_ids (list): Node ids to expand from. Ids not in the graph are skipped.
+            num_hops (int, optional): Overrides self.num_hops.
+            max_nodes (int, optional): Overrides self.max_nodes.
+
+        Returns:
+            list: (node_id, score, relation, hops) tuples for non-seed nodes, sorted by score descending.
+        """
+        num_hops = self.num_hops if num_hops is None else num_hops
+        max_nodes = self.max_nodes if max_nodes is None else max_nodes
+        adjacency = self.get_adjacency()
+
+        seeds = {node_id for node_id in seed_ids if node_id in adjacency}
+        best = {}
+        frontier = {node_id: 1.0 for node_id in seeds}
+        for hop in range(1, num_hops + 1):
+            next_frontier = {}
+            for node_id, score in frontier.items():
+                for neighbor, weight, relation in adjacency[node_id]:
+                    if neighbor in seeds:
+                        continue
+                    new_score = score * weight * self.hop_decay
+                    if new_score > best.get(neighbor, (0,))[0]:
+                        best[neighbor] = (new_score, relation, hop)
+                        next_frontier[neighbor] = new_score
+            frontier = next_frontier
+            if not frontier:
+                break
+
+        top = heapq.nlargest(max_nodes, best.items(), key=lambda x: x[1][0])
+        return [(node_id, score, relation, hops) for node_id, (score, relation, hops) in top]
+
+    """
+    Retrieval
+    """
+    def retrieve(self, query, k_new=0, num_hops=None, max_nodes=None, **kwargs):
+        """
+        Args:
+            query: The query text.
+            k_new (int, optional): Overrides retrieval_top_k for the vector search.
+            num_hops (int, optional): Overrides self.num_hops.
+            max_nodes (int, optional): Overrides self.max_nodes.
+            **kwargs: Passed to the vector db retrieve (eg with_scores).
+
+        Returns:
+            dict: 'docs' holds the vector hits as returned by the vector db,
+                'nodes' holds (node_id, score, relation, hops, attributes) tuples of the expanded neighbourhood.
+        """
+        k = k_new if k_new else self.retrieval_top_k
+        docs = self.db.retrieve(query, k=k, **kwargs)
+
+        seed_ids = []
+        for doc in docs:
+            doc_obj = doc[0] if isinstance(doc, tuple) else doc
+            node_id = doc_obj.metadata.get(self.id_key)
+            if node_id is not None:
+                seed_ids.append(node_id)
+
+        expanded = self.expand(seed_ids, num_hops=num_hops, max_nodes=max_nodes)
+        nodes = [
+            (node_id, score, relation, hops, self.graph_db.get_node(node_id))
+            for node_id, score, relation, hops in expanded
+        ]
+        logger.info(f"Expanded {len(seed_ids)} seed nodes to {len(nodes)} graph nodes\n")
+        return {'docs': docs, 'nodes': nodes}
@@ -0,0 +1,122 @@
+"""
+Lexical (BM25) retrieval over a SQLite FTS5 table, and hybrid retrieval fusing it with vector retrieval
+"""
+import re
+
+from langchain.schema import Document
+
+from .base_retrieval import BaseRetrieval
+
+# cues that look like an identifier (function name, task id, dotted path) rather than prose: a single token with an
+# inner separator (_ . / ::) or an inner capital (camelCase). Plain words are left to the vector db.
+CUE_TOKEN_PATTERN = re.compile(r"^[\w.\-/:]+$")
+CUE_MARKER_PATTERN = re.compile(r"\w(?:_|\.|/|::)\w|[a-z][A-Z]")
+
+
+def is_exact_cue(query):
+    query = query.strip()
+    return bool(CUE_TOKEN_PATTERN.match(query) and CUE_MARKER_PATTERN.search(query))
+
+
+class LexicalRetrieval(BaseRetrieval):
+    """
+    BM25 retrieval via SQLiteDB.fts_search. Needs no embedding call.
+    Returns langchain Documents so results can be formatted like vector results.
+    Scores are FTS5 bm25 values where lower is better, like the L2 distances of the vector db.
+    """
+    def __init__(self, db, table_name='lexical', transform=None, verbose=False, debug_mode=False, retrieval_top_k=5):
+        super().__init__(
+            db,
+            transform=transform,
+            verbose=verbose,
+            debug_mode=debug_mode,
+            retrieval_top_k=retrieval_top_k,
+        )
+        self.table_name = table_name
+
+    def retrieve(self, query, k_new=0, with_scores=False, **kwargs):
+        k = k_new if k_new else self.retrieval_top_k
+        rows = self.db.fts_search(self.table_name, query, k=k)
+        docs = [(Document(page_content=content, metadata=metadata), score) for _, content, metadata, score in rows]
+        if with_scores:
+            return docs
+        return [doc for doc, _ in docs]
+
+
+class HybridRetrieval(BaseRetrieval):
+    """
+    Fuses lexical and vector retrieval with reciprocal-rank fusion (RRF): score = sum over lists of 1 / (rrf_k + rank).
+    Documents are matched across the two lists by page_content, since both index the same text.
+
+    If the query looks like an exact identifier (eg a function name or task id, see is_exact_cue) and lexical
+    retrieval finds it, the lexical results are returned directly and the vector db (and so the embedding API) is
+    skipped.
+
+    Note: with_scores returns the fused RRF score, where higher is better.
+    """
+    def __init__(
+        self,
+        vector_retrieval,
+        lexical_retrieval,
+        rrf_k=60,
+        candidate_multiplier=2,
+        skip_vector_on_exact=True,
+        transform=None,
+        verbose=False,
+        debug_mode=False,
+        retrieval_top_k=5,
+    ):
+        super().__init__(
+            None,
+            transform=transform,
+            verbose=verbose,
+            debug_mode=debug_mode,
+            retrieval_top_k=retrieval_top_k,
+        )
+        self.vector_retrieval = vector_retrieval
+        self.lexical_retrieval = lexical_retrieval
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.skip_vector_on_exact = skip_vector_on_exact
+
+    def retrieve(self, query, k_new=0, with_scores=False, **kwargs):
+        k = k_new if k_new else self.retrieval_top_k
+        candidate_k = k * self.candidate_multiplier
+
+        lexical_docs = self.lexical_retrieval.retrieve(query, k_new=candidate_k)
+        if self.skip_vector_on_exact and lexical_docs and is_exact_cue(query):
+            docs = lexical_docs[:k]
+            if with_scores:
+                return [(doc, 1 / (self.rrf_k + rank)) for rank, doc in enumerate(docs, start=1)]
+            return docs
+
+        vector_docs = self.vector_retrieval.retrieve(query, k_new=candidate_k, **kwargs)
+
+        fused = reciprocal_rank_fusion([lexical_docs, vector_docs], rrf_k=self.rrf_k)[:k]
+        if with_scores:
+            return fused
+        return [doc for doc, _ in fused]
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k=60, key_fn=None):
+    """
+    Fuses ranked lists of documents with reciprocal-rank fusion.
+
+    Args:
+        ranked_lists (list): Lists of documents, each best first.
+        rrf_k (int): RRF constant, dampens the weight of top ranks.
+        key_fn (callable, optional): Maps a document to the key used to match it across lists. Defaults to page_content.
+
+    Returns:
+        list: (document, fused_score) tuples, best first.
+    """
+    if key_fn is None:
+        key_fn = lambda doc: doc.page_content
+    scores = {}
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = key_fn(doc)
+            scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda x: x[1], reverse=True)
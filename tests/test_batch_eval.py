@@ -0,0 +1,75 @@
+import functools
+import os
+
+from argparse import Namespace
+
+from cognitive_base.agents.base_agent import BaseAgent
+from cognitive_base.agents.batch_eval import batch_evaluate
+from cognitive_base.utils import dump_json, load_json
+from cognitive_base.utils.lm_metrics import get_lm_metrics
+from cognitive_base.utils.log import construct_task_folder, save_lm_metrics
+
+
+class ListMem:
+    write_methods = ('update',)
+
+    def __init__(self):
+        self.entries = ['fact']
+
+    def update(self, entry, **kwargs):
+        self.entries.append(entry)
+
+
+class Handler:
+    task_id = None
+
+
+class EchoAgent(BaseAgent):
+    """
+    Passes tasks with even ids, and tries to write to memory as it goes
+    """
+    def test_one(self, full_task):
+        if full_task['task_id'] == 'bad':
+            raise ValueError('broken task')
+        self.semantic_mem.update(full_task['task'])
+        get_lm_metrics().record_call('echo', None, latency=0.01)
+        save_lm_metrics(self.result_dir, {'mode': 'test', 'task_id': full_task['task_id']})
+        success = int(full_task['task_id']) % 2 == 0 and self.semantic_mem.entries == ['fact']
+        task_folder = construct_task_folder(self.result_dir, 'test', full_task['task_id'])
+        dump_json({'reward': success, 'pid': os.getpid()}, f"{task_folder}/output.json")
+        return success, {}
+
+
+def make_agent(result_dir):
+    args = Namespace(
+        max_attempts_per_task=1, max_train_iter=0, result_dir=result_dir, eval_later=False,
+        use_public_tests=False, debug_mode=False, verbose=False,
+    )
+    return EchoAgent(args, components={'semantic_mem': ListMem()}, handler=Handler())
+
+
+def test_batch_evaluate_in_process(tmp_path):
+    tasks = [{'task': f'task {i}'} for i in range(4)] + [{'task': 'oops', 'task_id': 'bad'}]
+    results, summary = batch_evaluate(lambda: make_agent(str(tmp_path)), tasks)
+
+    assert [result['task_id'] for result in results] == ['0', '1', '2', '3', 'bad']
+    assert [result['success'] for result in results] == [True, False, True, False, False]
+    assert results[4]['error'] == "ValueError('broken task')"
+    assert results[0]['output']['reward'] is True
+    assert summary['num_success'] == 2 and summary['num_errors'] == 1
+    assert (tmp_path / 'test_summary.json').exists()
+
+
+def test_batch_evaluate_in_workers(tmp_path):
+    calls_before = get_lm_metrics().run_metrics().get('echo', {}).get('calls', 0)
+    tasks = [{'task': f'task {i}'} for i in range(6)]
+    results, summary = batch_evaluate(
+        functools.partial(make_agent, str(tmp_path)), tasks, num_workers=2, result_dir=str(tmp_path)
+    )
+    assert [result['success'] for result in results] == [True, False] * 3
+    assert all(result['worker'] != os.getpid() for result in results)
+    assert summary['pass_rate'] == 0.5
+    # every worker's LM calls, not just the last writer's
+    assert load_json(str(tmp_path / 'lm_metrics.json'))['echo']['calls'] == calls_before + 6
+    assert all('lm_stats' not in result for result in results)
+    assert len((tmp_path / 'lm_metrics.jsonl').read_text().splitlines()) == 6
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from cognitive_base.utils.ckpt_snapshot import CkptSnapshotStore
+from cognitive_base.utils.log import restore_train_ckpt
+
+
+def read_tree(root):
+    tree = {}
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            with open(path, 'rb') as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+def test_snapshots_store_only_changed_chunks(tmp_path):
+    ckpt_dir = tmp_path / 'ckpt'
+    (ckpt_dir / 'skill' / 'vectordb').mkdir(parents=True)
+    (ckpt_dir / 'empty').mkdir()
+    (ckpt_dir / 'skill' / 'entries.json').write_text('{"a": 1}')
+    big = bytearray(os.urandom(4 * 1024))
+    (ckpt_dir / 'skill' / 'vectordb' / 'index.bin').write_bytes(big)
+
+    store = CkptSnapshotStore(str(tmp_path / 'saved_train_ckpt'), chunk_size=1024)
+    stats = store.snapshot(str(ckpt_dir), 5, info={'train_iter': 5})
+    assert stats == {'files': 2, 'files_hashed': 2, 'bytes_written': 4 * 1024 + 8}
+    first = read_tree(ckpt_dir)
+
+    # one chunk of the big file is rewritten in place, the json file is untouched
+    big[1500] ^= 0xFF
+    (ckpt_dir / 'skill' / 'vectordb' / 'index.bin').write_bytes(big)
+    stats = store.snapshot(str(ckpt_dir), 10)
+    assert stats == {'files': 2, 'files_hashed': 1, 'bytes_written': 1024}
+    assert store.list_snapshots() == [5, 10]
+
+    restored = tmp_path / 'restored'
+    assert store.restore(5, str(restored)) == {'train_iter': 5}
+    assert read_tree(restored) == first
+    assert (restored / 'empty').is_dir()
+
+    with pytest.raises(FileExistsError):
+        store.restore(10, str(restored))
+    store.restore(10, str(restored), overwrite=True)
+    assert read_tree(restored) == read_tree(ckpt_dir)
+
+
+def test_restore_legacy_full_copy(tmp_path):
+    legacy = tmp_path / 'saved_train_ckpt' / '3' / 'episodic'
+    legacy.mkdir(parents=True)
+    (legacy / 'episode_state.json').write_text('{}')
+
+    store = CkptSnapshotStore(str(tmp_path / 'saved_train_ckpt'))
+    assert store.list_snapshots() == [3]
+    assert store.restore(3, str(tmp_path / 'ckpt')) is None
+    assert (tmp_path / 'ckpt' / 'episodic' / 'episode_state.json').read_text() == '{}'
+    with pytest.raises(FileNotFoundError):
+        store.restore(4, str(tmp_path / 'other'))
+
+
+def test_failed_restore_leaves_ckpt_dir_untouched(tmp_path, monkeypatch):
+    ckpt_dir = tmp_path / 'ckpt'
+    (ckpt_dir / 'skill').mkdir(parents=True)
+    (ckpt_dir / 'skill' / 'entries.json').write_text('{"a": 1}')
+    store = CkptSnapshotStore(str(tmp_path / 'saved_train_ckpt'))
+    store.snapshot(str(ckpt_dir), 1)
+    (ckpt_dir / 'skill' / 'entries.json').write_text('{"a": 2}')
+    live = read_tree(ckpt_dir)
+
+    # a train_iter without a snapshot
+    with pytest.raises(FileNotFoundError):
+        restore_train_ckpt(str(tmp_path), str(ckpt_dir), train_iter=7)
+    assert read_tree(ckpt_dir) == live
+
+    # a restore failing partway
+    def broken_chmod(path, mode):
+        raise OSError('disk error')
+    monkeypatch.setattr(os, 'chmod', broken_chmod)
+    with pytest.raises(OSError):
+        store.restore(1, str(ckpt_dir), overwrite=True)
+    monkeypatch.undo()
+    assert read_tree(ckpt_dir) == live
+    assert sorted(os.listdir(tmp_path)) == ['ckpt', 'saved_train_ckpt']
+
+    assert restore_train_ckpt(str(tmp_path), str(ckpt_dir)) == 1
+    assert (ckpt_dir / 'skill' / 'entries.json').read_text() == '{"a": 1}'
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from cognitive_base.utils.ckpt_writer import CkptWriter
+
+
+def test_disabled_writer_runs_inline():
+    writer = CkptWriter()
+    out = []
+    writer.submit(out.append, 1, key='a')
+    assert out == [1]
+    assert writer.pending == 0
+
+
+def test_writes_run_in_order_and_coalesce():
+    writer = CkptWriter(enabled=True)
+    gate = threading.Event()
+    out = []
+    writer.submit(gate.wait)
+    writer.submit(out.append, 'entries v1', key='entries.json')
+    writer.submit(out.append, 'rules v1', key='rules.json')
+    writer.submit(out.append, 'entries v2', key='entries.json')
+    writer.submit(out.append, 'snapshot')
+    # queued after the snapshot, so not folded into the write before it
+    writer.submit(out.append, 'entries v3', key='entries.json')
+    assert writer.pending == 5
+
+    gate.set()
+    writer.flush()
+    assert out == ['entries v2', 'rules v1', 'snapshot', 'entries v3']
+    assert writer.pending == 0
+
+
+def test_queue_is_bounded():
+    writer = CkptWriter(max_pending=1, enabled=True)
+    gate = threading.Event()
+    writer.submit(gate.wait)
+    writer.submit(lambda: None)
+    submitted = threading.Event()
+
+    def submit_more():
+        writer.submit(lambda: None)
+        submitted.set()
+
+    threading.Thread(target=submit_more).start()
+    assert not submitted.wait(0.1)
+    gate.set()
+    assert submitted.wait(1)
+    writer.flush()
+
+
+def test_flush_raises_failed_write():
+    writer = CkptWriter(enabled=True)
+    out = []
+
+    def fail():
+        raise OSError('disk full')
+
+    writer.submit(fail)
+    writer.submit(out.append, 'after')
+    with pytest.raises(OSError):
+        writer.flush()
+    assert out == ['after']
+    writer.flush()
+
+
+def test_db_writes_wait_for_queued_snapshot(tmp_path):
+    writer = CkptWriter(enabled=True)
+    db_file = tmp_path / 'chroma.sqlite3'
+    db_file.write_text('iter 1')
+    gate = threading.Event()
+    snapshots = []
+    writer.submit(gate.wait)
+    writer.submit(lambda: snapshots.append(db_file.read_text()), reads_files=True)
+    written = threading.Event()
+
+    def write_next_iter():
+        with writer.db_write():
+            db_file.write_text('iter 2')
+        written.set()
+
+    threading.Thread(target=write_next_iter).start()
+    assert not written.wait(0.1)
+    gate.set()
+    assert written.wait(1)
+    writer.flush()
+    assert snapshots == ['iter 1']
+    assert db_file.read_text() == 'iter 2'
@@ -1,4 +1,8 @@
-from cognitive_base.utils.code_parse import extract_from_ast
+import pytest
+
+from cognitive_base.utils.code_parse import (
+    extract_from_ast, get_fn_name, assert_modules_in_whitelist
+)
 
 def test_extract_from_ast_with_import():
     # Test code that imports math and uses math.pi
@@ -25,3 +29,39 @@ def test_extract_from_ast_simple_import():
     assert len(imports) == 1
     assert 'import math' in imports[0]
     assert len(functions) == 0
+
+def test_extract_from_ast_dependencies_and_parents():
+    code = """
+from helpers import util
+
+def outer(xs):
+    def inner(x):
+        return helper(x) + len(xs)
+    return [inner(x) for x in sorted(xs)] + util(xs) + outer(xs[1:])
+
+def main():
+    return outer([1])
+"""
+    functions, imports, deps, modules = extract_from_ast(code)
+
+    assert [(fn['name'], fn['no_parent']) for fn in functions] == [('outer', True), ('main', True), ('inner', False)]
+    assert functions[0]['body'].startswith('def outer(xs):')
+    # builtins, imported fns, recursion and inner fns are not dependencies
+    assert deps == {'helper'}
+    assert modules == {'helpers'}
+    assert get_fn_name(code) == 'inner'
+
+    # memoized, but callers get their own copies
+    deps.add('other')
+    assert extract_from_ast(code)[2] == {'helper'}
+
+
+def test_whitelist_allows_listed_modules_only():
+    from cognitive_base.utils import code_parse
+
+    assert 'math' in code_parse.whitelist_modules
+    assert_modules_in_whitelist({'math', 'collections.abc', 'numpy.linalg'})
+    # submodules of whitelisted packages are not whitelisted unless listed
+    for module in ['os', 'mathx', 'os.path', 'numpy.f2py', 'numpy.ctypeslib', 'numpy.distutils', None]:
+        with pytest.raises(AssertionError):
+            assert_modules_in_whitelist([module])
@@ -0,0 +1,35 @@
+from langchain.output_parsers import PydanticOutputParser
+from langchain.prompts import HumanMessagePromptTemplate, SystemMessagePromptTemplate
+
+from cognitive_base.reasoning.base_lm_reasoning import BaseLMReasoning, pydantic_format_instructions
+from cognitive_base.reasoning.scenario_mixin import Concept
+
+SYS_TEMPLATE = "You are {role}.\n{format_instructions}"
+HUMAN_TEMPLATE = "Task: {task}"
+
+
+def uncached_thread(sys_vars, human_vars, parser):
+    sys_vars = {**sys_vars, 'format_instructions': parser.get_format_instructions()}
+    return [
+        SystemMessagePromptTemplate.from_template(SYS_TEMPLATE).format(**sys_vars),
+        HumanMessagePromptTemplate.from_template(HUMAN_TEMPLATE).format(**human_vars),
+    ]
+
+
+def test_cached_templates_render_the_same_messages():
+    human_vars = [{'task': 'sort a list'}, {'task': 'find a gcd'}]
+    for _ in range(2):
+        # a new parser per call, as structured calls make
+        parser = PydanticOutputParser(pydantic_object=Concept)
+        threads = BaseLMReasoning.construct_messages(
+            SYS_TEMPLATE, HUMAN_TEMPLATE, sys_vars={'role': 'a coder'}, human_vars=human_vars, parser=parser
+        )
+        assert threads == [uncached_thread({'role': 'a coder'}, vars_, parser) for vars_ in human_vars]
+
+    assert pydantic_format_instructions.cache_info().currsize >= 1
+    assert pydantic_format_instructions.cache_info().hits >= 1
+
+
+def test_plain_templates_are_not_formatted():
+    [[sys_message, human_message]] = BaseLMReasoning.construct_messages("keep {braces}", "as {is}")
+    assert (sys_message.content, human_message.content) == ("keep {braces}", "as {is}")
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from langchain.schema import HumanMessage
+
+from cognitive_base.reasoning.base_lm_reasoning import BaseLMReasoning
+from cognitive_base.utils.event_loop import get_background_loop, run_coroutine_sync
+
+
+def make_module(monkeypatch, **kwargs):
+    monkeypatch.setenv('FAKE_LM_LATENCY', '0')
+    return BaseLMReasoning(lm_provider='fake', verbose=False, **kwargs)
+
+
+def test_run_coroutine_sync_refuses_the_loop_thread():
+    async def nested():
+        return run_coroutine_sync(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError, match='background loop thread'):
+        run_coroutine_sync(nested())
+    # the loop is still usable afterwards
+    assert run_coroutine_sync(asyncio.sleep(0, result=1)) == 1
+
+
+def test_parallel_api_calls_share_one_loop(monkeypatch):
+    module = make_module(monkeypatch, parallel_api=True)
+    loops = []
+
+    def parse_fn(ai_message):
+        loops.append(asyncio.get_running_loop())
+        return ai_message.content
+
+    messages_list = [[HumanMessage(content='a')], [HumanMessage(content='b')]]
+    assert module.lm_reason(messages_list=messages_list, parse_fn=parse_fn) == ['a', 'b']
+    assert module.lm_reason(messages_list=messages_list, parse_fn=parse_fn) == ['a', 'b']
+    assert len(loops) == 4 and all(loop is get_background_loop() for loop in loops)
+
+
+def test_alm_reason(monkeypatch):
+    module = make_module(monkeypatch)
+
+    async def main():
+        single = await module.alm_reason(messages=[HumanMessage(content='ping')])
+        many = await module.alm_reason(messages_list=[[HumanMessage(content='x')], [HumanMessage(content='y')]])
+        return single, many
+
+    assert asyncio.run(main()) == ('ping', ['x', 'y'])
@@ -0,0 +1,43 @@
+import pytest
+
+from langchain.schema import HumanMessage
+
+from cognitive_base.utils.fake_llm import FakeChatModel, FakeLMError, HashEmbeddings
+from cognitive_base.utils.llm import construct_chat_model, get_embedding_fn
+from cognitive_base.utils.retry_loops import parse_retry_loop
+
+
+def test_hash_embeddings_are_deterministic_unit_vectors():
+    embeddings = HashEmbeddings(dim=64)
+    a, b = embeddings.embed_documents(['hello', 'world'])
+    assert len(a) == 64
+    assert a == HashEmbeddings(dim=64).embed_query('hello')
+    assert a != b
+    assert abs(sum(x * x for x in a) - 1) < 1e-9
+
+
+def test_fake_provider_selected_by_env(monkeypatch):
+    monkeypatch.setenv('LM_PROVIDER', 'fake')
+    monkeypatch.setenv('FAKE_LM_LATENCY', '0')
+    llm = construct_chat_model('gpt-4o')
+    assert isinstance(llm, FakeChatModel)
+    assert llm.invoke([HumanMessage(content='ping')]).content == 'ping'
+    assert isinstance(get_embedding_fn(), HashEmbeddings)
+
+
+def test_fake_chat_failure_injection_and_script():
+    llm = FakeChatModel(responses=['1', '2'], fail_first=1, failure_status_code=429)
+    with pytest.raises(FakeLMError):
+        llm.invoke('x')
+    assert [llm.invoke('x').content for _ in range(3)] == ['1', '2', '1']
+
+    llm = FakeChatModel(responses=['42'], fail_first=2)
+    assert parse_retry_loop([HumanMessage(content='q')], lambda m: int(m.content), llm, backoff_base=0.01) == 42
+    assert llm.num_calls == 3
+
+
+def test_fake_chat_structured_output():
+    from cognitive_base.reasoning.scenario_mixin import Concept
+
+    out = FakeChatModel(responses=['useful for graphs']).with_structured_output(Concept, include_raw=True).invoke('x')
+    assert out['parsed'] == Concept(scenarios='useful for graphs', keywords=['useful', 'for', 'graphs'])
@@ -0,0 +1,69 @@
+import pytest
+
+from langchain_core.documents import Document
+
+from cognitive_base.retrieval.graph_vector_retrieval import GraphVectorRetrieval
+from cognitive_base.utils.database.graph_db.nx_db import NxDb
+
+
+class FakeVectorDb:
+    def __init__(self, node_ids):
+        self.node_ids = node_ids
+
+    def retrieve(self, query, k=5, **kwargs):
+        return [Document(page_content=node_id, metadata={'node_id': node_id}) for node_id in self.node_ids[:k]]
+
+
+def chain_graph():
+    # a -calls-> b -calls-> c -mentions-> d
+    db = NxDb()
+    db.add_nodes_from([(node_id, {'name': node_id}) for node_id in 'abcd'])
+    db.add_edges_from([('a', 'b', 'calls'), ('b', 'c', 'calls'), ('c', 'd', 'mentions')])
+    return db
+
+
+def test_expand_is_bounded_by_hops_and_decays():
+    retrieval = GraphVectorRetrieval(
+        FakeVectorDb([]), chain_graph(), num_hops=2, hop_decay=0.5, relation_weights={'mentions': 0.1}
+    )
+    assert retrieval.expand(['a']) == [('b', 0.5, 'calls', 1), ('c', 0.25, 'calls', 2)]
+
+    expanded = retrieval.expand(['a'], num_hops=3)
+    assert expanded[-1][0] == 'd' and expanded[-1][1] == pytest.approx(0.25 * 0.1 * 0.5)
+    assert retrieval.expand(['a'], num_hops=3, max_nodes=1) == [('b', 0.5, 'calls', 1)]
+    # edges are traversed both ways, seeds are not returned, unknown seeds are skipped
+    assert [node_id for node_id, *_ in retrieval.expand(['c', 'missing'], num_hops=1)] == ['b', 'd']
+
+
+def test_relations_with_zero_weight_are_not_traversed():
+    retrieval = GraphVectorRetrieval(FakeVectorDb([]), chain_graph(), num_hops=3, relation_weights={'mentions': 0})
+    assert [node_id for node_id, *_ in retrieval.expand(['a'])] == ['b', 'c']
+
+
+def test_snapshot_refreshes_on_any_graph_change():
+    db = chain_graph()
+    retrieval = GraphVectorRetrieval(FakeVectorDb([]), db, num_hops=1, relation_weights={'calls': 1.0, 'uses': 0.2})
+    assert retrieval.expand(['a']) == [('b', 0.5, 'calls', 1)]
+
+    # same node and edge counts, different relation
+    db.add_edge('a', 'b', 'uses')
+    assert retrieval.expand(['a']) == [('b', pytest.approx(0.1), 'uses', 1)]
+
+    db.remove_edge('a', 'b')
+    db.add_edge('a', 'c', 'calls')
+    assert retrieval.expand(['a']) == [('c', 0.5, 'calls', 1)]
+
+    # edits on the networkx graph itself need an explicit refresh
+    db.graph.remove_edge('a', 'c')
+    assert retrieval.expand(['a']) == [('c', 0.5, 'calls', 1)]
+    retrieval.refresh_snapshot()
+    assert retrieval.expand(['a']) == []
+
+
+def test_retrieve_expands_from_vector_hits():
+    retrieval = GraphVectorRetrieval(FakeVectorDb(['b', 'x']), chain_graph(), num_hops=1, retrieval_top_k=2)
+    out = retrieval.retrieve('query')
+    assert [doc.metadata['node_id'] for doc in out['docs']] == ['b', 'x']
+    assert [(node_id, attributes) for node_id, _, _, _, attributes in out['nodes']] == [
+        ('a', {'name': 'a'}), ('c', {'name': 'c'})
+    ]
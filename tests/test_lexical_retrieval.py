@@ -0,0 +1,72 @@
+from langchain_core.documents import Document
+
+from cognitive_base.memories.base_mem import BaseMem
+from cognitive_base.retrieval.lexical_retrieval import is_exact_cue, reciprocal_rank_fusion
+
+
+def make_mem(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'fake')
+    mem = BaseMem(ckpt_dir=str(tmp_path), vectordb_name='notes', lexical_search=True, retrieval_top_k=2)
+    for name, text in [
+        ('sort', 'def merge_sort(xs): sorts a list by merging halves'),
+        ('gcd', 'def gcd(a, b): greatest common divisor by euclid'),
+        ('tree', 'def lca(tree, a, b): lowest common ancestor in a tree'),
+    ]:
+        mem.update(text, metadata={'name': name}, doc_id=name)
+    return mem
+
+
+def spy_on_vector(mem):
+    calls = []
+    vector_retrieval = mem.retrieval_methods['vector']
+    retrieve = vector_retrieval.retrieve
+
+    def spy(query, **kwargs):
+        calls.append(query)
+        return retrieve(query, **kwargs)
+    vector_retrieval.retrieve = spy
+    return calls
+
+
+def test_is_exact_cue():
+    for cue in ['merge_sort', 'task_3', 'numpy.linalg', 'utils/log.py', 'std::vector', 'mergeSort']:
+        assert is_exact_cue(cue)
+    for query in ['sorting', 'Sorting', 'sorting.', 'HTTP', 'merge sort', 'sort a list']:
+        assert not is_exact_cue(query)
+
+
+def test_retrieve_by_lexical(tmp_path, monkeypatch):
+    mem = make_mem(tmp_path, monkeypatch)
+    docs = mem.retrieve_by_lexical('common divisor')
+    assert docs[0].metadata['name'] == 'gcd'
+
+    docs = mem.retrieve_by_lexical('common', with_scores=True)
+    assert {doc.metadata['name'] for doc, _ in docs} == {'gcd', 'tree'}
+    assert mem.retrieve_by_lexical('quaternion') == []
+
+
+def test_retrieve_hybrid_skips_vector_only_on_identifier_cues(tmp_path, monkeypatch):
+    mem = make_mem(tmp_path, monkeypatch)
+    calls = spy_on_vector(mem)
+
+    docs = mem.retrieve_hybrid('merge_sort')
+    assert docs[0].metadata['name'] == 'sort'
+    assert calls == []
+
+    # a plain word is fused with the vector results, even when it matches lexically
+    docs = mem.retrieve_hybrid('tree')
+    assert calls == ['tree']
+    assert docs[0].metadata['name'] == 'tree' and len(docs) == 2
+
+    docs = mem.retrieve_hybrid('merge_sort', with_scores=True)
+    assert docs[0][1] == 1 / 61
+
+
+def test_reciprocal_rank_fusion():
+    a, b, c = (Document(page_content=text) for text in 'abc')
+    fused = reciprocal_rank_fusion([[a, b], [b, c]], rrf_k=1)
+    assert [doc.page_content for doc, _ in fused] == ['b', 'a', 'c']
+    assert [score for _, score in fused] == [1 / 3 + 1 / 2, 1 / 2, 1 / 3]
+
+    fused = reciprocal_rank_fusion([[a], [Document(page_content='A')]], key_fn=lambda doc: doc.page_content.lower())
+    assert len(fused) == 1 and fused[0][0] is a
@@ -0,0 +1,59 @@
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from cognitive_base.utils.lm_cache import LMResponseCache
+
+
+def test_lookup_update_and_metrics(tmp_path):
+    cache = LMResponseCache(str(tmp_path / 'cache.db'), memory_size=1)
+    generations = [ChatGeneration(message=AIMessage(content='hello'))]
+
+    assert cache.lookup('prompt', 'llm') is None
+    cache.update('prompt', 'llm', generations)
+    cache.update('other', 'llm', generations)
+
+    # 'prompt' was pushed out of the 1-entry memory tier, so this hits disk
+    assert cache.lookup('prompt', 'llm')[0].message.content == 'hello'
+    assert cache.lookup('prompt', 'llm')[0].text == 'hello'
+
+    stats = cache.stats()
+    assert (stats['misses'], stats['disk_hits'], stats['memory_hits']) == (1, 1, 1)
+
+    # a second instance (eg another process) sees the same responses
+    assert LMResponseCache(str(tmp_path / 'cache.db')).lookup('other', 'llm') is not None
+
+
+def test_memory_hits_skip_deserialization(tmp_path, monkeypatch):
+    cache = LMResponseCache(str(tmp_path / 'cache.db'))
+    generations = [ChatGeneration(message=AIMessage(content='hello'))]
+    cache.update('prompt', 'llm', generations)
+
+    def fail(value):
+        raise AssertionError('memory tier should hold deserialized responses')
+    monkeypatch.setattr(cache, '_deserialize', fail)
+    assert cache.lookup('prompt', 'llm') == generations
+    assert cache.stats()['memory_hits'] == 1
+
+
+def test_max_entries_eviction(tmp_path):
+    cache = LMResponseCache(str(tmp_path / 'cache.db'), memory_size=0, max_entries=2, evict_every=1)
+    for i in range(5):
+        cache.update(f'prompt {i}', 'llm', [ChatGeneration(message=AIMessage(content=str(i)))])
+
+    assert cache.lookup('prompt 0', 'llm') is None
+    assert cache.lookup('prompt 4', 'llm')[0].message.content == '4'
+
+
+def test_corrupt_rows_are_misses_and_deleted(tmp_path):
+    cache = LMResponseCache(str(tmp_path / 'cache.db'))
+    key = cache.make_key('prompt', 'llm')
+    with cache.db.connection() as conn:
+        conn.execute("INSERT INTO lm_cache (key, value, created) VALUES (?, ?, ?)", (key, '["not json', 0.0))
+        conn.commit()
+
+    assert cache.lookup('prompt', 'llm') is None
+    stats = cache.stats()
+    assert (stats['misses'], stats['disk_hits'], stats['memory_hits']) == (1, 0, 0)
+    assert key not in cache._memory
+    with cache.db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM lm_cache").fetchone()[0] == 0
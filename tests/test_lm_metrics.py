@@ -0,0 +1,41 @@
+from langchain.globals import set_llm_cache
+from langchain.schema import HumanMessage
+
+from cognitive_base.utils import lm_cache_init
+from cognitive_base.utils.fake_llm import FakeChatModel
+from cognitive_base.utils.lm_metrics import get_lm_metrics, percentile
+from cognitive_base.utils.retry_loops import parse_retry_loop
+
+
+def parse_int(message):
+    return int(message.content)
+
+
+def test_metrics_per_module(tmp_path):
+    metrics = get_lm_metrics()
+    metrics.reset()
+    lm_cache_init(str(tmp_path), cache_type='fast')
+    try:
+        llm = FakeChatModel(responses=['not an int', '3'], fail_first=1)
+        assert parse_retry_loop([HumanMessage(content='q')], parse_int, llm, name='coding', backoff_base=0.01) == 3
+        # identical prompt again, answered by the LM cache
+        llm = FakeChatModel(responses=['unused'])
+        parse_retry_loop([HumanMessage(content='q')], lambda m: m.content, llm, name='skill')
+    finally:
+        set_llm_cache(None)
+
+    coding = metrics.task_metrics()['coding']
+    assert (coding['calls'], coding['transport_errors'], coding['parse_errors'], coding['retries']) == (2, 1, 1, 2)
+    assert coding['total_tokens'] > 0 and coding['latency_s']['p50'] is not None
+    skill = metrics.run_metrics()['skill']
+    assert (skill['calls'], skill['cache_hits'], skill['total_tokens']) == (1, 1, 0)
+
+    metrics.reset_task()
+    assert metrics.task_metrics() == {}
+    metrics.reset()
+
+
+def test_percentile():
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+    assert percentile([], 50) is None
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from cognitive_base.utils.lm_scheduler import LMScheduler, PRIORITY_HIGH, PRIORITY_LOW
+
+
+def test_max_in_flight_and_priority_order():
+    scheduler = LMScheduler(max_in_flight=1)
+    order = []
+
+    scheduler.acquire_sync()
+
+    def worker(priority, tag):
+        with scheduler.slot_sync(priority):
+            order.append(tag)
+
+    threads = [threading.Thread(target=worker, args=(PRIORITY_LOW, 'summary'))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=worker, args=(PRIORITY_HIGH, 'gen_code')))
+    threads[1].start()
+    time.sleep(0.05)
+
+    assert order == []
+    scheduler.release()
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert order == ['gen_code', 'summary']
+    assert scheduler.in_flight == 0
+
+
+def test_requests_per_minute_limit():
+    scheduler = LMScheduler(requests_per_minute=600)
+    scheduler._rpm_bucket.level = 1
+
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.slot_sync():
+            pass
+
+    # 600 rpm refills one request per 0.1s
+    assert time.monotonic() - start >= 0.15
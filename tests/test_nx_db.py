@@ -0,0 +1,47 @@
+from cognitive_base.utils.database.graph_db.nx_db import NxDb
+
+
+def test_add_nodes_from_summary():
+    db = NxDb()
+    db.add_node('a', kind='fn')
+
+    summary = db.add_nodes_from([
+        ('a', {'kind': 'fn'}),
+        ('b', {'kind': 'fn'}),
+        ('c', {'kind': 'class'}),
+        ('c', {'kind': 'fn'}),
+    ])
+
+    assert summary == {'added': 2, 'updated': 1, 'unchanged': 1}
+    assert db.get_node('c') == {'kind': 'fn'}
+    assert db.count() == (3, 0)
+
+
+def test_add_edges_from_merges_attributes():
+    db = NxDb()
+    db.add_edge('a', 'b', 'calls', weight=1)
+
+    summary = db.add_edges_from([
+        ('a', 'b', 'calls', {'weight': 1}),
+        ('b', 'c', 'calls'),
+        ('a', 'b', 'calls', {'weight': 2}),
+    ])
+
+    assert summary == {'added': 1, 'updated': 1, 'unchanged': 1}
+    assert db.graph.get_edge_data('a', 'b') == {'relation': 'calls', 'weight': 2}
+    assert db.count() == (3, 2)
+
+
+def test_version_bumps_on_changes_only():
+    db = NxDb()
+    db.add_node('a', kind='fn')
+    db.add_edge('a', 'b', 'calls')
+    version = db.version
+
+    db.add_nodes_from([('a', {'kind': 'fn'})])
+    db.add_edges_from([('a', 'b', 'calls')])
+    assert db.version == version
+
+    db.update_attributes('a', {'kind': 'class'})
+    db.remove_edge('a', 'b')
+    assert db.version == version + 2
@@ -0,0 +1,126 @@
+import json
+import logging
+import random
+import time
+
+from argparse import Namespace
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from cognitive_base.agents.base_agent import BaseAgent
+from cognitive_base.examples.voyager_coder.base_vector_mem import BaseVectorMem
+from cognitive_base.memories.base_mem import DeferredWriteMem, apply_memory_writes
+from cognitive_base.reasoning.base_lm_reasoning import BaseLMReasoning
+from cognitive_base.utils.lm_metrics import get_lm_metrics
+
+
+class ListMem:
+    write_methods = ('update',)
+
+    def __init__(self):
+        self.entries = []
+
+    def update(self, entry, **kwargs):
+        self.entries.append(entry)
+
+    def print_doc_count(self):
+        pass
+
+
+class Env:
+    def reset(self, full_task):
+        pass
+
+
+class Handler:
+    task_id = None
+
+
+class LMHandler(BaseCallbackHandler):
+    task_id = None
+
+
+class SleepyAgent(BaseAgent):
+    """
+    Train steps finish out of order and write what they saw in memory
+    """
+    def train_step(self):
+        self.task = f'task {self.train_iter}'
+        seen = len(self.semantic_mem.entries)
+        logging.getLogger("logger").info(f'step {self.train_iter} started')
+        for _ in range(self.train_iter + 1):
+            get_lm_metrics().record_call('sleepy', None, latency=0.01)
+        time.sleep(random.random() * 0.02)
+        logging.getLogger("logger").info(f'step {self.train_iter} done')
+        self.semantic_mem.update((self.train_iter, seen))
+
+
+def make_agent(tmp_path, train_concurrency):
+    args = Namespace(
+        max_attempts_per_task=1, max_train_iter=8, result_dir=str(tmp_path), ckpt_dir=str(tmp_path / 'ckpt'),
+        save_every=100, eval_later=False, use_public_tests=False, debug_mode=False, verbose=False,
+        train_concurrency=train_concurrency,
+    )
+    (tmp_path / 'extra_log.log').touch()
+    agent = SleepyAgent(args, components={'semantic_mem': ListMem()}, handler=Handler())
+    agent.env_interface = Env()
+    return agent
+
+
+def test_parallel_train_loop_commits_in_order(tmp_path):
+    agent = make_agent(tmp_path, train_concurrency=3)
+    agent.train_loop()
+
+    assert agent.train_iter == 8
+    assert agent.task == 'task 7'
+    # steps run in rounds of 3 and see the writes of exactly the previous rounds
+    assert agent.semantic_mem.entries == [(i, i // 3 * 3) for i in range(8)]
+    assert (tmp_path / 'train_outputs' / '7' / 'logfile.log').exists()
+
+
+def test_parallel_train_loop_keeps_task_logs_and_metrics_apart(tmp_path, caplog):
+    caplog.set_level(logging.INFO, logger="logger")
+    agent = make_agent(tmp_path, train_concurrency=4)
+    agent.train_loop()
+
+    for i in range(8):
+        lines = (tmp_path / 'train_outputs' / str(i) / 'logfile.log').read_text().splitlines()
+        assert [line for line in lines if 'step' in line] == [f'INFO - step {i} started', f'INFO - step {i} done']
+    assert not list(tmp_path.glob('extra_log_*.log'))
+
+    with open(tmp_path / 'lm_metrics.jsonl') as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['task_id'] for line in lines] == list(range(8))
+    assert [line['lm_metrics']['sleepy']['calls'] for line in lines] == [i + 1 for i in range(8)]
+
+
+def test_worker_view_rebinds_lm_callbacks_to_its_handler(tmp_path):
+    agent = make_agent(tmp_path, train_concurrency=2)
+    agent.handler = LMHandler()
+    agent.reasoning_module = BaseLMReasoning(callbacks=[agent.handler], verbose=False, lm_provider='fake')
+    agent.attr_per_worker += ['reasoning_module']
+
+    view = agent.worker_view(3, [])
+    assert view.handler is not agent.handler and view.handler.task_id == 3
+    assert view.reasoning_module.llm.callbacks == [view.handler]
+    assert agent.reasoning_module.llm.callbacks == [agent.handler]
+
+
+def test_deferred_add_code_is_applied_on_commit(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'fake')
+    mem = BaseVectorMem(ckpt_dir=str(tmp_path), vectordb_name='skill')
+    write_log = []
+    view = DeferredWriteMem(mem, write_log)
+
+    raw_data = {'code': 'def add(a, b):\n    return a + b\n', 'name': 'add'}
+    assert view.add_code(raw_data, [('code', 'code'), ('name', 'name')], 'adds two numbers') is None
+    assert 'add' not in view.fn_str_map and mem.vectordb._collection.count() == 0
+
+    apply_memory_writes(write_log)
+    assert 'add' in mem.fn_str_map and mem.vectordb._collection.count() == 1
+
+
+def test_sequential_train_loop_sees_every_write(tmp_path):
+    agent = make_agent(tmp_path, train_concurrency=1)
+    agent.train_loop()
+    assert agent.semantic_mem.entries == [(i, i) for i in range(8)]
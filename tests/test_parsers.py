@@ -0,0 +1,28 @@
+import pytest
+
+from cognitive_base.knowledge_sources.parsers import (
+    extract_blocks, StreamingBlockExtractor, MalformedStreamError
+)
+
+
+def feed_in_chunks(extractor, text, size):
+    for i in range(0, len(text), size):
+        if extractor.feed(text[i:i + size]):
+            return i + size
+    return None
+
+
+def test_streaming_extractor_matches_extract_blocks():
+    text = "Let me think.\n```python\ndef f(x):\n    return x\n```\nmore text ```python\ng()\n```"
+    for size in (1, 2, 5, 100):
+        extractor = StreamingBlockExtractor(identifier='python|py')
+        stopped_at = feed_in_chunks(extractor, text, size)
+        assert extractor.block == extract_blocks(text, identifier='python|py', concat=False)[0]
+        assert stopped_at < text.index('more text') + size
+
+
+def test_streaming_extractor_fails_fast_without_block():
+    extractor = StreamingBlockExtractor(identifier='python|py', max_preamble_chars=20)
+    with pytest.raises(MalformedStreamError) as e:
+        feed_in_chunks(extractor, 'no code here, just a long ramble', 4)
+    assert e.value.text.startswith('no code')
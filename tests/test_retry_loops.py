@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+from langchain.schema import AIMessage
+
+from cognitive_base.utils.retry_loops import parse_retry_loop, backoff_delay
+
+
+class FlakyLM:
+    """Raises the given errors in order, then returns the given contents in order."""
+    def __init__(self, errors, contents):
+        self.errors = list(errors)
+        self.contents = list(contents)
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content=self.contents.pop(0))
+
+
+def parse_int(message):
+    return int(message.content)
+
+
+def test_transport_errors_do_not_use_parse_budget():
+    lm = FlakyLM([ConnectionError(), ConnectionError()], ['not an int', '42'])
+    out = parse_retry_loop([], parse_int, lm, parse_tries=2, backoff_base=0.01)
+    assert out == 42
+    assert lm.calls == 4
+
+
+def test_transport_budget_exhausted_returns_fallback():
+    lm = FlakyLM([ConnectionError()] * 3, ['1'])
+    out = parse_retry_loop([], parse_int, lm, fallback=-1, transport_tries=2, backoff_base=0.01)
+    assert out == -1
+    assert lm.calls == 2
+
+
+def test_backoff_honours_retry_after():
+    error = Exception()
+    error.response = SimpleNamespace(headers={'retry-after': '7'})
+    assert backoff_delay(1, error) == 7
+    assert 2 <= backoff_delay(3, base=1.0) <= 4
+    assert backoff_delay(10, base=1.0, max_delay=5) <= 5
+
+
+def test_identical_concurrent_requests_are_coalesced():
+    import asyncio
+    from cognitive_base.utils.retry_loops import async_parse_retry_loop
+
+    class SlowLM:
+        calls = 0
+
+        async def ainvoke(self, messages):
+            SlowLM.calls += 1
+            await asyncio.sleep(0.05)
+            return AIMessage(content='7')
+
+    lm = SlowLM()
+
+    async def run():
+        return await asyncio.gather(*[
+            async_parse_retry_loop([AIMessage(content='same prompt')], parse_int, lm) for _ in range(3)
+        ])
+
+    assert asyncio.run(run()) == [7, 7, 7]
+    assert SlowLM.calls == 1
+
+
+def test_streaming_stops_after_first_block():
+    from langchain_core.messages import AIMessageChunk
+    from cognitive_base.knowledge_sources.parsers import StreamingBlockExtractor, extract_blocks
+
+    class StreamingLM:
+        chunks_sent = 0
+
+        def stream(self, messages):
+            for token in ['ok\n```py', 'thon\nx = 1\n', '```', '\nlong explanation', ' that is never needed']:
+                StreamingLM.chunks_sent += 1
+                yield AIMessageChunk(content=token)
+
+    out = parse_retry_loop(
+        [], lambda m: extract_blocks(m.content, identifier='python|py'), StreamingLM(),
+        stream_fn=lambda: StreamingBlockExtractor(identifier='python|py'),
+    )
+    assert out == '\nx = 1\n'
+    assert StreamingLM.chunks_sent == 3
+
+
+def test_code_parsing_agrees_with_and_without_streaming(monkeypatch):
+    from langchain_core.messages import AIMessageChunk
+    from cognitive_base.examples.voyager_coder.base_coding_module import BaseCodingModule
+
+    tokens = ['```python\n', 'def solve(x):\n    return x\n', '```', '\nor\n```python\ndef solve(x):\n    pass\n```']
+
+    class StreamingLM:
+        def stream(self, messages):
+            for token in tokens:
+                yield AIMessageChunk(content=token)
+
+        def invoke(self, messages):
+            return AIMessage(content=''.join(tokens))
+
+    monkeypatch.setenv('FAKE_LM_LATENCY', '0')
+    outs = []
+    for stream_code in [False, True]:
+        module = BaseCodingModule(lm_provider='fake', verbose=False, generic_code_env=True, stream_code=stream_code)
+        out = parse_retry_loop([], module.parse_ai_code, StreamingLM(), stream_fn=module.code_stream_fn())
+        outs.append(out['program_code'])
+    assert outs == ['\ndef solve(x):\n    return x\n'] * 2
@@ -0,0 +1,49 @@
+from cognitive_base.examples.voyager_coder.base_vector_mem import BaseVectorMem
+from cognitive_base.utils.code_parse import append_dependencies
+
+MAPPING = [("code", "code"), ("name", "name"), ("dependencies", "dependencies")]
+
+
+def add_skill(mem, name, dependencies):
+    code = f"def {name}():\n    return {' + '.join(f'{dep}()' for dep in dependencies) or '1'}\n"
+    return mem.add_code({'code': code, 'name': name, 'dependencies': dependencies}, MAPPING, f'skill {name}')
+
+
+def parsed(dependencies):
+    return {'program_code': 'def main():\n    pass\n', 'dependencies': dependencies}
+
+
+def test_dependency_bundles_follow_the_dag(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'fake')
+    mem = BaseVectorMem(ckpt_dir=str(tmp_path), vectordb_name='skill')
+    add_skill(mem, 'base', [])
+    add_skill(mem, 'mid', ['base', 'later'])
+    add_skill(mem, 'top', ['mid', 'base'])
+
+    assert mem.dependency_bundle('top') == (('base', 'mid', 'top'), ('later',))
+    assert mem.dependency_bundle('top') is mem.dependency_bundle('top')
+
+    # adding the missing skill invalidates the bundles depending on it
+    add_skill(mem, 'later', [])
+    assert mem.dependency_bundle('top') == (('base', 'later', 'mid', 'top'), ())
+
+    result = parsed(['top', 'base'])
+    full_code = append_dependencies(result, mem)
+    assert result['dependency_used']
+    assert [block.strip().split('(')[0] for block in full_code.split('\n\n')] == [
+        'def base', 'def later', 'def mid', 'def top', 'def main'
+    ]
+
+
+def test_append_dependencies_from_fn_str_maps():
+    fn_str_map = {
+        'a': {'code': 'def a(): return b()', 'dependencies': ['b']},
+        'b': {'code': 'def b(): return 1'},
+    }
+    result = parsed(['a', 'missing'])
+    assert append_dependencies(result, fn_str_map) == 'def b(): return 1\n\ndef a(): return b()\n\ndef main():\n    pass\n'
+    assert append_dependencies(parsed(['a']), [{}, fn_str_map]) == result['full_code']
+
+    result = parsed([])
+    assert append_dependencies(result, fn_str_map) == result['program_code']
+    assert not result['dependency_used']
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cognitive_base.utils.database.relational_db.sqlite_db import SQLiteDB
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS results (task_id TEXT, reward INTEGER);"
+
+
+def test_in_memory_roundtrip():
+    db = SQLiteDB(schema_script=SCHEMA)
+    db.update('results', {'task_id': 't1', 'reward': 1})
+
+    assert db.retrieve('results', "task_id = 't1'") == [('t1', 1)]
+    assert db.count() == 1
+    db.close()
+
+
+def test_file_db_concurrent_threads(tmp_path):
+    db = SQLiteDB(db_path=str(tmp_path / 'mem.db'), schema_script=SCHEMA)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda i: db.update('results', {'task_id': f't{i}', 'reward': i % 2}), range(20)))
+        counts = list(pool.map(lambda _: len(db.retrieve('results', 'reward >= 0')), range(8)))
+
+    assert counts == [20] * 8
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    db.close()
+
+
+def test_update_many_and_batch_rollback():
+    db = SQLiteDB(schema_script=SCHEMA)
+    assert db.update_many('results', [{'task_id': f't{i}', 'reward': 1} for i in range(5)]) == 5
+
+    try:
+        with db.batch():
+            db.update('results', {'task_id': 'x', 'reward': 0})
+            db.update_many('results', [{'task_id': 'y', 'reward': 0}])
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert len(db.retrieve('results', '1 = 1')) == 5
+    db.close()
+
+
+def test_structured_retrieve_and_index():
+    db = SQLiteDB(schema_script=SCHEMA)
+    db.update_many('results', [{'task_id': f't{i}', 'reward': i} for i in range(10)])
+    db.create_index('results', 'task_id')
+
+    rows = db.retrieve(
+        'results',
+        filters={'reward': ('>=', 5), 'task_id': ('IN', ['t5', 't7', 't9'])},
+        columns=['task_id'],
+        order_by='-reward',
+        limit=2,
+    )
+    assert rows == [('t9',), ('t7',)]
+    assert db.retrieve('results', 'reward < ?', params=[2], columns='reward') == [(0,), (1,)]
+
+    chunks = list(db.iter_retrieve('results', order_by='reward', chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+    plan = db.explain('results', filters={'task_id': 't3'})
+    assert any('idx_results_task_id' in str(row) for row in plan)
+    db.close()
+
+
+def test_fts_search_matches_identifiers():
+    db = SQLiteDB()
+    db.create_fts_table('lexical')
+    db.fts_update('lexical', 'def gcd_fast(a, b): euclid gcd', doc_id='gcd_fast', metadata={'name': 'gcd_fast'})
+    db.fts_update('lexical', 'binary search over a sorted array', doc_id='bsearch')
+    db.fts_update('lexical', 'def gcd_fast(a, b): iterative euclid', doc_id='gcd_fast')
+
+    results = db.fts_search('lexical', 'gcd_fast')
+    assert [doc_id for doc_id, *_ in results] == ['gcd_fast']
+    assert results[0][2] == {}
+    results = db.fts_search('lexical', 'sorted "array" OR (')
+    assert results[0][0] == 'bsearch'
+    assert db.fts_count('lexical') == 2
+    db.close()
+
+
+def test_batch_covers_create_table():
+    db = SQLiteDB()
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.create_table('scores', 'task_id TEXT, score REAL')
+            db.update('scores', {'task_id': 't1', 'score': 0.5})
+            raise RuntimeError
+    assert db.count() == 0
+    db.close()
+
+
+def test_connections_of_exited_threads_are_closed(tmp_path):
+    db = SQLiteDB(db_path=str(tmp_path / 'mem.db'), schema_script=SCHEMA)
+    conns = []
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: conns.append(db.conn))
+        thread.start()
+        thread.join()
+
+    # each new thread closes the connections of the threads before it
+    assert len(db._conns) <= 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[0].execute("SELECT 1")
+    assert db.retrieve('results', '1 = 1') == []
+    db.close()
+
+
+def test_iter_retrieve_closes_cursor_when_stopped_early():
+    db = SQLiteDB(schema_script=SCHEMA)
+    db.update_many('results', [{'task_id': f't{i}', 'reward': i} for i in range(10)])
+
+    chunks = db.iter_retrieve('results', chunk_size=2)
+    assert len(next(chunks)) == 2
+    chunks.close()
+    # an unfinished statement would keep the table locked
+    db.create_table('other', 'x INTEGER')
+    with db.connection() as conn:
+        conn.execute("DROP TABLE results")
+    db.close()
+
+
+@pytest.mark.parametrize('in_memory', [True, False])
+def test_calls_after_close_raise(tmp_path, in_memory):
+    db = SQLiteDB(db_path=':memory:' if in_memory else str(tmp_path / 'mem.db'), schema_script=SCHEMA)
+    db.update('results', {'task_id': 't1', 'reward': 1})
+    db.close()
+    for call in [lambda: db.retrieve('results'), lambda: db.update('results', {'task_id': 't2', 'reward': 0})]:
+        with pytest.raises(sqlite3.ProgrammingError):
+            call()
@@ -0,0 +1,56 @@
+import pytest
+
+from cognitive_base.utils import tracing
+from cognitive_base.utils.tracing import Tracer, Span, span, traced, get_tracer, enable_tracing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_nested_spans_record_self_time(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tracing.time, 'perf_counter', clock)
+    tracer = Tracer(enabled=True)
+    with Span(tracer, 'outer'):
+        clock.sleep(0.02)
+        with Span(tracer, 'inner'):
+            clock.sleep(0.03)
+    timings = tracer.task_timings()
+    assert timings['inner']['count'] == 1
+    assert timings['outer']['total_s'] == pytest.approx(0.05)
+    assert timings['inner']['self_s'] == pytest.approx(0.03)
+    # the child's time counts in the parent's total but not in its self time
+    assert timings['outer']['self_s'] == pytest.approx(0.02)
+
+    tracer.reset_task()
+    assert tracer.task_timings() == {}
+    assert 'outer' in tracer.run_timings()
+
+
+def test_disabled_tracing_records_nothing():
+    @traced('work')
+    def work():
+        with span('inner'):
+            return 1
+
+    tracer = get_tracer()
+    enable_tracing(False)
+    tracer.reset()
+    assert work() == 1
+    assert tracer.run_timings() == {}
+
+    enable_tracing(True)
+    try:
+        work()
+        assert set(tracer.run_timings()) == {'work', 'inner'}
+    finally:
+        enable_tracing(False)
+        tracer.reset()
@@ -287,9 +287,32 @@ def dump_text(s, *fpaths):
         fp.write(s)
 
 
-def lm_cache_init(folder, filename="lm_cache.db"):
+def lm_cache_init(folder, filename="", cache_type="langchain", **cache_kwargs):
+    """
+    Installs a global LM response cache.
+
+    Parameters:
+    - folder (str): Directory of the cache db.
+    - filename (str): Cache db file name. Defaults to lm_cache.db for 'langchain' and lm_response_cache.db for 'fast'.
+    - cache_type (str): 'langchain' for langchain's SQLiteCache, 'fast' for LMResponseCache
+      (WAL, hashed keys, in-memory tier, TTL / size eviction, metrics. see utils/lm_cache.py).
+    - **cache_kwargs: Passed to LMResponseCache, eg memory_size, ttl, max_entries.
+
+    Returns:
+    - The installed cache.
+    """
     Path(folder).mkdir(parents=True, exist_ok=True)
-    set_llm_cache(SQLiteCache(database_path=os.path.join(folder, filename)))
+    if cache_type == "fast":
+        from .lm_cache import LMResponseCache
+        cache = LMResponseCache(os.path.join(folder, filename or "lm_response_cache.db"), **cache_kwargs)
+    elif cache_type == "langchain":
+        cache = SQLiteCache(database_path=os.path.join(folder, filename or "lm_cache.db"))
+    else:
+        raise ValueError(f"Unsupported LM cache type: {cache_type}")
+    # reports hits to the per-module LM metrics
+    from .lm_metrics import MeteredCache
+    set_llm_cache(MeteredCache(cache))
+    return cache
 
 
 def get_cls(component):
@@ -9,6 +9,13 @@ def get_base_parser():
 
     # dataset
     parser.add_argument("--batch_size", type=int, default=1)
+    parser.add_argument(
+        "--train_concurrency", type=int, default=1,
+        help="number of training rollouts run concurrently. memory writes are still applied in task order"
+    )
+    parser.add_argument(
+        "--eval_workers", type=int, default=1, help="number of worker processes for batched evaluation"
+    )
 
     # loading agent memory
     parser.add_argument("--load_db", action="store_true", help="load examples into semantic memory")
@@ -21,16 +28,44 @@ def get_base_parser():
     # saving / checkpointing
     parser.add_argument("--result_dir", type=str, default=default_result_dir, help='Directory to store results')
     parser.add_argument("--lm_cache_dir", type=str, default="lm_cache", help="directory to store LM cache")
+    parser.add_argument(
+        "--lm_cache_type",
+        type=str,
+        default="langchain",
+        choices=["langchain", "fast"],
+        help="LM cache backend. 'fast' uses the WAL + in-memory tier cache in utils/lm_cache.py",
+    )
+    parser.add_argument(
+        "--async_ckpt", action="store_true",
+        help="write checkpoints (memory json files, train ckpt snapshots) in a background thread"
+    )
     parser.add_argument("--log_folder", type=str, default="log_files", help="directory to store log files")
     
     # LM params
     parser.add_argument("--model_name", type=str, default="gpt-3.5-turbo-0613")
+    parser.add_argument(
+        "--lm_provider", type=str, default=None, choices=["openai", "fake"],
+        help="chat model provider, defaults to the LM_PROVIDER env var. fake runs locally (see utils/fake_llm.py)"
+    )
 
     # LM misc
     parser.add_argument("--request_timeout", type=int, default=300)
+    parser.add_argument("--max_in_flight", type=int, default=None, help="max concurrent LM requests")
+    parser.add_argument("--requests_per_minute", type=int, default=None, help="LM requests per minute limit")
+    parser.add_argument("--tokens_per_minute", type=int, default=None, help="LM tokens per minute limit")
+    parser.add_argument(
+        "--stream_code", action="store_true", help="stream code generation and stop once the code block closes"
+    )
+    parser.add_argument(
+        "--max_preamble_chars", type=int, default=None,
+        help="when streaming code, give up on a response with no code block within this many characters"
+    )
 
     # debug
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--debug_mode", action="store_true")
+    parser.add_argument(
+        "--trace", action="store_true", help="record span timings, written per task next to train_ckpt_info.json"
+    )
 
     return parser
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+Incremental, content-addressed snapshots of the checkpoint dir (memories' vectordbs, entries.json, etc).
+
+Files are split into fixed size chunks stored once under their sha256 in objects/, so a snapshot only writes the
+chunks that changed since any earlier one: a json file that was not touched costs nothing, and a vectordb file
+that was updated in place (sqlite pages, hnsw index) costs the chunks that were rewritten. Each snapshot is a
+manifest in manifests/{train_iter}.json listing the files with their chunks, plus any info to restore with it
+(eg the agent's train_ckpt_info). Files whose size and mtime match the previous snapshot reuse its chunks
+without being read.
+
+    store = CkptSnapshotStore(f"{result_dir}/saved_train_ckpt")
+    store.snapshot(ckpt_dir, train_iter)
+    ...
+    store.restore(train_iter, ckpt_dir, overwrite=True)
+
+Snapshots written as full copies (saved_train_ckpt/{train_iter}/, before this format) can still be restored.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from . import f_mkdir
+
+CHUNK_SIZE = 1 << 20
+
+
+def write_atomic(path, data):
+    """
+    Writes bytes to path through a temp file in the same dir, so readers never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CkptSnapshotStore:
+    """
+    Attributes:
+        root (str): Dir holding objects/ and manifests/ (and any legacy full copy snapshots).
+        chunk_size (int): Max bytes per stored chunk.
+    """
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifests_dir = os.path.join(root, 'manifests')
+
+    """
+    helper fns
+    """
+    def manifest_path(self, train_iter):
+        return os.path.join(self.manifests_dir, f"{train_iter}.json")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def load_manifest(self, train_iter):
+        with open(self.manifest_path(train_iter), encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_snapshots(self):
+        """
+        Returns:
+            list: train_iters with a snapshot (incremental or legacy full copy), ascending.
+        """
+        train_iters = set()
+        if os.path.isdir(self.manifests_dir):
+            train_iters.update(int(name[:-5]) for name in os.listdir(self.manifests_dir) if name.endswith('.json'))
+        if os.path.isdir(self.root):
+            train_iters.update(int(name) for name in os.listdir(self.root) if name.isdigit())
+        return sorted(train_iters)
+
+    def previous_manifest(self, train_iter):
+        """
+        The latest incremental snapshot before train_iter, to reuse the chunks of unchanged files from.
+        """
+        if not os.path.isdir(self.manifests_dir):
+            return None
+        earlier = [
+            int(name[:-5]) for name in os.listdir(self.manifests_dir)
+            if name.endswith('.json') and int(name[:-5]) < train_iter
+        ]
+        return self.load_manifest(max(earlier)) if earlier else None
+
+    def store_file(self, path, stats):
+        """
+        Stores the chunks of a file that are not in the store yet.
+
+        Returns:
+            list: The sha256 of each chunk, in order.
+        """
+        digests = []
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest = hashlib.sha256(chunk).hexdigest()
+                digests.append(digest)
+                object_path = self.object_path(digest)
+                if not os.path.exists(object_path):
+                    f_mkdir(os.path.dirname(object_path))
+                    write_atomic(object_path, chunk)
+                    stats['bytes_written'] += len(chunk)
+        return digests
+
+    """
+    snapshot / restore
+    """
+    def snapshot(self, src_dir, train_iter, info=None):
+        """
+        Snapshots src_dir as train_iter.
+
+        Args:
+            src_dir (str): The dir to snapshot, usually the ckpt_dir.
+            train_iter (int): Snapshot id.
+            info (dict, optional): Json serializable data restored along with the files.
+
+        Returns:
+            dict: Stats: files, files_hashed (read since they changed) and bytes_written (new chunks).
+        """
+        previous = self.previous_manifest(train_iter)
+        previous_files = previous['files'] if previous else {}
+        stats = {'files': 0, 'files_hashed': 0, 'bytes_written': 0}
+
+        files, dirs = {}, []
+        for dir_path, dir_names, file_names in os.walk(src_dir):
+            dir_names.sort()
+            rel_dir = os.path.relpath(dir_path, src_dir)
+            if rel_dir != '.':
+                dirs.append(rel_dir)
+            for file_name in sorted(file_names):
+                path = os.path.join(dir_path, file_name)
+                rel_path = os.path.normpath(os.path.join(rel_dir, file_name))
+                st = os.stat(path)
+                entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'mode': st.st_mode & 0o777}
+                old = previous_files.get(rel_path)
+                if old and old['size'] == entry['size'] and old['mtime_ns'] == entry['mtime_ns']:
+                    entry['chunks'] = old['chunks']
+                else:
+                    entry['chunks'] = self.store_file(path, stats)
+                    stats['files_hashed'] += 1
+                files[rel_path] = entry
+        stats['files'] = len(files)
+
+        manifest = {'train_iter': train_iter, 'info': info, 'dirs': dirs, 'files': files}
+        f_mkdir(self.manifests_dir)
+        write_atomic(self.manifest_path(train_iter), json.dumps(manifest).encode('utf-8'))
+        return stats
+
+    def restore(self, train_iter, target_dir, overwrite=False):
+        """
+        Rebuilds the snapshot train_iter in target_dir. The snapshot is built in a sibling temp dir and then swapped
+        in, so target_dir is left as it was if the snapshot does not exist or the restore fails.
+
+        Args:
+            train_iter (int): Snapshot id.
+            target_dir (str): Where to restore to, eg the ckpt_dir. Memories using it should not be open.
+            overwrite (bool): Replace target_dir if it exists, else raise FileExistsError.
+
+        Returns:
+            dict or None: The info saved with the snapshot (None for legacy full copies).
+        """
+        legacy_dir = os.path.join(self.root, str(train_iter))
+        if os.path.exists(self.manifest_path(train_iter)):
+            manifest = self.load_manifest(train_iter)
+        elif os.path.isdir(legacy_dir):
+            manifest = None
+        else:
+            raise FileNotFoundError(f"no snapshot for train_iter {train_iter} in {self.root}")
+        if os.path.exists(target_dir) and not overwrite:
+            raise FileExistsError(f"{target_dir} exists, pass overwrite=True to replace it")
+
+        target_dir = os.path.normpath(target_dir)
+        tmp_dir = f"{target_dir}.restore_{uuid.uuid4().hex}"
+        f_mkdir(os.path.dirname(os.path.abspath(target_dir)))
+        try:
+            if manifest is None:
+                shutil.copytree(legacy_dir, tmp_dir)
+            else:
+                self.materialize(manifest, tmp_dir)
+            replace_dir(tmp_dir, target_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return manifest['info'] if manifest is not None else None
+
+    def materialize(self, manifest, target_dir):
+        """
+        Writes the files of a snapshot manifest to target_dir, which must not exist.
+        """
+        os.mkdir(target_dir)
+        for rel_dir in manifest['dirs']:
+            f_mkdir(os.path.join(target_dir, rel_dir))
+        for rel_path, entry in manifest['files'].items():
+            path = os.path.join(target_dir, rel_path)
+            with open(path, 'wb') as f:
+                for digest in entry['chunks']:
+                    with open(self.object_path(digest), 'rb') as chunk_file:
+                        f.write(chunk_file.read())
+            os.chmod(path, entry['mode'])
+
+
+def replace_dir(src_dir, target_dir):
+    """
+    Moves src_dir to target_dir, replacing target_dir if it exists. The old dir is moved aside first and put back
+    if the move fails, since a dir cannot be renamed over a non empty one.
+    """
+    if not os.path.exists(target_dir):
+        os.rename(src_dir, target_dir)
+        return
+    old_dir = f"{target_dir}.old_{uuid.uuid4().hex}"
+    os.rename(target_dir, old_dir)
+    try:
+        os.rename(src_dir, target_dir)
+    except BaseException:
+        os.rename(old_dir, target_dir)
+        raise
+    shutil.rmtree(old_dir)
@@ -0,0 +1,176 @@
+"""
+Background checkpoint writer: moves checkpoint I/O (json dumps of memory state, train ckpt snapshots) off the
+training loop onto one writer thread, behind a bounded queue.
+
+    writer = get_ckpt_writer()
+    writer.submit(dump_json, dict(self.fn_str_map), path, key=path, indent=4)
+    ...
+    writer.flush()  # barrier: every write submitted so far is on disk
+
+Callers pass a snapshot of the data (eg a shallow copy of the dict) so later changes do not leak into the write.
+Writes run in submission order. A write with a key replaces a queued write with the same key that has not
+started yet (only the latest version of a file is written), unless a write without a key (eg a train ckpt
+snapshot, which must see the files as they were) was queued in between.
+
+The memories' dbs (Chroma, the lexical sqlite) write their files directly on the training thread, as the write
+is part of the update. They do so in db_write(), which waits until every queued job reading the ckpt dir
+(submitted with reads_files, eg a train ckpt snapshot) has run. So a snapshot sees the dbs as they were when it
+was submitted, and the json files too, since writes queued after it run after it.
+
+Disabled by default: submit then runs the write inline, as before. Enable with enable_ckpt_writer() or the
+--async_ckpt arg. A failed write is logged and raised by the next flush.
+"""
+import atexit
+import collections
+import logging
+import threading
+
+from contextlib import contextmanager
+
+logger = logging.getLogger("logger")
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'key', 'reads_files')
+
+    def __init__(self, fn, args, kwargs, key, reads_files):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.reads_files = reads_files
+
+
+class CkptWriter:
+    """
+    Attributes:
+        enabled (bool): Whether writes run on the writer thread, else inline.
+        max_pending (int): Max queued writes, submit blocks beyond that.
+        file_lock (threading.RLock): Held while the ckpt dir's db files are written (db_write) or read as a whole.
+    """
+    def __init__(self, max_pending=64, enabled=False):
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.file_lock = threading.RLock()
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._keyed = {}
+        self._unfinished = 0
+        self._pending_reads = 0
+        self._error = None
+        self._thread = None
+
+    def submit(self, fn, *args, key=None, reads_files=False, **kwargs):
+        """
+        Queues fn(*args, **kwargs), or runs it now if the writer is disabled.
+
+        Args:
+            fn (callable): The write.
+            key (hashable, optional): Identifies what is written (eg the file path), for coalescing.
+            reads_files (bool): fn reads the ckpt dir's db files (eg a snapshot), so db writes wait for it.
+        """
+        if not self.enabled:
+            fn(*args, **kwargs)
+            return
+
+        with self._cond:
+            job = self._keyed.get(key) if key is not None else None
+            if job is not None:
+                job.fn, job.args, job.kwargs = fn, args, kwargs
+                return
+            while len(self._queue) >= self.max_pending:
+                self._cond.wait()
+            job = _Job(fn, args, kwargs, key, reads_files)
+            self._queue.append(job)
+            self._pending_reads += int(reads_files)
+            if key is not None:
+                self._keyed[key] = job
+            else:
+                # later writes must not be folded into writes queued before this one
+                self._keyed.clear()
+            self._unfinished += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cognitive_base_ckpt_writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                if job.key is not None and self._keyed.get(job.key) is job:
+                    del self._keyed[job.key]
+                self._cond.notify_all()
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"[ckpt writer] {getattr(job.fn, '__qualname__', job.fn)} failed: {repr(e)}")
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._cond:
+                    self._unfinished -= 1
+                    self._pending_reads -= int(job.reads_files)
+                    self._cond.notify_all()
+
+    @contextmanager
+    def db_write(self):
+        """
+        Context for writing the ckpt dir's db files: waits for the queued jobs that read them (snapshots) to run,
+        then holds file_lock.
+        """
+        with self._cond:
+            while self._pending_reads:
+                self._cond.wait()
+        with self.file_lock:
+            yield
+
+    def flush(self):
+        """
+        Blocks until every write submitted so far is done. Call before reading the ckpt dir (eg evaluation,
+        restoring) and at shutdown.
+
+        Raises:
+            Exception: The first write that failed since the last flush.
+        """
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    @property
+    def pending(self):
+        with self._cond:
+            return self._unfinished
+
+
+_ckpt_writer = CkptWriter()
+
+
+def get_ckpt_writer():
+    """
+    Returns the process-wide checkpoint writer.
+    """
+    return _ckpt_writer
+
+
+def enable_ckpt_writer(enabled=True):
+    if not enabled:
+        _ckpt_writer.flush()
+    _ckpt_writer.enabled = enabled
+    return _ckpt_writer
+
+
+def _flush_at_exit():
+    try:
+        _ckpt_writer.flush()
+    except Exception as e:
+        logger.error(f"[ckpt writer] write failed before exit: {repr(e)}")
+
+
+atexit.register(_flush_at_exit)
@@ -1,122 +1,141 @@
 import ast
+import json
 import logging
-import astunparse
 import builtins
-import copy
 
-from . import load_json
+from collections import deque
+from functools import lru_cache
+from importlib import resources
 
-logger = logging.getLogger("logger")
-
-
-def add_parent_references(node):
-    """
-    Recursively add parent references to each node in the AST.
-    so that 
-
-    Args:
-        node (ast.AST): The root AST node to start adding parent references from.
-    """
-    for child in ast.iter_child_nodes(node):
-        child.parent = node
-        add_parent_references(child)
+from .tracing import traced
 
+logger = logging.getLogger("logger")
 
-def extract_info_from_fn(node, dependencies, functions):
-    """
-    Extracts information from a function node in an abstract syntax tree (AST).
 
-    This function walks through the given AST node to identify function calls and
-    collects custom function names (excluding built-in functions) into the dependencies set.
-    It also gathers detailed information about the function node and appends it to the functions list.
+BUILTIN_NAMES = frozenset(dir(builtins))
 
-    Args:
-        node (ast.FunctionDef): The AST node representing the function definition.
-        dependencies (set): A set to store the names of custom functions called within the function.
-        functions (list): A list to store information about the function, including its name, node, body, parameters, and whether it has a parent node.
 
-    Returns:
-        None
+class CodeInfoVisitor(ast.NodeVisitor):
     """
-    for inner_node in ast.walk(node):
-        # Check if the node is a call to a function
-        if isinstance(inner_node, ast.Call) and isinstance(inner_node.func, ast.Name):
-            if inner_node.func.id not in set(dir(builtins)):
-                # Add the custom function name to the list for this function
-                dependencies.add(inner_node.func.id)
-    fn_info = {
-        "name": node.name,
-        "node": node,
-        "body": astunparse.unparse(node),
-        "params": node.args.args,
-        "no_parent": isinstance(node.parent, ast.Module),
-    }
-    functions.append(fn_info)
-
+    Single pass over an AST collecting functions, the custom functions they call, imports and imported modules.
 
-def extract_info_from_imports(node, imported_fns, import_statements, code, all_imported_modules):
+    Functions and imports are kept in breadth first order (as ast.walk would give them), so the top level
+    functions come first, in source order.
     """
-    Extracts information from import statements in the given AST node.
-
-    Args:
-        node (ast.AST): The AST node to analyze.
-        imported_fns (list): A list to store the names of imported functions or modules.
-        import_statements (list): A list to store the source code segments of import statements.
-        code (str): The source code from which the AST node was generated.
-        all_imported_modules (set): A set to store all imported modules.
+    def __init__(self, code):
+        self.code = code
+        self.functions = []
+        self.import_statements = []
+        self.dependencies = set()
+        self.imported_fns = []
+        self.imported_modules = set()
+        # (depth, node) of the ancestors of the node being visited
+        self._parents = []
+        self._fn_depth = 0
+        self._fn_order = []
+        self._import_order = []
+
+    def generic_visit(self, node):
+        self._parents.append(node)
+        super().generic_visit(node)
+        self._parents.pop()
+
+    def visit_FunctionDef(self, node):
+        self._fn_order.append(len(self._parents))
+        self.functions.append({
+            "name": node.name,
+            "node": node,
+            "body": ast.unparse(node),
+            "params": node.args.args,
+            "no_parent": isinstance(self._parents[-1], ast.Module),
+        })
+        self._fn_depth += 1
+        self.generic_visit(node)
+        self._fn_depth -= 1
+
+    def visit_Call(self, node):
+        # calls to custom fns from within functions (incl nested ones)
+        if self._fn_depth and isinstance(node.func, ast.Name) and node.func.id not in BUILTIN_NAMES:
+            self.dependencies.add(node.func.id)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        self._import_order.append(len(self._parents))
+        self.import_statements.append(ast.get_source_segment(self.code, node))
+        self.imported_modules.update(visit_imports(node))
+
+    def visit_ImportFrom(self, node):
+        self.imported_fns.extend(alias.name for alias in node.names)
+        self.visit_Import(node)
+
+    def result(self):
+        # stable sort by depth turns the depth first order into breadth first order
+        functions = [fn for _, fn in sorted(zip(self._fn_order, self.functions), key=lambda x: x[0])]
+        import_statements = [
+            stmt for _, stmt in sorted(zip(self._import_order, self.import_statements), key=lambda x: x[0])
+        ]
+        dependencies = set(self.dependencies)
+        for fn_name in [function['name'] for function in functions] + self.imported_fns:
+            # allow for recursion, inner functions
+            dependencies.discard(fn_name)
+        return tuple(functions), tuple(import_statements), frozenset(dependencies), frozenset(self.imported_modules)
+
+
+@lru_cache(maxsize=256)
+def _extract_from_ast(code):
+    try:
+        parsed_ast = ast.parse(code)
+    except Exception as e:
+        err_msg = f'could not parse code to AST, check syntax and try again. error: {str(e)}, {type(e).__name__}\n'
+        raise Exception(err_msg)
 
-    Returns:
-        None
-    """
-    if isinstance(node, ast.ImportFrom):
-        for alias in node.names:
-            imported_fns.append(alias.name)
-    import_statements.append(ast.get_source_segment(code, node))
-    imported_modules = visit_imports(node)
-    all_imported_modules.update(imported_modules)
+    visitor = CodeInfoVisitor(code)
+    visitor.visit(parsed_ast)
+    return visitor.result()
 
 
 def extract_from_ast(code):
     """
     Extract functions, import statements, and dependencies from the given code.
 
+    Memoized on the code, as the same code is parsed again across retries and by get_fn_name.
+
     Args:
         code (str): The code to extract information from.
-        check_imports (bool, optional): Whether to check if imported modules are whitelisted. Defaults to True.
 
     Returns:
-        tuple: A tuple containing a list of functions, a list of import statements, and a set of dependencies.
+        tuple: A tuple containing a list of functions, a list of import statements, a set of dependencies and a
+        set of imported modules.
 
     Raises:
         Exception: If the code cannot be parsed into an AST.
     """
-    try:
-        parsed_ast = ast.parse(code)
-    except Exception as e:
-        err_msg = f'could not parse code to AST, check syntax and try again. error: {str(e)}, {type(e).__name__}\n'
-        raise Exception(err_msg)
+    functions, import_statements, dependencies, imported_modules = _extract_from_ast(code)
+    # copies, so that callers can't change the memoized result
+    return list(functions), list(import_statements), set(dependencies), set(imported_modules)
 
-    functions = []
-    import_statements = []
-    dependencies = set()
-    imported_fns = []
-    all_imported_modules = set()
+WHITELIST_RESOURCE = "whitelist_modules.json"
 
-    add_parent_references(parsed_ast)
-    for node in ast.walk(parsed_ast):
-        if isinstance(node, ast.FunctionDef):
-            extract_info_from_fn(node, dependencies, functions)
-        elif isinstance(node, ast.Import) or isinstance(node, ast.ImportFrom):
-            extract_info_from_imports(node, imported_fns, import_statements, code, all_imported_modules)
 
-    for fn_name in [function['name'] for function in functions] + imported_fns:
-        # allow for recursion, inner functions
-        dependencies.discard(fn_name)
+@lru_cache(maxsize=None)
+def get_whitelist_modules():
+    """
+    The whitelisted modules, loaded on first use from the json shipped with the package.
+    Submodules are listed by their dotted name (eg numpy.linalg), a package does not whitelist its submodules.
+
+    Returns:
+        frozenset: The module names.
+    """
+    text = resources.files(__package__).joinpath(WHITELIST_RESOURCE).read_text(encoding='utf-8')
+    return frozenset(json.loads(text))
+
 
-    return functions, import_statements, dependencies, all_imported_modules
+def __getattr__(name):
+    # whitelist_modules used to be loaded at import time, keep it available lazily
+    if name == 'whitelist_modules':
+        return get_whitelist_modules()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-whitelist_modules_path = "cognitive_base/utils/whitelist_modules.json"
-whitelist_modules = frozenset(load_json(whitelist_modules_path))
 
 def assert_modules_in_whitelist(imported_modules):
     """
@@ -129,11 +148,43 @@ def assert_modules_in_whitelist(imported_modules):
     AssertionError: If any module in imported_modules is not found in whitelist_modules, an AssertionError is raised with an appropriate error message.
     """
     err_msg = "Error: module {module} not in whitelist. try again without this module\n"
+    whitelist_modules = get_whitelist_modules()
     for module in imported_modules:
         assert (module in whitelist_modules), err_msg.format(module=module)
 
 
-def append_dependencies(parsed_result, fn_str_map_list):
+def scan_dependencies(dependencies, fn_str_map_list):
+    """
+    Resolves dependencies by BFS over the function string mappings, without a cache.
+
+    Args:
+        dependencies (list): Names the program calls that it does not define.
+        fn_str_map_list (list): A list of dictionaries mapping function names to their code and dependencies.
+
+    Returns:
+        tuple: (dependent_code, missing), the list of code strings in dependency order and the missing names.
+    """
+    dependencies = deque(dependencies)
+    visited = set()
+    dependent_code, missing = [], []
+    while dependencies:
+        call_fn = dependencies.popleft()
+        if call_fn in visited:
+            continue
+        visited.add(call_fn)
+        for fn_str_map in fn_str_map_list:
+            if call_fn in fn_str_map:
+                dependent_code.append(fn_str_map[call_fn]['code'])
+                dependencies.extend(fn_str_map[call_fn].get('dependencies', []))
+                break
+        else:
+            missing.append(call_fn)
+    dependent_code.reverse()
+    return dependent_code, missing
+
+
+@traced('code_parse.append_dependencies')
+def append_dependencies(parsed_result, skills):
     """
     Append dependencies to the code based on the function string mappings.
 
@@ -142,31 +193,22 @@ def append_dependencies(parsed_result, fn_str_map_list):
 
     Args:
         parsed_result (dict): The parsed result dictionary containing program code and dependencies.
-        fn_str_map_list (list): A list of dictionaries mapping function names to their code and dependencies.
+        skills: A skill memory keeping a dependency DAG (with resolve_dependencies, eg BaseVectorMem), or a
+            dictionary mapping function names to their code and dependencies, or a list of them.
 
     Returns:
         str: The full code with dependencies resolved and appended.
     """
-    parsed_result['dependency_used'] = False
-    dependencies = copy.deepcopy(parsed_result['dependencies'])
-    visited = set()
-    dependent_code = []
-    while dependencies:
-        print('building dependencies of fns ... \n')
-        call_fn = dependencies.pop(0)
-        if call_fn not in visited:
-            for fn_str_map in fn_str_map_list:
-                if call_fn in fn_str_map:
-                    dependent_code.append(fn_str_map[call_fn]['code'])
-                    parsed_result['dependency_used'] = True
-                    if 'dependencies' in fn_str_map[call_fn]:
-                        dependencies.extend(fn_str_map[call_fn]['dependencies'])
-                    visited.add(call_fn)
-                    break
-            else:
-                logger.warning(f'\n{call_fn} is a dependency not in entries\n')
-                # print(f'\n{call_fn} is a dependency not in entries\n')
-    dependent_code.reverse()
+    dependencies = parsed_result['dependencies']
+    if hasattr(skills, 'resolve_dependencies'):
+        dependent_code, missing = skills.resolve_dependencies(dependencies)
+    else:
+        fn_str_map_list = [skills] if isinstance(skills, dict) else skills
+        dependent_code, missing = scan_dependencies(dependencies, fn_str_map_list)
+    for call_fn in missing:
+        logger.warning(f'\n{call_fn} is a dependency not in entries\n')
+    parsed_result['dependency_used'] = bool(dependent_code)
+
     dependent_code.append(parsed_result['program_code'])
     full_code = "\n\n".join(dependent_code)
 
@@ -210,12 +252,10 @@ def get_fn_name(code: str) -> str:
         AssertionError: If no function name is found.
     """
     try:
-        parsed_ast = ast.parse(code)
+        functions = _extract_from_ast(code)[0]
     except Exception:
         raise ValueError('ast parse fail')
-    fn_name = ''
-    for node in ast.walk(parsed_ast):
-        if isinstance(node, ast.FunctionDef):
-            fn_name = node.name
+    # the last function found walking the AST breadth first
+    fn_name = functions[-1]['name'] if functions else ''
     assert fn_name
     return fn_name
@@ -24,6 +24,18 @@ class BaseGraphDB(BaseDB):
             attributes (dict): A dictionary of attributes for the node.
         """
 
+    def add_nodes_from(self, nodes) -> dict:
+        """
+        Add or update many nodes in one pass.
+
+        Args:
+            nodes (iterable): (node_id, attributes) tuples.
+
+        Returns:
+            dict: A summary of the changes made.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
     def remove_node(self, node_id: str) -> None:
         """
         Remove a node from the graph.
@@ -45,6 +57,18 @@ class BaseGraphDB(BaseDB):
         """
         raise NotImplementedError("Subclasses should implement this method")
 
+    def add_edges_from(self, edges) -> dict:
+        """
+        Add or update many edges in one pass.
+
+        Args:
+            edges (iterable): (subject, obj, relation) or (subject, obj, relation, attributes) tuples.
+
+        Returns:
+            dict: A summary of the changes made.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
     def remove_edge(self, subject: str, obj: str) -> None:
         """
         Remove an edge from the graph.
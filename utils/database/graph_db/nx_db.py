@@ -1,13 +1,24 @@
+import logging
+
 import networkx as nx
 
 from pprint import pp
 from .base_graph_db import BaseGraphDB
 
+logger = logging.getLogger("logger")
+
 
 class NxDb(BaseGraphDB):
+    """
+    Attributes:
+        graph (nx.Graph): The graph.
+        version (int): Bumped by every change made through the methods below, so that caches built from the
+            graph (eg adjacency snapshots) can tell they are stale. Edits made on self.graph directly do not bump it.
+    """
     def __init__(self, graph_type="directed", **kwargs):
         # TODO: future: more graph types
         self.graph = nx.DiGraph() if graph_type == "directed" else nx.Graph()
+        self.version = 0
 
     def count(self):
         # get number of nodes and edges
@@ -42,6 +53,7 @@ class NxDb(BaseGraphDB):
         """
         # Note: this is full override. if you want update as in dict.update, use add_node
         nx.set_node_attributes(self.graph, {node_id: attributes})
+        self.version += 1
 
     def add_node(self, node_id: str, verbose=False, **attributes: dict) -> bool:
         """
@@ -65,6 +77,7 @@ class NxDb(BaseGraphDB):
             self.print_node_attributes(node_id)
 
         self.graph.add_node(node_id, **attributes)
+        self.version += 1
 
         if verbose:
             print('After:\n')
@@ -73,6 +86,45 @@ class NxDb(BaseGraphDB):
 
         return has_diff
 
+    def add_nodes_from(self, nodes) -> dict:
+        """
+        Add or update many nodes in one pass. Diffs against existing attributes in bulk without
+        printing, then hands all changed nodes to networkx at once. Semantics follow add_node
+        (attributes are merged, only keys in the new attributes are compared).
+
+        Args:
+            nodes (iterable): (node_id, attributes) tuples.
+
+        Returns:
+            dict: Change summary with counts for 'added', 'updated' and 'unchanged'.
+        """
+        summary = {'added': 0, 'updated': 0, 'unchanged': 0}
+        pending = {}
+        graph_nodes = self.graph.nodes
+        for node_id, attributes in nodes:
+            if node_id in pending:
+                existing_attrs = pending[node_id]
+            elif node_id in graph_nodes:
+                existing_attrs = graph_nodes[node_id]
+            else:
+                pending[node_id] = dict(attributes)
+                summary['added'] += 1
+                continue
+
+            diff_keys = self.diff_keys(existing_attrs, attributes, union=False)
+            if not diff_keys:
+                summary['unchanged'] += 1
+                continue
+            logger.debug(f"Node {node_id} attributes differ for keys {diff_keys}")
+            summary['updated'] += 1
+            pending[node_id] = {**existing_attrs, **attributes}
+
+        if pending:
+            self.graph.add_nodes_from(pending.items())
+            self.version += 1
+        logger.debug(f"add_nodes_from summary: {summary}")
+        return summary
+
     def remove_node(self, node_id: str) -> None:
         """
         Remove a node from the graph.
@@ -81,6 +133,7 @@ class NxDb(BaseGraphDB):
             node_id (str): The ID of the node to remove.
         """
         self.graph.remove_node(node_id)
+        self.version += 1
 
     # Edge operations
     def add_edge(self, subject: str, obj: str, relation: str, verbose=False, update=True, **attributes) -> None:
@@ -121,6 +174,7 @@ class NxDb(BaseGraphDB):
                 attributes = existing_attributes
 
         self.graph.add_edge(subject, obj, **attributes)
+        self.version += 1
 
         if verbose:
             print("Edge added. New Edge attributes:\n")
@@ -133,6 +187,49 @@ class NxDb(BaseGraphDB):
 
         return has_diff, attributes
 
+    def add_edges_from(self, edges) -> dict:
+        """
+        Add or update many edges (eg a set of triples) in one pass. Diffs against existing
+        attributes in bulk without printing, then hands all changed edges to networkx at once.
+        Semantics follow add_edge with update=True (attributes are merged into existing edges).
+
+        Args:
+            edges (iterable): (subject, obj, relation) or (subject, obj, relation, attributes) tuples.
+
+        Returns:
+            dict: Change summary with counts for 'added', 'updated' and 'unchanged'.
+        """
+        summary = {'added': 0, 'updated': 0, 'unchanged': 0}
+        pending = {}
+        for edge in edges:
+            subject, obj, relation = edge[:3]
+            attributes = dict(edge[3]) if len(edge) > 3 and edge[3] else {}
+            attributes['relation'] = relation
+
+            key = (subject, obj)
+            if key in pending:
+                existing_attrs = pending[key]
+            elif self.graph.has_edge(subject, obj):
+                existing_attrs = self.graph.get_edge_data(subject, obj)
+            else:
+                pending[key] = attributes
+                summary['added'] += 1
+                continue
+
+            diff_keys = self.diff_keys(existing_attrs, attributes)
+            if not diff_keys:
+                summary['unchanged'] += 1
+                continue
+            logger.debug(f"Edge {subject} -> {obj} attributes differ for keys {diff_keys}")
+            summary['updated'] += 1
+            pending[key] = {**existing_attrs, **attributes}
+
+        if pending:
+            self.graph.add_edges_from((u, v, attrs) for (u, v), attrs in pending.items())
+            self.version += 1
+        logger.debug(f"add_edges_from summary: {summary}")
+        return summary
+
     def remove_edge(self, subject: str, obj: str) -> None:
         """
         Remove an edge from the graph.
@@ -142,6 +239,7 @@ class NxDb(BaseGraphDB):
             obj (str): The ID of the second node.
         """
         self.graph.remove_edge(subject, obj)
+        self.version += 1
 
     def get_edges_by_attribute(self, attr_name, attr_value):
         return [(u, v, attr) for u, v, attr in self.graph.edges(data=True) if attr.get(attr_name) == attr_value]
@@ -182,6 +280,31 @@ class NxDb(BaseGraphDB):
         in_edges = list(self.graph.in_edges(node_id, data=data))
         return out_edges + in_edges
     
+    def adjacency_snapshot(self, relation_weights=None, default_weight=1.0, undirected=True):
+        """
+        Precompute a plain-dict adjacency list weighted by edge relation, for fast repeated traversal.
+
+        Args:
+            relation_weights (dict, optional): Mapping of relation to weight. Relations not listed get default_weight.
+            default_weight (float): Weight of relations not in relation_weights.
+            undirected (bool): If True, edges are traversable in both directions.
+
+        Returns:
+            dict: node_id -> list of (neighbor_id, weight, relation), sorted by weight descending.
+        """
+        relation_weights = relation_weights or {}
+        adjacency = {node_id: [] for node_id in self.graph.nodes}
+        for u, v, relation in self.graph.edges(data='relation'):
+            weight = relation_weights.get(relation, default_weight)
+            if weight <= 0:
+                continue
+            adjacency[u].append((v, weight, relation))
+            if undirected and self.graph.is_directed():
+                adjacency[v].append((u, weight, relation))
+        for neighbors in adjacency.values():
+            neighbors.sort(key=lambda x: x[1], reverse=True)
+        return adjacency
+
     def get_path(self, source_id, target_id):
         return nx.shortest_path(self.graph, source=source_id, target=target_id)
     
@@ -203,16 +326,28 @@ class NxDb(BaseGraphDB):
             union (bool): If True, compare using the union of keys from both dictionaries.
                           If False, compare using only the keys from new_attrs.
         """
+        diff_keys = self.diff_keys(existing_attrs, new_attrs, union=union, exclude_keys=exclude_keys)
+        for key in diff_keys:
+            print(f"\nAttribute '{key}' differs:\n existing='{existing_attrs.get(key)}'\n\n new='{new_attrs.get(key)}'")
+
+        return bool(diff_keys)
+
+    @staticmethod
+    def diff_keys(existing_attrs, new_attrs, union=True, exclude_keys=None):
+        """
+        Silent version of compare_attributes.
+
+        Args:
+            existing_attrs (dict): The existing attributes.
+            new_attrs (dict): The new attributes to compare.
+            union (bool): If True, compare using the union of keys from both dictionaries.
+                          If False, compare using only the keys from new_attrs.
+            exclude_keys (iterable, optional): Keys to ignore in the comparison.
+
+        Returns:
+            list: The keys whose values differ.
+        """
         keys = set(existing_attrs.keys()).union(new_attrs.keys()) if union else set(new_attrs.keys())
         if exclude_keys:
             keys = keys - set(exclude_keys)
-
-        has_diff = False
-        for key in keys:
-            existing_value = existing_attrs.get(key)
-            new_value = new_attrs.get(key)
-            if existing_value != new_value:
-                print(f"\nAttribute '{key}' differs:\n existing='{existing_value}'\n\n new='{new_value}'")
-                has_diff = True
-
-        return has_diff
+        return [key for key in keys if existing_attrs.get(key) != new_attrs.get(key)]
@@ -15,7 +15,17 @@ class BaseRelationalDB(BaseDB):
         """
         raise NotImplementedError("Subclasses should implement this method")
 
-    def retrieve(self, table_name, query_conditions, **kwargs):
+    def update_many(self, table_name, rows, **kwargs):
+        """
+        Inserts many entries into the relational database in one go.
+
+        Args:
+            table_name (str): Name of the table.
+            rows (list): List of dicts containing column-value pairs.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def retrieve(self, table_name, query_conditions="", **kwargs):
         """
         Queries the relational database.
 
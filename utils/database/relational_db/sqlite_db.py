@@ -1,4 +1,10 @@
+import json
+import re
 import sqlite3
+import threading
+
+from contextlib import contextmanager
+from functools import lru_cache
 
 import pandas as pd
 
@@ -7,50 +13,194 @@ from ...formatting import truncate_str
 
 
 class SQLiteDB(BaseRelationalDB):
+    """
+    SQLite backed relational db, safe to share across threads.
+
+    File dbs get one connection per thread (WAL journaling, so readers do not block each other or the writer).
+    The connections of threads that have exited are closed when the next thread connects.
+    In-memory dbs cannot be shared between connections without shared-cache table locks,
+    so they keep a single connection and serialize access through a lock.
+    Every call uses its own cursor. Once closed, any further call raises sqlite3.ProgrammingError.
+    """
     # TODO: future: all dbs should have config rather than individual args
-    def __init__(self, db_path=':memory:', schema_script="", schema_path=""):
+    def __init__(
+        self,
+        db_path=':memory:',
+        schema_script="",
+        schema_path="",
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        cache_size=-64000,
+        timeout=30.0,
+        cached_statements=256,
+        **kwargs,
+    ):
+        """
+        Args:
+            db_path (str): Path to the db file, or ':memory:'.
+            schema_script (str): SQL script run on init.
+            schema_path (str): Path to a SQL script run on init if schema_script is blank.
+            journal_mode (str): SQLite journal_mode pragma. Ignored for in-memory dbs.
+            synchronous (str): SQLite synchronous pragma. NORMAL is safe with WAL.
+            cache_size (int): SQLite cache_size pragma (negative values are in KiB).
+            timeout (float): Seconds to wait on a locked db before raising.
+            cached_statements (int): Size of sqlite3's per-connection prepared statement cache.
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+
+        self.in_memory = db_path == ':memory:' or 'mode=memory' in db_path
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._conns = {}
+        self._closed = False
+        self._shared_conn = self._connect() if self.in_memory else None
+
         self.initialize_schema(schema_script, schema_path)
 
+    """
+    connection handling
+    """
+    def _connect(self):
+        # connections are owned by one thread (or guarded by self._lock),
+        # check_same_thread=False only so that close() can close them all from any thread
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            uri=self.db_path.startswith('file:'),
+        )
+        if not self.in_memory:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        with self._lock:
+            # close the connections of threads that have exited (in-memory dbs connect once, so keep theirs)
+            for thread in [thread for thread in self._conns if not thread.is_alive()]:
+                self._conns.pop(thread).close()
+            self._conns[threading.current_thread()] = conn
+        return conn
+
+    @property
+    def conn(self):
+        """
+        The connection for the calling thread.
+        """
+        if self._closed:
+            # otherwise a new connection would be opened, which for in-memory dbs is silently empty
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        if self._shared_conn is not None:
+            return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @property
+    def cursor(self):
+        """
+        A cursor for the calling thread. Kept for backwards compatibility, prefer self.connection()
+        """
+        conn = self.conn
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None or cursor.connection is not conn:
+            cursor = conn.cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    @contextmanager
+    def connection(self):
+        """
+        Yields the connection for the calling thread, holding the lock if the connection is shared.
+        """
+        if self._shared_conn is not None:
+            with self._lock:
+                yield self._shared_conn
+        else:
+            yield self.conn
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers commits of update / update_many (and create_table, create_index) until the block exits, so many
+        writes share one transaction. Rolls back on error. Nested batches commit once, when the outermost block
+        exits. initialize_schema's script always commits, as sqlite3's executescript does.
+
+        Usage:
+            with db.batch():
+                db.update('results', entry)
+                db.update_many('reflections', rows)
+        """
+        with self.connection() as conn:
+            depth = getattr(self._local, 'batch_depth', 0)
+            self._local.batch_depth = depth + 1
+            if not depth and not conn.in_transaction:
+                # sqlite3 only opens transactions implicitly before DML, so DDL in the block would autocommit
+                conn.execute("BEGIN")
+            try:
+                yield self
+            except Exception:
+                if not depth:
+                    conn.rollback()
+                raise
+            else:
+                if not depth:
+                    conn.commit()
+            finally:
+                self._local.batch_depth = depth
+
+    def _commit(self, conn):
+        # inside a batch the commit is deferred to the end of the batch
+        if not getattr(self._local, 'batch_depth', 0):
+            conn.commit()
+
     def initialize_schema(self, schema_script="", schema_path=""):
         if not schema_script and schema_path:
             with open(schema_path, 'r') as schema_file:
                 schema_script = schema_file.read()
-        self.cursor.executescript(schema_script)
-        self.conn.commit()
+        with self.connection() as conn:
+            conn.executescript(schema_script)
+            self._commit(conn)
 
     def close(self):
-        self.conn.close()
+        with self._lock:
+            self._closed = True
+            for conn in self._conns.values():
+                conn.close()
+            self._conns = {}
+        self._local = threading.local()
+        self._shared_conn = None
 
     def count(self):
-        self.cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table';")
-        return self.cursor.fetchone()[0]
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table';").fetchone()[0]
 
     def print_all_sqlite(self, max_length=50):
-        cursor = self.conn.cursor()
-        # Execute the query to get all table names
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        with self.connection() as conn:
+            # Execute the query to get all table names
+            tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
 
-        # Fetch all table names
-        tables = cursor.fetchall()
+            # Iterate over each table and print its contents
+            for table in tables:
+                table_name = table[0]
+                print(f"Table: {table_name}")
 
-        # Iterate over each table and print its contents
-        for table in tables:
-            table_name = table[0]
-            print(f"Table: {table_name}")
+                # Query to get all entries from the table
+                query = f"SELECT * FROM {table_name}"
+                df = pd.read_sql_query(query, conn)
 
-            # Query to get all entries from the table
-            query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql_query(query, self.conn)
+                # Truncate each cell's content
+                df = df.applymap(lambda x: truncate_str(str(x), max_length) if isinstance(x, str) else x)
 
-            # Truncate each cell's content
-            df = df.applymap(lambda x: truncate_str(str(x), max_length) if isinstance(x, str) else x)
-
-            # Print the table entries in a pretty format
-            print(df.to_string(index=False))
-            print("\n" + "=" * 50 + "\n")
+                # Print the table entries in a pretty format
+                print(df.to_string(index=False))
+                print("\n" + "=" * 50 + "\n")
 
     def create_table(self, table_name, schema):
         """
@@ -60,8 +210,9 @@ class SQLiteDB(BaseRelationalDB):
             table_name (str): Name of the table.
             schema (str): SQL schema for the table.
         """
-        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema})")
-        self.conn.commit()
+        with self.connection() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema})")
+            self._commit(conn)
 
     def update(self, table_name, entry, **kwargs):
         """
@@ -74,21 +225,341 @@ class SQLiteDB(BaseRelationalDB):
         columns = ', '.join(entry.keys())
         placeholders = ', '.join('?' * len(entry))
         sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-        self.cursor.execute(sql, tuple(entry.values()))
-        self.conn.commit()
+        with self.connection() as conn:
+            conn.execute(sql, tuple(entry.values()))
+            self._commit(conn)
 
-    def retrieve(self, table_name, query_conditions, **kwargs):
+    def update_many(self, table_name, rows, **kwargs):
+        """
+        Inserts many entries in a single transaction via executemany.
+
+        Args:
+            table_name (str): Name of the table.
+            rows (list): List of dicts containing column-value pairs. All rows must have the same columns as the first.
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        columns = list(rows[0].keys())
+        placeholders = ', '.join('?' * len(columns))
+        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        with self.connection() as conn:
+            try:
+                conn.executemany(sql, (tuple(row[column] for column in columns) for row in rows))
+            except Exception:
+                if not getattr(self._local, 'batch_depth', 0):
+                    conn.rollback()
+                raise
+            self._commit(conn)
+        return len(rows)
+
+    def create_index(self, table_name, columns, unique=False, index_name=None):
+        """
+        Creates an index on the given columns if it does not exist.
+
+        Args:
+            table_name (str): Name of the table.
+            columns (str or list): Column name(s) to index, in order.
+            unique (bool): Whether to create a UNIQUE index.
+            index_name (str, optional): Defaults to idx_<table>_<columns>.
+
+        Returns:
+            str: The index name.
+        """
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        for name in [table_name, *columns]:
+            check_identifier(name)
+        index_name = index_name or f"idx_{table_name}_{'_'.join(columns)}"
+        check_identifier(index_name)
+        sql = (f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} "
+               f"ON {table_name} ({', '.join(columns)})")
+        with self.connection() as conn:
+            conn.execute(sql)
+            self._commit(conn)
+        return index_name
+
+    def _build_query(self, table_name, query_conditions="", filters=None, columns=None, order_by=None, limit=None,
+                     offset=None, params=None):
+        signature, filter_params = normalize_filters(filters)
+        columns = (columns,) if isinstance(columns, str) else tuple(columns or ())
+        order_by = (order_by,) if isinstance(order_by, str) else tuple(order_by or ())
+        sql = compile_select(table_name, columns, signature, order_by, limit is not None, offset is not None)
+        if query_conditions:
+            # legacy raw conditions are ANDed with the structured filters
+            sql = insert_raw_conditions(sql, query_conditions, bool(signature))
+
+        all_params = list(filter_params) + list(params or ())
+        if limit is not None:
+            all_params.append(int(limit))
+        if offset is not None:
+            all_params.append(int(offset))
+        return sql, all_params
+
+    def retrieve(self, table_name, query_conditions="", filters=None, columns=None, order_by=None, limit=None,
+                 offset=None, params=None, **kwargs):
         """
         Queries the relational database.
 
+        Structured queries (filters, columns, order_by, limit, offset) compile to parameterized SQL, so the same query
+        shape reuses one cached statement. The raw query_conditions string is still supported for backwards
+        compatibility; pass its values through params with ? placeholders rather than formatting them in.
+
         Args:
             table_name (str): Name of the table.
-            query_conditions (str): SQL conditions for the query.
+            query_conditions (str, optional): Raw SQL conditions for the query.
+            filters (dict, optional): column -> value for equality, or column -> (op, value) where op is one of
+                =, !=, <, <=, >, >=, LIKE, IN, NOT IN, IS, IS NOT. IN / NOT IN take a list.
+            columns (str or list, optional): Columns to select. Defaults to all.
+            order_by (str or list, optional): Columns to order by, prefix with '-' for descending.
+            limit (int, optional): Max number of rows.
+            offset (int, optional): Number of rows to skip.
+            params (list, optional): Values for ? placeholders in query_conditions.
 
         Returns:
             list: List of query results.
+
+        Example:
+            db.retrieve('results', filters={'task_id': 't1', 'reward': ('>=', 1)}, order_by='-reward', limit=5)
         """
-        sql = f"SELECT * FROM {table_name} WHERE {query_conditions}"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        sql, all_params = self._build_query(
+            table_name, query_conditions, filters, columns, order_by, limit, offset, params
+        )
+        with self.connection() as conn:
+            return conn.execute(sql, all_params).fetchall()
+
+    def iter_retrieve(self, table_name, query_conditions="", filters=None, columns=None, order_by=None, limit=None,
+                      offset=None, params=None, chunk_size=1000, **kwargs):
+        """
+        Streaming version of retrieve. Yields lists of up to chunk_size rows instead of fetching everything at once.
+        Args are as in retrieve.
+        """
+        sql, all_params = self._build_query(
+            table_name, query_conditions, filters, columns, order_by, limit, offset, params
+        )
+        cursor = None
+        try:
+            while True:
+                with self.connection() as conn:
+                    if cursor is None:
+                        cursor = conn.execute(sql, all_params)
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            # also runs when the caller stops iterating early
+            with self._lock:
+                if cursor is not None and not self._closed:
+                    cursor.close()
+
+    def explain(self, table_name, query_conditions="", filters=None, columns=None, order_by=None, limit=None,
+                offset=None, params=None, **kwargs):
+        """
+        Returns the EXPLAIN QUERY PLAN rows for a retrieve call, eg to check whether an index is used.
+        Args are as in retrieve.
+        """
+        sql, all_params = self._build_query(
+            table_name, query_conditions, filters, columns, order_by, limit, offset, params
+        )
+        with self.connection() as conn:
+            return conn.execute(f"EXPLAIN QUERY PLAN {sql}", all_params).fetchall()
+
+    """
+    lexical (BM25) search via FTS5
+    """
+    def create_fts_table(self, table_name, tokenize="unicode61 tokenchars '_'"):
+        """
+        Creates an FTS5 table with columns content (indexed), doc_id and metadata (stored, not indexed).
+        The default tokenizer keeps underscores inside tokens so identifiers like function names match whole.
+
+        Args:
+            table_name (str): Name of the FTS table.
+            tokenize (str): FTS5 tokenizer spec.
+        """
+        check_identifier(table_name)
+        tokenize = tokenize.replace('"', '""')
+        sql = (f"CREATE VIRTUAL TABLE IF NOT EXISTS {table_name} "
+               f"USING fts5(content, doc_id UNINDEXED, metadata UNINDEXED, tokenize=\"{tokenize}\")")
+        with self.connection() as conn:
+            try:
+                conn.execute(sql)
+            except sqlite3.OperationalError as e:
+                if 'fts5' in str(e):
+                    raise RuntimeError("SQLite was built without FTS5, lexical search is unavailable") from e
+                raise
+            self._commit(conn)
+
+    def fts_update(self, table_name, content, doc_id=None, metadata=None):
+        """
+        Indexes a document for lexical search. Upserts if doc_id is given.
+
+        Args:
+            table_name (str): Name of the FTS table.
+            content (str): The text to index.
+            doc_id (str, optional): Id of the document, eg the same id as in the vector db.
+            metadata (dict, optional): Stored as JSON alongside the document.
+        """
+        check_identifier(table_name)
+        with self.batch():
+            if doc_id is not None:
+                with self.connection() as conn:
+                    conn.execute(f"DELETE FROM {table_name} WHERE doc_id = ?", (doc_id,))
+            self.update(table_name, {
+                'content': content,
+                'doc_id': doc_id,
+                'metadata': json.dumps(metadata) if metadata else None,
+            })
+
+    def fts_update_many(self, table_name, contents, doc_ids=None, metadatas=None):
+        """
+        Bulk version of fts_update, eg to backfill the index from a vector db. Does not dedupe on doc_id.
+        """
+        doc_ids = doc_ids or [None] * len(contents)
+        metadatas = metadatas or [None] * len(contents)
+        rows = [
+            {'content': content, 'doc_id': doc_id, 'metadata': json.dumps(metadata) if metadata else None}
+            for content, doc_id, metadata in zip(contents, doc_ids, metadatas)
+        ]
+        return self.update_many(table_name, rows)
+
+    def fts_search(self, table_name, query, k=5):
+        """
+        BM25 search. Each word of the query is matched as a quoted term and terms are ORed,
+        so FTS5 query syntax in the query text is never interpreted.
+
+        Args:
+            table_name (str): Name of the FTS table.
+            query (str): The query text.
+            k (int): Max number of results.
+
+        Returns:
+            list: (doc_id, content, metadata, score) tuples, best first. metadata is a dict,
+                score is the FTS5 bm25 value (lower is better, like a distance).
+        """
+        check_identifier(table_name)
+        match = fts_match_expression(query)
+        if not match or k <= 0:
+            return []
+        sql = (f"SELECT doc_id, content, metadata, bm25({table_name}) AS score FROM {table_name} "
+               f"WHERE {table_name} MATCH ? ORDER BY score LIMIT ?")
+        with self.connection() as conn:
+            rows = conn.execute(sql, (match, k)).fetchall()
+        return [
+            (doc_id, content, json.loads(metadata) if metadata else {}, score)
+            for doc_id, content, metadata, score in rows
+        ]
+
+    def fts_count(self, table_name):
+        check_identifier(table_name)
+        with self.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def fts_match_expression(query):
+    """
+    Converts free text into a safe FTS5 MATCH expression: each word is quoted and the words are ORed.
+    """
+    terms = re.findall(r"\w+", query)
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+# query compilation
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+FILTER_OPS = frozenset(['=', '!=', '<', '<=', '>', '>=', 'LIKE', 'IN', 'NOT IN', 'IS', 'IS NOT'])
+
+
+def check_identifier(name):
+    """
+    Raises ValueError if name is not a plain SQL identifier, since identifiers cannot be parameterized.
+    """
+    if not isinstance(name, str) or not IDENTIFIER_PATTERN.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+
+
+def normalize_filters(filters):
+    """
+    Splits filters into a hashable query signature and the list of values to bind.
+
+    Args:
+        filters (dict): column -> value, or column -> (op, value)
+
+    Returns:
+        tuple: (signature, params) where signature is a tuple of (column, op, num_values)
+    """
+    if not filters:
+        return (), []
+    signature = []
+    params = []
+    for column, condition in filters.items():
+        if isinstance(condition, tuple) and len(condition) == 2 and str(condition[0]).upper() in FILTER_OPS:
+            op, value = str(condition[0]).upper(), condition[1]
+        else:
+            op, value = '=', condition
+        if op in ('IN', 'NOT IN'):
+            value = list(value)
+            if not value:
+                raise ValueError(f"Empty list for {op} filter on {column}")
+            signature.append((column, op, len(value)))
+            params.extend(value)
+        else:
+            signature.append((column, op, 1))
+            params.append(value)
+    return tuple(signature), params
+
+
+@lru_cache(maxsize=256)
+def compile_select(table_name, columns, signature, order_by, has_limit, has_offset):
+    """
+    Compiles a structured query to parameterized SQL. Cached on the query shape, so repeated
+    queries produce the identical SQL string and hit sqlite3's prepared statement cache.
+    """
+    check_identifier(table_name)
+    for column in columns:
+        check_identifier(column)
+    projection = ', '.join(columns) if columns else '*'
+    sql = f"SELECT {projection} FROM {table_name}"
+
+    clauses = []
+    for column, op, num_values in signature:
+        check_identifier(column)
+        if op in ('IN', 'NOT IN'):
+            clauses.append(f"{column} {op} ({', '.join('?' * num_values)})")
+        else:
+            clauses.append(f"{column} {op} ?")
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+
+    if order_by:
+        terms = []
+        for term in order_by:
+            descending = term.startswith('-')
+            column = term[1:] if descending else term
+            check_identifier(column)
+            terms.append(f"{column} DESC" if descending else column)
+        sql += " ORDER BY " + ", ".join(terms)
+
+    if has_limit:
+        sql += " LIMIT ?"
+    if has_offset:
+        sql += " OFFSET ?" if has_limit else " LIMIT -1 OFFSET ?"
+    return sql
+
 
+def insert_raw_conditions(sql, query_conditions, has_where):
+    """
+    Adds raw SQL conditions to compiled SQL, before any ORDER BY / LIMIT clause.
+    """
+    tail_idx = len(sql)
+    for keyword in (" ORDER BY ", " LIMIT "):
+        idx = sql.find(keyword)
+        if idx != -1:
+            tail_idx = min(tail_idx, idx)
+    head, tail = sql[:tail_idx], sql[tail_idx:]
+    if has_where:
+        head += f" AND ({query_conditions})"
+    else:
+        head += f" WHERE {query_conditions}"
+    return head + tail
@@ -8,6 +8,8 @@ from pprint import pp
 from .base_vector_db import BaseVectorDB
 
 from ...llm import get_embedding_fn
+from ...tracing import span
+from ...ckpt_writer import get_ckpt_writer
 from ....utils import f_mkdir
 from ....utils.formatting import truncate_str
 
@@ -61,18 +63,19 @@ class ChromaVectorDB(BaseVectorDB):
             list: A list of documents retrieved from the database.
         """
 
-        k = min(self.count(), k)
-        docs = []
-        if k:
-            logger.info(f"\033[33m Retrieving {k} entries for db: {self.db_name} \n \033[0m")
-            if with_scores:
-                docs = self.db.similarity_search_with_score(query, k=k, **kwargs)
-                for doc, score in docs:
-                    logger.info(f"Retrieved (score={score:.4f}):\n{truncate_str(doc.page_content)}\n\n")
-            else:
-                docs = self.db.similarity_search(query, k=k, **kwargs)
-                for doc in docs:
-                    logger.info(f"Retrieved doc:\n{truncate_str(doc.page_content)}\n\n")
+        with span('chroma.retrieve'):
+            k = min(self.count(), k)
+            docs = []
+            if k:
+                logger.info(f"\033[33m Retrieving {k} entries for db: {self.db_name} \n \033[0m")
+                if with_scores:
+                    docs = self.db.similarity_search_with_score(query, k=k, **kwargs)
+                    for doc, score in docs:
+                        logger.info(f"Retrieved (score={score:.4f}):\n{truncate_str(doc.page_content)}\n\n")
+                else:
+                    docs = self.db.similarity_search(query, k=k, **kwargs)
+                    for doc in docs:
+                        logger.info(f"Retrieved doc:\n{truncate_str(doc.page_content)}\n\n")
         return docs
 
     def update(self, entry, metadata=None, doc_id=None, **kwargs):
@@ -86,8 +89,12 @@ class ChromaVectorDB(BaseVectorDB):
         # Note: this is upsert
         # Note: if not specified, ids will be uuid4 which is not deterministic
         ids = [doc_id] if doc_id else None
-        ids = self.db.add_texts(texts=[entry], metadatas=[metadata], ids=ids, **kwargs)
-        self.db.persist()
+        # chroma writes to disk on add (persist is a no-op from chromadb 0.4), so this stays on the training thread
+        with get_ckpt_writer().db_write():
+            with span('chroma.update'):
+                ids = self.db.add_texts(texts=[entry], metadatas=[metadata], ids=ids, **kwargs)
+            with span('chroma.persist'):
+                self.db.persist()
         logger.info(f"Updated entry: {truncate_str(entry)},\n")
         logger.info(f"Metadata: {truncate_str(json.dumps(metadata, indent=4))}\n")
         return ids
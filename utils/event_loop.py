@@ -0,0 +1,71 @@
+"""
+A long-lived background asyncio event loop shared by all reasoning modules.
+
+asyncio.run creates and closes a loop per call, which also throws away the async HTTP client's connection pool
+(the pool is bound to the loop it was created on). Running every coroutine on one persistent loop keeps
+connections warm across calls.
+"""
+import asyncio
+import atexit
+import threading
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_background_loop():
+    """
+    Returns the shared background event loop, starting it in a daemon thread on first use.
+
+    Returns:
+        asyncio.AbstractEventLoop: The running background loop.
+    """
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="cognitive_base_event_loop", daemon=True)
+            _thread.start()
+    return _loop
+
+
+def run_coroutine_sync(coro, timeout=None):
+    """
+    Runs a coroutine on the shared background loop and blocks until it finishes.
+    Safe to call from any thread, including threads that run their own event loop.
+
+    Args:
+        coro: The coroutine to run.
+        timeout (float, optional): Seconds to wait for the result.
+
+    Returns:
+        The coroutine's result.
+
+    Raises:
+        RuntimeError: If called from the background loop's own thread (it would deadlock), use await instead.
+    """
+    loop = get_background_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("run_coroutine_sync called from the background loop thread, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def shutdown_background_loop():
+    """
+    Stops and closes the shared background loop. A new one is started on next use.
+    """
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop is None or loop.is_closed():
+        return
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    if not loop.is_running():
+        loop.close()
+
+
+atexit.register(shutdown_background_loop)
@@ -0,0 +1,258 @@
+"""
+Local, deterministic stand-ins for the OpenAI chat and embedding models, for benchmarks, load tests and offline runs.
+
+- HashEmbeddings: each text maps to a fixed unit vector seeded by its hash, with the same dimensionality as
+  the real model, so vector DBs behave (sizes, index costs) as they would with real embeddings
+- FakeChatModel: scripted or echo responses, with configurable latency and failure injection
+
+Select them with provider='fake' in construct_chat_model / get_embedding_fn, or the LM_PROVIDER /
+EMBEDDING_PROVIDER env vars. The fake chat model's settings can also come from the FAKE_LM_* env vars
+(see fake_chat_model_kwargs_from_env).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from typing import Any, List
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+# dimensionality of the default OpenAI embedding models
+DEFAULT_EMBEDDING_DIM = 1536
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic embeddings: the sha256 of the text seeds a normal sample, normalized to unit length.
+    Identical texts get identical vectors, different texts get (near) orthogonal ones.
+
+    Attributes:
+        dim (int): Embedding dimensionality.
+        model (str): Name, used as the namespace when wrapped in CacheBackedEmbeddings.
+    """
+    def __init__(self, dim=DEFAULT_EMBEDDING_DIM, model='hash-embedding'):
+        self.dim = dim
+        self.model = model
+
+    def embed_one(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_one(text)
+
+
+class FakeLMError(ConnectionError):
+    """
+    Injected LM call failure. status_code mimics the API client errors (eg 429 is treated as a rate limit).
+    """
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers locally.
+
+    Responses are taken from `responses` in order (cycling, failed calls do not use one), or echo the last
+    human message if there are none.
+    Failures are injected for the first `fail_first` calls, then at random with probability `failure_rate`
+    (seeded by `seed`, so runs are reproducible).
+    With tools bound (eg via with_structured_output), the response becomes a call to the first tool, with the
+    content as args if it is a JSON object, else placeholder args filled from the tool's schema.
+
+    Attributes:
+        model_name (str): Reported model name.
+        temperature (float): Only reported, responses do not depend on it.
+        responses (list): Scripted response contents.
+        latency (float): Seconds each call takes.
+        latency_per_token (float): Extra seconds per generated token (4 chars), to mimic generation time.
+        failure_rate (float): Probability a call raises FakeLMError.
+        fail_first (int): Number of initial calls that raise FakeLMError.
+        failure_status_code (int): status_code of injected errors.
+        seed (int): Seed for failure injection.
+    """
+    model_name: str = 'fake-chat'
+    temperature: float = 0
+    responses: List[str] = []
+    latency: float = 0.0
+    latency_per_token: float = 0.0
+    failure_rate: float = 0.0
+    fail_first: int = 0
+    failure_status_code: int = 500
+    seed: int = 0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _rng: Any = PrivateAttr(default=None)
+    _num_calls: int = PrivateAttr(default=0)
+    _num_responses: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def _identifying_params(self):
+        return {'model_name': self.model_name, 'temperature': self.temperature}
+
+    @property
+    def num_calls(self):
+        return self._num_calls
+
+    """
+    helper fns
+    """
+    def _next_content(self, messages):
+        """
+        Counts the call, injects failures and picks the response. Thread safe.
+        """
+        with self._lock:
+            call_idx = self._num_calls
+            self._num_calls += 1
+            if self._rng is None:
+                self._rng = random.Random(self.seed)
+            fail = call_idx < self.fail_first or (self.failure_rate and self._rng.random() < self.failure_rate)
+            response_idx = self._num_responses
+            if not fail:
+                self._num_responses += 1
+        if fail:
+            raise FakeLMError(f'injected failure on call {call_idx + 1}', status_code=self.failure_status_code)
+        if self.responses:
+            return self.responses[response_idx % len(self.responses)]
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                return str(message.content)
+        return str(messages[-1].content) if messages else ''
+
+    def _delay(self, content):
+        return self.latency + self.latency_per_token * len(content) / 4
+
+    @staticmethod
+    def _usage(messages, content):
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(content) // 4
+        return {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                'total_tokens': input_tokens + output_tokens}
+
+    @staticmethod
+    def _placeholder_args(parameters, content):
+        placeholders = {'string': content, 'array': content.split()[:5], 'integer': 0, 'number': 0.0,
+                        'boolean': False, 'object': {}}
+        args = {}
+        for name, spec in parameters.get('properties', {}).items():
+            value = placeholders.get(spec.get('type'), content)
+            if spec.get('type') == 'array' and spec.get('items', {}).get('type') not in (None, 'string'):
+                value = []
+            args[name] = value
+        return args
+
+    def _tool_call(self, tools, content):
+        function = tools[0]['function']
+        try:
+            args = json.loads(content)
+        except ValueError:
+            args = None
+        if not isinstance(args, dict):
+            args = self._placeholder_args(function.get('parameters', {}), content)
+        return {'name': function['name'], 'args': args, 'id': f'call_{self._num_calls}'}
+
+    def _result(self, messages, content, tools=None):
+        tool_calls = [self._tool_call(tools, content)] if tools else []
+        message = AIMessage(
+            content='' if tools else content,
+            tool_calls=tool_calls,
+            usage_metadata=self._usage(messages, content),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _split(content):
+        # word-sized chunks, keeping whitespace so the chunks join back to the content
+        chunks, start = [], 0
+        for i, char in enumerate(content):
+            if char.isspace() and i > start:
+                chunks.append(content[start:i])
+                start = i
+        chunks.append(content[start:])
+        return [chunk for chunk in chunks if chunk]
+
+    """
+    BaseChatModel interface
+    """
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content = self._next_content(messages)
+        time.sleep(self._delay(content))
+        return self._result(messages, content, kwargs.get('tools'))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content = self._next_content(messages)
+        await asyncio.sleep(self._delay(content))
+        return self._result(messages, content, kwargs.get('tools'))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self._next_content(messages)
+        chunks = self._split(content)
+        time.sleep(self.latency)
+        for chunk in chunks:
+            time.sleep(self.latency_per_token * len(chunk) / 4)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self._next_content(messages)
+        chunks = self._split(content)
+        await asyncio.sleep(self.latency)
+        for chunk in chunks:
+            await asyncio.sleep(self.latency_per_token * len(chunk) / 4)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+def fake_chat_model_kwargs_from_env():
+    """
+    FakeChatModel settings from env vars: FAKE_LM_LATENCY, FAKE_LM_LATENCY_PER_TOKEN, FAKE_LM_FAILURE_RATE,
+    FAKE_LM_FAIL_FIRST, FAKE_LM_SEED and FAKE_LM_RESPONSES (path to a JSON list of response strings).
+
+    Returns:
+        dict: Only the settings that are set.
+    """
+    kwargs = {}
+    for env_var, key, cast in (
+        ('FAKE_LM_LATENCY', 'latency', float),
+        ('FAKE_LM_LATENCY_PER_TOKEN', 'latency_per_token', float),
+        ('FAKE_LM_FAILURE_RATE', 'failure_rate', float),
+        ('FAKE_LM_FAIL_FIRST', 'fail_first', int),
+        ('FAKE_LM_SEED', 'seed', int),
+    ):
+        if os.getenv(env_var):
+            kwargs[key] = cast(os.environ[env_var])
+    if os.getenv('FAKE_LM_RESPONSES'):
+        with open(os.environ['FAKE_LM_RESPONSES']) as f:
+            kwargs['responses'] = json.load(f)
+    return kwargs
+
+
+def construct_fake_chat_model(model_name='fake-chat', temperature=0, callbacks=None, **kwargs):
+    """
+    FakeChatModel with settings from the FAKE_LM_* env vars, overridden by kwargs.
+    """
+    model_kwargs = fake_chat_model_kwargs_from_env()
+    model_kwargs.update(kwargs)
+    return FakeChatModel(model_name=model_name, temperature=temperature, callbacks=callbacks, **model_kwargs)
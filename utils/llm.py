@@ -2,7 +2,12 @@
 utils for language models
 """
 import ast
+import asyncio
+import concurrent.futures
+import hashlib
+import json
 import os
+import threading
 
 from langchain_openai import AzureChatOpenAI, ChatOpenAI, AzureOpenAIEmbeddings, OpenAIEmbeddings
 from langchain.embeddings import CacheBackedEmbeddings
@@ -70,16 +75,41 @@ def get_chat_model():
         return ChatOpenAI
 
 
-def get_embedding_fn(store_location="./lm_cache/embeddings"):
+def get_lm_provider(provider=None):
+    """
+    Chat model provider: the given one, else the LM_PROVIDER env var, else 'openai' (OpenAI or Azure OpenAI).
+    'fake' selects the local FakeChatModel from utils/fake_llm.py.
+    """
+    return (provider or os.getenv("LM_PROVIDER") or 'openai').lower()
+
+
+def get_embedding_provider(provider=None):
+    """
+    Embedding provider: the given one, else the EMBEDDING_PROVIDER env var, else LM_PROVIDER, else 'openai'.
+    'fake' selects the local HashEmbeddings from utils/fake_llm.py.
+    """
+    return (provider or os.getenv("EMBEDDING_PROVIDER") or os.getenv("LM_PROVIDER") or 'openai').lower()
+
+
+def get_embedding_fn(store_location="./lm_cache/embeddings", provider=None):
     """
     Determines the embedding function based on the environment configuration.
 
-    This function selects the appropriate embedding function to use based on whether the Azure OpenAI endpoint
-    is configured in the environment variables.
+    This function selects the appropriate embedding function to use based on the provider and whether the
+    Azure OpenAI endpoint is configured in the environment variables.
+
+    Parameters:
+        store_location (str): Folder for the embedding cache.
+        provider (str): 'openai' or 'fake'. Defaults to get_embedding_provider().
 
     Returns:
-        function: The embedding function, either AzureOpenAIEmbeddings or OpenAIEmbeddings.
+        function: The embedding function, either AzureOpenAIEmbeddings or OpenAIEmbeddings behind a cache,
+        or HashEmbeddings (uncached, as it is cheaper than a cache lookup) for the fake provider.
     """
+    if get_embedding_provider(provider) == 'fake':
+        from .fake_llm import HashEmbeddings, DEFAULT_EMBEDDING_DIM
+        return HashEmbeddings(dim=int(os.getenv("FAKE_EMBEDDING_DIM", DEFAULT_EMBEDDING_DIM)))
+
     if os.getenv("AZURE_OPENAI_ENDPOINT"):
         underlying_embeddings = AzureOpenAIEmbeddings()
     else:
@@ -100,7 +130,9 @@ def construct_chat_model(
         request_timeout: int = 120,
         verbose: bool = True,
         callbacks=None,
-        max_retries: int = 5
+        max_retries: int = 5,
+        provider=None,
+        **provider_kwargs,
 ):
     """
     Constructs and initializes a chat model with the specified parameters.
@@ -115,10 +147,18 @@ def construct_chat_model(
         verbose (bool): Flag to enable verbose logging.
         callbacks (list): A list of callback functions to be invoked during model interaction.
         max_retries (int): The maximum number of retries for a request.
+        provider (str): 'openai' or 'fake'. Defaults to get_lm_provider().
+        **provider_kwargs: Extra settings for the fake provider, eg latency or failure_rate (see FakeChatModel).
 
     Returns:
         object: An instance of the constructed chat model.
     """
+    if get_lm_provider(provider) == 'fake':
+        from .fake_llm import construct_fake_chat_model
+        return construct_fake_chat_model(
+            model_name=model_name, temperature=temperature, callbacks=callbacks, **provider_kwargs
+        )
+
     model_params = get_model_params(
         model_name=model_name,
         temperature=temperature,
@@ -130,3 +170,163 @@ def construct_chat_model(
     chat_model = get_chat_model()
     constructed_chat_model = chat_model(**model_params)
     return constructed_chat_model
+
+
+"""
+request coalescing (single-flight)
+"""
+
+
+def llm_fingerprint(llm):
+    """
+    Canonical, JSON-serializable description of an LM runnable (model params, bound kwargs, chain structure).
+    Chat models are described by their identifying params, bindings by their kwargs, and chains recursively.
+
+    Args:
+        llm: A langchain chat model or a runnable wrapping one (eg from bind or with_structured_output).
+
+    Returns:
+        The fingerprint (nested lists / dicts / strings).
+    """
+    identifying_params = getattr(llm, '_identifying_params', None)
+    if isinstance(identifying_params, dict):
+        return [type(llm).__name__, identifying_params]
+
+    parts = [type(llm).__name__]
+    for attr in ('kwargs', 'config'):
+        value = getattr(llm, attr, None)
+        if isinstance(value, dict) and value:
+            parts.append({attr: value})
+    children_found = False
+    for attr in ('bound', 'first', 'middle', 'last', 'steps', 'steps__', 'runnable', 'fallbacks'):
+        child = getattr(llm, attr, None)
+        if child is None:
+            continue
+        children_found = True
+        if isinstance(child, dict):
+            parts.append({attr: {k: llm_fingerprint(v) for k, v in child.items()}})
+        elif isinstance(child, (list, tuple)):
+            parts.append({attr: [llm_fingerprint(v) for v in child]})
+        else:
+            parts.append({attr: llm_fingerprint(child)})
+    if not children_found:
+        # leaf runnables such as output parsers
+        parts.append(repr(llm))
+    return parts
+
+
+def _find_temperature(fingerprint):
+    if isinstance(fingerprint, dict):
+        if 'temperature' in fingerprint:
+            return fingerprint['temperature']
+        values = fingerprint.values()
+    elif isinstance(fingerprint, list):
+        values = fingerprint
+    else:
+        return None
+    for value in values:
+        temperature = _find_temperature(value)
+        if temperature is not None:
+            return temperature
+    return None
+
+
+def request_key(messages, llm, deterministic_only=True):
+    """
+    Canonical hash of an LM request (messages and model parameters), for coalescing identical requests.
+
+    Args:
+        messages (list): langchain messages or role / content dicts.
+        llm: The LM runnable the messages are sent to.
+        deterministic_only (bool): If True, returns None for requests sampled at temperature > 0,
+            since identical prompts there may be meant to get different samples.
+
+    Returns:
+        str or None: Hex digest, or None if the request should not be coalesced.
+    """
+    fingerprint = llm_fingerprint(llm)
+    if deterministic_only and (_find_temperature(fingerprint) or 0) > 0:
+        return None
+    canonical_messages = []
+    for message in messages:
+        if isinstance(message, dict):
+            canonical_messages.append([message.get('role'), message.get('content')])
+        else:
+            canonical_messages.append([
+                getattr(message, 'type', type(message).__name__),
+                message.content,
+                getattr(message, 'additional_kwargs', None) or {},
+            ])
+    payload = json.dumps([canonical_messages, fingerprint], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Identical concurrent requests share one call: the first caller (leader) runs it, later callers with the same key
+    wait on the leader's future. Works across threads and event loops. Keys are dropped once the call finishes,
+    so this does not cache (that is the LM cache's job).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.num_coalesced = 0
+
+    def _join_or_lead(self, key):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.num_coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """
+        Runs fn() once per key among concurrent callers. A None key always runs fn.
+        """
+        if key is None:
+            return fn()
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def ado(self, key, coro_fn):
+        """
+        Async version of do. coro_fn is called with no args and must return a coroutine.
+        """
+        if key is None:
+            return await coro_fn()
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            # followers should not be cancelled along with the leader
+            self._finish(key, future, error=RuntimeError("coalesced LM request was cancelled by its leader"))
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,193 @@
+"""
+LM response cache, a faster drop-in for langchain's SQLiteCache.
+
+- one row per response, keyed by a sha256 of prompt + llm_string (langchain's cache stores the full prompt as the key)
+- plain sqlite3 in WAL mode through SQLiteDB (per-thread connections), so multiple threads / processes sharing
+  lm_cache_dir do not serialize behind SQLAlchemy sessions
+- an in-memory LRU front tier holding deserialized responses (like langchain's InMemoryCache), which also answers
+  async lookups without a thread hop. Only the disk tier is (de)serialized
+- optional TTL and max size eviction
+- hit / miss metrics
+
+Install it with lm_cache_init(folder, cache_type='fast').
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from .database.relational_db.sqlite_db import SQLiteDB
+
+logger = logging.getLogger("logger")
+
+LM_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lm_cache_created ON lm_cache (created);
+"""
+
+
+class LMResponseCache(BaseCache):
+    """
+    Attributes:
+        db (SQLiteDB): The backing db.
+        memory_size (int): Max number of responses held in the in-memory tier. 0 disables it.
+        ttl (float): Seconds a response stays valid. None keeps them forever.
+        max_entries (int): Max number of responses on disk, oldest are evicted first. None for no limit.
+        evict_every (int): Eviction runs once per this many updates, to keep writes cheap.
+    """
+    def __init__(self, database_path, memory_size=1024, ttl=None, max_entries=None, evict_every=100):
+        self.db = SQLiteDB(db_path=database_path, schema_script=LM_CACHE_SCHEMA)
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._updates_since_evict = 0
+        self.metrics = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'updates': 0, 'evictions': 0}
+
+    """
+    helper fns
+    """
+    @staticmethod
+    def make_key(prompt, llm_string):
+        return hashlib.sha256(f"{prompt}\x00{llm_string}".encode('utf-8')).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key, generations, created):
+        if not self.memory_size:
+            return
+        with self._lock:
+            self._memory[key] = (list(generations), created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _memory_lookup(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            generations, created = entry
+            if self._expired(created):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.metrics['memory_hits'] += 1
+        return list(generations)
+
+    @staticmethod
+    def _serialize(generations):
+        # stored on disk as a JSON list of langchain-serialized generations
+        return json.dumps([dumps(gen) for gen in generations])
+
+    @staticmethod
+    def _deserialize(value):
+        return [loads(gen) for gen in json.loads(value)]
+
+    def stats(self):
+        """
+        Returns:
+            dict: The metrics plus hit_rate over all lookups.
+        """
+        with self._lock:
+            stats = dict(self.metrics)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def evict(self):
+        """
+        Deletes expired responses and, if over max_entries, the oldest ones.
+        """
+        deleted = 0
+        with self.db.connection() as conn:
+            if self.ttl is not None:
+                deleted += conn.execute("DELETE FROM lm_cache WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            if self.max_entries is not None:
+                deleted += conn.execute(
+                    "DELETE FROM lm_cache WHERE key IN "
+                    "(SELECT key FROM lm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            conn.commit()
+        with self._lock:
+            self.metrics['evictions'] += deleted
+        return deleted
+
+    """
+    langchain BaseCache interface
+    """
+    def lookup(self, prompt, llm_string):
+        key = self.make_key(prompt, llm_string)
+        generations = self._memory_lookup(key)
+        if generations is not None:
+            return generations
+
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT value, created FROM lm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or self._expired(row[1]):
+            with self._lock:
+                self.metrics['misses'] += 1
+            return None
+        try:
+            generations = self._deserialize(row[0])
+        except Exception:
+            logger.warning("Could not deserialize cached LM response, deleting it and treating as a miss\n")
+            with self.db.connection() as conn:
+                conn.execute("DELETE FROM lm_cache WHERE key = ?", (key,))
+                conn.commit()
+            with self._lock:
+                self.metrics['misses'] += 1
+            return None
+        with self._lock:
+            self.metrics['disk_hits'] += 1
+        self._remember(key, generations, row[1])
+        return generations
+
+    async def alookup(self, prompt, llm_string):
+        generations = self._memory_lookup(self.make_key(prompt, llm_string))
+        if generations is not None:
+            return generations
+        return await super().alookup(prompt, llm_string)
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.make_key(prompt, llm_string)
+        value = self._serialize(return_val)
+        created = time.time()
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lm_cache (key, value, created) VALUES (?, ?, ?)",
+                (key, value, created),
+            )
+            conn.commit()
+        self._remember(key, return_val, created)
+
+        with self._lock:
+            self.metrics['updates'] += 1
+            self._updates_since_evict += 1
+            run_evict = self._updates_since_evict >= self.evict_every
+            if run_evict:
+                self._updates_since_evict = 0
+        if run_evict and (self.ttl is not None or self.max_entries is not None):
+            self.evict()
+
+    def clear(self, **kwargs):
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM lm_cache")
+            conn.commit()
+        with self._lock:
+            self._memory.clear()
@@ -0,0 +1,264 @@
+"""
+Per-module LM metrics, keyed by the reasoning module's name (BaseLMReasoning.name, eg 'coding', 'skill').
+
+Fed from the retry loops: every LM call records its prompt / completion tokens, latency, scheduler queue wait
+and whether it was answered by the LM cache. Transport errors (incl rate limits), parse errors and calls that
+ended without a parse are counted too. Aggregated per task (per task scope, see task_scope.py) and per run,
+like the tracing timings.
+
+Cache hits are detected with MeteredCache, which lm_cache_init installs around the LM cache: it reports
+lookups to the CacheProbe the retry loop opens around each call.
+"""
+import contextvars
+import math
+import threading
+
+from contextlib import contextmanager
+
+from langchain_core.caches import BaseCache
+
+from .task_scope import current_task_scope
+
+_cache_probe = contextvars.ContextVar('lm_cache_probe', default=None)
+
+COUNTERS = (
+    'calls', 'cache_hits', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+    'transport_errors', 'rate_limited', 'parse_errors', 'failures',
+)
+
+
+def usage_breakdown(ai_message):
+    """
+    Prompt and completion tokens reported by the API for a response, (0, 0) if not reported.
+    """
+    if isinstance(ai_message, dict):
+        ai_message = ai_message.get('raw')
+    usage = getattr(ai_message, 'usage_metadata', None) or {}
+    return usage.get('input_tokens', 0) or 0, usage.get('output_tokens', 0) or 0
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list, None if empty.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class ModuleStats:
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latencies = []
+        self.queue_waits = []
+
+    def merge(self, other):
+        for counter, value in other.counters.items():
+            self.counters[counter] += value
+        self.latencies.extend(other.latencies)
+        self.queue_waits.extend(other.queue_waits)
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        api_calls = self.counters['calls'] - self.counters['cache_hits']
+        return {
+            **self.counters,
+            'cache_hit_rate': self.counters['cache_hits'] / self.counters['calls'] if self.counters['calls'] else 0.0,
+            'retries': self.counters['transport_errors'] + self.counters['parse_errors'],
+            'avg_prompt_tokens': self.counters['prompt_tokens'] / api_calls if api_calls else 0.0,
+            'avg_completion_tokens': self.counters['completion_tokens'] / api_calls if api_calls else 0.0,
+            'latency_s': {
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1] if latencies else None,
+            },
+            'queue_wait_s': {
+                'mean': sum(self.queue_waits) / len(self.queue_waits) if self.queue_waits else None,
+                'max': max(self.queue_waits) if self.queue_waits else None,
+            },
+        }
+
+
+class LMMetrics:
+    """
+    Thread-safe collector of per-module LM metrics, for the current task and for the whole run.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task_stats = {}
+        self._run_stats = {}
+
+    def _update(self, name, fn):
+        with self._lock:
+            task_stats = self._task_stats.setdefault(current_task_scope(), {})
+            for stats in (task_stats, self._run_stats):
+                module_stats = stats.get(name)
+                if module_stats is None:
+                    module_stats = stats[name] = ModuleStats()
+                fn(module_stats)
+
+    def record_call(self, name, ai_message, latency, queue_wait=0.0, cache_hit=False):
+        """
+        Records a completed LM call. Tokens of cache hits are not counted, since they were not billed.
+        """
+        prompt_tokens, completion_tokens = (0, 0) if cache_hit else usage_breakdown(ai_message)
+
+        def fn(module_stats):
+            counters = module_stats.counters
+            counters['calls'] += 1
+            counters['cache_hits'] += int(cache_hit)
+            counters['prompt_tokens'] += prompt_tokens
+            counters['completion_tokens'] += completion_tokens
+            counters['total_tokens'] += prompt_tokens + completion_tokens
+            module_stats.latencies.append(latency)
+            module_stats.queue_waits.append(queue_wait)
+        self._update(name, fn)
+
+    def _increment(self, name, *counters):
+        def fn(module_stats):
+            for counter in counters:
+                module_stats.counters[counter] += 1
+        self._update(name, fn)
+
+    def record_transport_error(self, name, rate_limited=False):
+        if rate_limited:
+            self._increment(name, 'transport_errors', 'rate_limited')
+        else:
+            self._increment(name, 'transport_errors')
+
+    def record_parse_error(self, name):
+        self._increment(name, 'parse_errors')
+
+    def record_failure(self, name):
+        """
+        Records a retry loop that ended without a successful parse (fallback returned).
+        """
+        self._increment(name, 'failures')
+
+    @staticmethod
+    def _export(stats):
+        return {name: stats[name].as_dict() for name in sorted(stats)}
+
+    def task_metrics(self):
+        """
+        Returns:
+            dict: module name -> metrics since the last reset_task, in the current task scope.
+        """
+        with self._lock:
+            return self._export(self._task_stats.get(current_task_scope(), {}))
+
+    def run_metrics(self):
+        """
+        Returns:
+            dict: module name -> metrics over the whole run.
+        """
+        with self._lock:
+            return self._export(self._run_stats)
+
+    def take_run_stats(self):
+        """
+        Hands over the raw run stats and starts the run over, eg for a worker process to send its stats to the
+        driver after each task.
+
+        Returns:
+            dict: module name -> ModuleStats.
+        """
+        with self._lock:
+            stats, self._run_stats = self._run_stats, {}
+            return stats
+
+    def merge_run_stats(self, stats):
+        """
+        Adds run stats taken from another collector (take_run_stats) to this run's.
+        """
+        with self._lock:
+            for name, module_stats in stats.items():
+                self._run_stats.setdefault(name, ModuleStats()).merge(module_stats)
+
+    def reset_task(self):
+        with self._lock:
+            self._task_stats.pop(current_task_scope(), None)
+
+    def reset(self):
+        with self._lock:
+            self._task_stats = {}
+            self._run_stats = {}
+
+
+_lm_metrics = LMMetrics()
+
+
+def get_lm_metrics():
+    """
+    Returns the process-wide LM metrics collector.
+    """
+    return _lm_metrics
+
+
+"""
+cache hit detection
+"""
+
+
+class CacheProbe:
+    def __init__(self):
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def hit(self):
+        return self.hits > 0
+
+
+@contextmanager
+def cache_probe():
+    """
+    Collects the LM cache lookups made by LM calls inside the block (also through executors, which copy
+    the context but share the probe).
+    """
+    probe = CacheProbe()
+    token = _cache_probe.set(probe)
+    try:
+        yield probe
+    finally:
+        _cache_probe.reset(token)
+
+
+def note_cache_lookup(hit):
+    probe = _cache_probe.get()
+    if probe is not None:
+        probe.lookups += 1
+        probe.hits += int(hit)
+
+
+class MeteredCache(BaseCache):
+    """
+    Delegating wrapper around an LM cache that reports each lookup to the active CacheProbe.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def lookup(self, prompt, llm_string):
+        out = self.cache.lookup(prompt, llm_string)
+        note_cache_lookup(out is not None)
+        return out
+
+    async def alookup(self, prompt, llm_string):
+        out = await self.cache.alookup(prompt, llm_string)
+        note_cache_lookup(out is not None)
+        return out
+
+    def update(self, prompt, llm_string, return_val):
+        self.cache.update(prompt, llm_string, return_val)
+
+    async def aupdate(self, prompt, llm_string, return_val):
+        await self.cache.aupdate(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs):
+        self.cache.clear(**kwargs)
+
+    async def aclear(self, **kwargs):
+        await self.cache.aclear(**kwargs)
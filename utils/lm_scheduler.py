@@ -0,0 +1,300 @@
+"""
+Shared scheduler for LM requests: bounded concurrency, token-bucket rate limits and priority classes.
+
+Every LM call from the retry loops takes a slot from the scheduler first. When slots or rate budget run out,
+waiting requests are granted strictly in priority order (then FIFO), so eg gen_code calls jump ahead of queued
+background summarization. In-flight requests are never cancelled.
+
+Works from both sync code (threads) and async code (any event loop), since waiters are woken thread-safely.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger("logger")
+
+# lower value is served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 per second, holding at most per_minute.
+    The level may go negative when actual usage exceeds what was reserved, which delays later requests.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until amount can be consumed (amount is capped at capacity so huge requests still run).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class _Waiter:
+    def __init__(self, priority, seq, tokens, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Slot:
+    """
+    Handle for a granted request. Set tokens_used once the response is in to correct the token budget.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.tokens_used = None
+
+
+class LMScheduler:
+    """
+    Attributes:
+        max_in_flight (int): Max number of concurrent LM requests.
+        requests_per_minute (int): Optional RPM limit.
+        tokens_per_minute (int): Optional TPM limit, enforced on estimated prompt tokens then corrected with usage.
+    """
+    def __init__(self, max_in_flight=16, requests_per_minute=None, tokens_per_minute=None):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_due = None
+        self._paused_until = 0.0
+        self._rpm_bucket = None
+        self._tpm_bucket = None
+        self.in_flight = 0
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = None
+        self.tokens_per_minute = None
+        self.configure(max_in_flight, requests_per_minute, tokens_per_minute)
+
+    def configure(self, max_in_flight=None, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Updates limits in place. Args left as None are unchanged, 0 removes a rate limit.
+        """
+        with self._lock:
+            if max_in_flight is not None:
+                self.max_in_flight = max(1, int(max_in_flight))
+            if requests_per_minute is not None:
+                self.requests_per_minute = requests_per_minute or None
+                self._rpm_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+            if tokens_per_minute is not None:
+                self.tokens_per_minute = tokens_per_minute or None
+                self._tpm_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._dispatch()
+
+    def pause(self, seconds):
+        """
+        Holds back all new requests for the given seconds, eg after a 429 from the API.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.info(f"LM scheduler paused for {seconds:.1f}s\n")
+        self._dispatch()
+
+    """
+    granting
+    """
+    def _wait_time_locked(self, waiter):
+        wait = self._paused_until - time.monotonic()
+        if self._rpm_bucket is not None:
+            wait = max(wait, self._rpm_bucket.wait_time(1))
+        if self._tpm_bucket is not None and waiter.tokens:
+            wait = max(wait, self._tpm_bucket.wait_time(waiter.tokens))
+        return wait
+
+    def _dispatch(self):
+        to_wake = []
+        with self._lock:
+            while self._heap and self.in_flight < self.max_in_flight:
+                waiter = self._heap[0]
+                if waiter.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = self._wait_time_locked(waiter)
+                if wait > 0:
+                    self._schedule_dispatch_locked(wait)
+                    break
+                heapq.heappop(self._heap)
+                if self._rpm_bucket is not None:
+                    self._rpm_bucket.consume(1)
+                if self._tpm_bucket is not None:
+                    self._tpm_bucket.consume(waiter.tokens)
+                self.in_flight += 1
+                waiter.granted = True
+                to_wake.append(waiter)
+        for waiter in to_wake:
+            waiter.wake()
+
+    def _schedule_dispatch_locked(self, wait):
+        due = time.monotonic() + wait
+        if self._timer is not None and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(wait, self._on_timer)
+        self._timer.daemon = True
+        self._timer_due = due
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._timer_due = None
+        self._dispatch()
+
+    def _enqueue(self, priority, tokens, wake):
+        with self._lock:
+            waiter = _Waiter(priority, next(self._seq), tokens, wake)
+            heapq.heappush(self._heap, waiter)
+        self._dispatch()
+        return waiter
+
+    def _abandon(self, waiter):
+        with self._lock:
+            waiter.cancelled = True
+            granted = waiter.granted
+        if granted:
+            self.release()
+
+    def release(self, tokens_used=None, tokens_reserved=0):
+        """
+        Frees a slot. If tokens_used is given, the TPM budget is corrected by the difference from the reservation.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if tokens_used is not None and self._tpm_bucket is not None:
+                self._tpm_bucket.consume(tokens_used - tokens_reserved)
+        self._dispatch()
+
+    """
+    public acquire api
+    """
+    async def acquire(self, priority=PRIORITY_NORMAL, tokens=0):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, tokens, wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def acquire_sync(self, priority=PRIORITY_NORMAL, tokens=0):
+        event = threading.Event()
+        waiter = self._enqueue(priority, tokens, event.set)
+        try:
+            event.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_NORMAL, tokens=0):
+        """
+        Usage:
+            async with scheduler.slot(PRIORITY_HIGH, tokens=estimate) as slot:
+                ai_message = await lm.ainvoke(messages)
+                slot.tokens_used = usage_tokens(ai_message)
+        """
+        await self.acquire(priority, tokens)
+        slot = Slot(tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot.tokens_used, tokens)
+
+    @contextmanager
+    def slot_sync(self, priority=PRIORITY_NORMAL, tokens=0):
+        """
+        Sync version of slot.
+        """
+        self.acquire_sync(priority, tokens)
+        slot = Slot(tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot.tokens_used, tokens)
+
+
+_scheduler = LMScheduler()
+
+
+def get_scheduler():
+    """
+    Returns the process-wide scheduler shared by all reasoning modules.
+    """
+    return _scheduler
+
+
+def configure_scheduler(max_in_flight=None, requests_per_minute=None, tokens_per_minute=None):
+    """
+    Updates the limits of the process-wide scheduler. Args left as None are unchanged.
+    """
+    _scheduler.configure(max_in_flight, requests_per_minute, tokens_per_minute)
+    return _scheduler
+
+
+def estimate_tokens(messages):
+    """
+    Rough prompt token count (4 characters per token), for reserving TPM budget before the call.
+    """
+    num_chars = 0
+    for message in messages:
+        content = message['content'] if isinstance(message, dict) else getattr(message, 'content', message)
+        num_chars += len(str(content))
+    return num_chars // 4 + 4 * len(messages)
+
+
+def usage_tokens(ai_message):
+    """
+    Total tokens reported by the API for a response, or None if not reported.
+    """
+    if isinstance(ai_message, dict):
+        ai_message = ai_message.get('raw')
+    usage = getattr(ai_message, 'usage_metadata', None)
+    if usage:
+        return usage.get('total_tokens')
+    return None
+
+
+def is_rate_limit_error(e):
+    """
+    Whether an exception from the LM client is a 429 / rate limit error.
+    """
+    return getattr(e, 'status_code', None) == 429 or type(e).__name__ == 'RateLimitError'
@@ -1,4 +1,4 @@
-import shutil
+import json
 import logging
 import time
 import random
@@ -9,10 +9,38 @@ import traceback
 from pathlib import Path
 
 from . import dump_json, lm_cache_init
+from .ckpt_snapshot import CkptSnapshotStore
+from .ckpt_writer import get_ckpt_writer
+from .tracing import get_tracer, span
+from .lm_metrics import get_lm_metrics
+from .task_scope import current_task_scope
 
 logger = logging.getLogger("logger")
 
-def setup_extra_file_handler(logger, extra_log_file_name):
+
+class TaskScopeFilter(logging.Filter):
+    """
+    Passes the records logged in one task scope (see task_scope.py), so that tasks running at once each get
+    their own extra log.
+    """
+    def __init__(self, scope=None):
+        super().__init__()
+        self.scope = scope
+
+    def filter(self, record):
+        return current_task_scope() == self.scope
+
+
+def extra_log_path(extra_log_folder, scope=None):
+    """
+    The extra log of a task scope: extra_log.log for the None scope, else extra_log_{scope}.log
+    """
+    if scope is None:
+        return f"{extra_log_folder}/extra_log.log"
+    return f"{extra_log_folder}/extra_log_{scope}.log"
+
+
+def setup_extra_file_handler(logger, extra_log_file_name, scope=None):
     """
     Adds an extra file handler to the provided logger.
     This is for per-task logging
@@ -24,6 +52,7 @@ def setup_extra_file_handler(logger, extra_log_file_name):
     Args:
         logger (logging.Logger): The logger to which the file handler will be added.
         extra_log_file_name (str): The name of the file where log messages will be written.
+        scope (hashable, optional): Only log the records of this task scope. None (sequential runs) by default.
 
     Returns:
         None
@@ -32,9 +61,22 @@ def setup_extra_file_handler(logger, extra_log_file_name):
     extra_file_handler.setLevel(logging.INFO)
     formatter = logging.Formatter("%(levelname)s - %(message)s")
     extra_file_handler.setFormatter(formatter)
+    extra_file_handler.addFilter(TaskScopeFilter(scope))
     logger.addHandler(extra_file_handler)
 
 
+def remove_file_handler(logger, file_name):
+    """
+    Closes and removes the logger's file handler writing to file_name, if any.
+    """
+    abs_name = os.path.abspath(file_name)
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and os.path.abspath(handler.baseFilename) == abs_name:
+            handler.close()
+            logger.removeHandler(handler)
+            break
+
+
 def setup_logging_n_base_dirs(args):
     log_folder = args.log_folder
     if not Path(args.result_dir).exists():
@@ -74,45 +116,131 @@ def setup_logging_n_base_dirs(args):
         f.write(f"{log_file_name}\n")
 
     # LM caching
-    lm_cache_init(args.lm_cache_dir)
+    lm_cache_init(args.lm_cache_dir, cache_type=getattr(args, 'lm_cache_type', 'langchain'))
 
 
 def train_ckpt(agent):
-    data = {attr: getattr(agent, attr) for attr in getattr(agent, 'attr_to_save')}
     args = getattr(agent, 'args')
-    dump_json(data, f"{args['result_dir']}/train_ckpt_info.json", indent=4)
-    train_iter = getattr(agent, 'train_iter')
-    if not train_iter % args['save_every']:
-        shutil.copytree(args['ckpt_dir'], f"{args['result_dir']}/saved_train_ckpt/{train_iter}", dirs_exist_ok=True)
+    writer = get_ckpt_writer()
+    with span('train_ckpt'):
+        data = {attr: getattr(agent, attr) for attr in getattr(agent, 'attr_to_save')}
+        info_path = f"{args['result_dir']}/train_ckpt_info.json"
+        writer.submit(dump_json, data, info_path, key=info_path, indent=4)
+        train_iter = getattr(agent, 'train_iter')
+        if not train_iter % args['save_every']:
+            # runs after the json writes queued before it, and db writes of the next iter wait for it
+            writer.submit(snapshot_ckpt_dir, args['result_dir'], args['ckpt_dir'], train_iter, data, reads_files=True)
+    if get_tracer().enabled:
+        save_trace_timings(agent, args['result_dir'])
+    save_lm_metrics(
+        args['result_dir'], {'mode': 'train', 'train_iter': train_iter, 'task_id': getattr(agent, 'task_id', None)}
+    )
+
+
+def snapshot_ckpt_dir(result_dir, ckpt_dir, train_iter, info):
+    """
+    Snapshots ckpt_dir to saved_train_ckpt. Incremental: only the chunks changed since the last snapshot are written.
+    """
+    with span('train_ckpt.snapshot'), get_ckpt_writer().file_lock:
+        CkptSnapshotStore(f"{result_dir}/saved_train_ckpt").snapshot(ckpt_dir, train_iter, info=info)
 
 
-def move_log_file(new_log_file_name, extra_log_folder):
+def restore_train_ckpt(result_dir, ckpt_dir, train_iter=None):
+    """
+    Restores the ckpt_dir saved by train_ckpt at train_iter, along with train_ckpt_info.json, so that an agent
+    built afterwards with resume resumes from there. Call before building the agent, as its memories hold the
+    ckpt_dir open.
+
+    Args:
+        result_dir (str): The result directory of the run.
+        ckpt_dir (str): The checkpoint dir to restore to, replaced if it exists (kept if the restore fails).
+        train_iter (int, optional): The snapshot to restore, defaults to the latest.
+
+    Returns:
+        int: The train_iter restored.
+    """
+    get_ckpt_writer().flush()
+    store = CkptSnapshotStore(f"{result_dir}/saved_train_ckpt")
+    if train_iter is None:
+        snapshots = store.list_snapshots()
+        if not snapshots:
+            raise FileNotFoundError(f"no train ckpt snapshots in {store.root}")
+        train_iter = snapshots[-1]
+    info = store.restore(train_iter, ckpt_dir, overwrite=True)
+    if info is not None:
+        dump_json(info, f"{result_dir}/train_ckpt_info.json", indent=4)
+    logger.info(f'[restored train ckpt] {train_iter} to {ckpt_dir}')
+    return train_iter
+
+
+def save_trace_timings(agent, result_dir):
+    """
+    Writes the span timings of the task just finished next to train_ckpt_info.json, then starts a new task.
+
+    - train_ckpt_timings.jsonl: one line per train iter, with that task's timings
+    - train_ckpt_timings.json: timings aggregated over the run so far
+
+    Args:
+        agent: The agent, for train_iter and task_id.
+        result_dir (str): The result directory.
+    """
+    tracer = get_tracer()
+    line = {
+        'train_iter': getattr(agent, 'train_iter'),
+        'task_id': getattr(agent, 'task_id', None),
+        'timings': tracer.task_timings(),
+    }
+    with open(f"{result_dir}/train_ckpt_timings.jsonl", 'a', encoding='utf-8') as f:
+        f.write(json.dumps(line, default=str) + '\n')
+    dump_json(tracer.run_timings(), f"{result_dir}/train_ckpt_timings.json", indent=4)
+    tracer.reset_task()
+
+
+def save_lm_metrics(result_dir, task_info):
+    """
+    Writes the per-module LM metrics (tokens, latency, cache hits, retries) of the task just finished,
+    then starts a new task.
+
+    - lm_metrics.jsonl: one line per task, task_info plus that task's metrics
+    - lm_metrics.json: metrics aggregated over the run so far
+
+    Args:
+        result_dir (str): The result directory.
+        task_info (dict): Identifies the task, eg mode, train_iter and task_id.
+    """
+    metrics = get_lm_metrics()
+    line = {**task_info, 'lm_metrics': metrics.task_metrics()}
+    with open(f"{result_dir}/lm_metrics.jsonl", 'a', encoding='utf-8') as f:
+        f.write(json.dumps(line, default=str) + '\n')
+    dump_json(metrics.run_metrics(), f"{result_dir}/lm_metrics.json", indent=4)
+    metrics.reset_task()
+
+
+def move_log_file(new_log_file_name, extra_log_folder, scope=None):
     """
     Moves the existing log file to a new location and updates the logger to use the new log file. for the extra log which is for per-task logging
     Args:
         new_log_file_name (str): The new file name for the log file.
         extra_log_folder (str): The folder where the extra log file is currently located.
+        scope (hashable, optional): The task scope of the extra log. The extra log of a scope other than None
+            (a concurrent task) is not reopened, as the task is over.
     Raises:
         FileNotFoundError: If the extra log file does not exist.
         PermissionError: If the file cannot be moved due to permission issues.
     """
-    extra_log_file_name = f"{extra_log_folder}/extra_log.log"
-    abs_name = os.path.abspath(extra_log_file_name)
+    extra_log_file_name = extra_log_path(extra_log_folder, scope)
 
     # Get the logger
     logger = logging.getLogger("logger")
 
     # Find and remove the existing extra file handler
-    for handler in logger.handlers:
-        if isinstance(handler, logging.FileHandler) and os.path.abspath(handler.baseFilename) == abs_name:
-            handler.close()
-            logger.removeHandler(handler)
-            break
+    remove_file_handler(logger, extra_log_file_name)
 
     os.rename(extra_log_file_name, new_log_file_name)
 
     # Add the new extra file handler
-    setup_extra_file_handler(logger, extra_log_file_name)
+    if scope is None:
+        setup_extra_file_handler(logger, extra_log_file_name)
 
 
 def construct_task_folder(result_dir, mode, task_id):
@@ -176,7 +304,7 @@ def setup_base_dirs(args, log_file_name):
     with open(os.path.join(args.result_dir, "log_files.txt"), "a+") as f:
         f.write(f"{log_file_name}\n")
     # LM caching
-    lm_cache_init(args.lm_cache_dir)
+    lm_cache_init(args.lm_cache_dir, cache_type=getattr(args, 'lm_cache_type', 'langchain'))
 
 
 def setup_logging_n_base_dirs_old(args):
@@ -1,15 +1,166 @@
 import logging
 import asyncio
+import random
 import traceback
 import time
 
+from email.utils import parsedate_to_datetime
+
 from pprint import pp
 from langchain.schema import HumanMessage, AIMessage
 
+from ..knowledge_sources.parsers import MalformedStreamError
+
 from . import custom_breakpoint, print_messages, print_panel, str_from_msg
+from .event_loop import run_coroutine_sync
+from .llm import request_key, single_flight
+from .tracing import span, traced
+from .lm_metrics import get_lm_metrics, cache_probe
+from .lm_scheduler import PRIORITY_NORMAL, get_scheduler, estimate_tokens, usage_tokens, is_rate_limit_error
 
 logger = logging.getLogger("logger")
 
+
+def retry_after_seconds(e):
+    """
+    Reads the Retry-After (or retry-after-ms) header from an LM client error's HTTP response, if any.
+
+    Returns:
+        float or None: Seconds to wait, or None if the header is absent or unparseable.
+    """
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, e=None, base=1.0, max_delay=60.0):
+    """
+    Delay before retrying an LM call: the server's Retry-After if sent, else exponential backoff with jitter
+    (uniform between half and all of base * 2 ** (attempt - 1), capped at max_delay).
+
+    Args:
+        attempt (int): 1-based number of LM call failures so far.
+        e (Exception, optional): The error, checked for a Retry-After header.
+        base (float): Delay of the first retry before jitter.
+        max_delay (float): Cap on the delay.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    retry_after = retry_after_seconds(e) if e is not None else None
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    delay = min(max_delay, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def handle_transport_error(e, transport_failures, transport_tries, scheduler, backoff_base, backoff_max):
+    """
+    Logs an LM call error and works out the retry delay. Rate limit errors also pause the shared scheduler.
+
+    Returns:
+        float or None: Seconds to wait before retrying, or None if the transport budget is spent.
+    """
+    error_msg = f"Error during LM call! Error msg:\n{str(e)}, {type(e).__name__}\n"
+    logger.warning(error_msg)
+    logger.warning(traceback.format_exc())
+    if transport_failures >= transport_tries:
+        logger.error(f'LM call failed {transport_failures} times, giving up\n')
+        return None
+    delay = backoff_delay(transport_failures, e, base=backoff_base, max_delay=backoff_max)
+    if is_rate_limit_error(e):
+        scheduler.pause(delay)
+    logger.warning(f'Retrying LM call in {delay:.1f}s ({transport_failures} / {transport_tries} failures)\n')
+    return delay
+
+
+def merge_stream_chunks(ai_message):
+    """
+    Turns the sum of streamed AIMessageChunks into an AIMessage, so parse fns see the same type as with invoke.
+    """
+    if ai_message is None:
+        return AIMessage(content='')
+    return AIMessage(
+        content=ai_message.content,
+        response_metadata=ai_message.response_metadata,
+        usage_metadata=ai_message.usage_metadata,
+        id=ai_message.id,
+    )
+
+
+def stream_lm(lm, messages, stream_fn):
+    """
+    Streams a response, feeding each chunk to a fresh extractor from stream_fn, and stops generation as soon as
+    the extractor reports it has what it needs (closing the stream stops the API from generating the rest).
+
+    Args:
+        lm (langchain chatmodel): The language model.
+        messages (list): The prompt.
+        stream_fn (callable): Returns an object whose feed(text) returns True when done, eg StreamingBlockExtractor.
+            feed may raise MalformedStreamError to abort early.
+
+    Returns:
+        AIMessage: The (possibly truncated) response.
+    """
+    extractor = stream_fn()
+    ai_message = None
+    stream = lm.stream(messages)
+    try:
+        for chunk in stream:
+            ai_message = chunk if ai_message is None else ai_message + chunk
+            if isinstance(chunk.content, str) and extractor.feed(chunk.content):
+                break
+    finally:
+        stream.close()
+    return merge_stream_chunks(ai_message)
+
+
+async def astream_lm(lm, messages, stream_fn):
+    """
+    async version of stream_lm
+    """
+    extractor = stream_fn()
+    ai_message = None
+    stream = lm.astream(messages)
+    try:
+        async for chunk in stream:
+            ai_message = chunk if ai_message is None else ai_message + chunk
+            if isinstance(chunk.content, str) and extractor.feed(chunk.content):
+                break
+    finally:
+        await stream.aclose()
+    return merge_stream_chunks(ai_message)
+
+
+def handle_malformed_stream(e, messages):
+    """
+    A stream aborted as malformed counts as a failed parse: the partial response and the error go back to the LM.
+    """
+    error_msg = f"Error during parsing! {str(e)}, {type(e).__name__}\n"
+    logger.warning(error_msg)
+    messages.append(AIMessage(content=e.text))
+    messages.append(HumanMessage(content=error_msg))
+
+
+@traced('parse_retry_loop')
 async def async_parse_retry_loop(
     messages,
     parse_fn,
@@ -22,27 +173,64 @@ async def async_parse_retry_loop(
     verbose=False,
     return_type='ai_message',
     name='base_reasoning',
+    priority=PRIORITY_NORMAL,
+    scheduler=None,
+    transport_tries=5,
+    backoff_base=1.0,
+    backoff_max=60.0,
+    stream_fn=None,
 ):
     """
     async version of parse_retry_loop
     """
     parsed_result = fallback if (fallback is not None) else {}
     parse_success = False
+    if scheduler is None:
+        scheduler = get_scheduler()
+    metrics = get_lm_metrics()
 
-    for i in range(parse_tries):
-        logger.info(f'LM call n parse attempt {i + 1} / {parse_tries}\n')
+    parse_attempt = 0
+    transport_failures = 0
+    while parse_attempt < parse_tries:
+        logger.info(f'LM call n parse attempt {parse_attempt + 1} / {parse_tries}\n')
         try:
-            ai_message = await lm.ainvoke(messages)
+            async def call_lm():
+                queued = time.perf_counter()
+                async with scheduler.slot(priority, tokens=estimate_tokens(messages)) as slot:
+                    started = time.perf_counter()
+                    with cache_probe() as probe:
+                        if stream_fn is None:
+                            out = await lm.ainvoke(messages)
+                        else:
+                            out = await astream_lm(lm, messages, stream_fn)
+                    slot.tokens_used = usage_tokens(out)
+                metrics.record_call(
+                    name, out, time.perf_counter() - started, queue_wait=started - queued, cache_hit=probe.hit
+                )
+                return out
+
+            # identical concurrent requests share one API call. streamed responses may be truncated so never shared
+            key = request_key(messages, lm) if stream_fn is None else None
+            with span('lm.call'):
+                ai_message = await single_flight.ado(key, call_lm)
 
             msg = ai_message if return_type == 'ai_message' else AIMessage(
                 content=str_from_msg(ai_message, return_type))
             messages.append(msg)
+        except MalformedStreamError as e:
+            parse_attempt += 1
+            metrics.record_parse_error(name)
+            handle_malformed_stream(e, messages)
+            continue
         except Exception as e:
-            error_msg = f"Error during LM call! Retrying. Error msg:\n{str(e)}, {type(e).__name__}\n"
-            logger.warning(error_msg)
-            logger.warning(traceback.format_exc())
-            await asyncio.sleep(5)
+            transport_failures += 1
+            metrics.record_transport_error(name, rate_limited=is_rate_limit_error(e))
+            delay = handle_transport_error(e, transport_failures, transport_tries, scheduler, backoff_base, backoff_max)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
             continue
+        parse_attempt += 1
         if verbose or debug_mode:
             # print full thing incase error msg
             pp(ai_message)
@@ -51,18 +239,22 @@ async def async_parse_retry_loop(
         if debug_mode:
             await asyncio.to_thread(custom_breakpoint)
         try:
-            if parser:
-                parsed_result = parse_fn(ai_message, parser=parser)
-            else:
-                parsed_result = parse_fn(ai_message)
+            with span('lm.parse'):
+                if parser:
+                    parsed_result = parse_fn(ai_message, parser=parser)
+                else:
+                    parsed_result = parse_fn(ai_message)
             parse_success = True
             break
         except Exception as e:
+            # parse errors are retried immediately with the error as feedback
             error_msg = f"Error during parsing! {str(e)}, {type(e).__name__}\n"
             logger.warning(error_msg)
             messages.append(HumanMessage(content=error_msg))
+            metrics.record_parse_error(name)
     if not parse_success:
         logger.error(f'All parse attempts failed')
+        metrics.record_failure(name)
     if return_messages:
         return {'parsed_result': parsed_result, 'messages': messages}
     return parsed_result
@@ -79,6 +271,7 @@ def parse_retry_loop_sync(
 ):
     """
     Synchronous wrapper for the asynchronous parse retry loop.
+    Runs on the shared background event loop so the LM client's connections stay warm across calls.
 
     :param messages:
     :param parse_fn:
@@ -89,10 +282,11 @@ def parse_retry_loop_sync(
     :param parser:
     :return:
     """
-    return asyncio.run(async_parse_retry_loop(messages, parse_fn, lm, parse_tries, fallback, debug_mode, parser))
+    return run_coroutine_sync(async_parse_retry_loop(messages, parse_fn, lm, parse_tries, fallback, debug_mode, parser))
 
 
 # TODO: deprecate this after checking sync wrapper works for async ver
+@traced('parse_retry_loop')
 def parse_retry_loop(
     messages,
     parse_fn,
@@ -105,10 +299,20 @@ def parse_retry_loop(
     verbose=False,
     return_type='ai_message',
     name='base_reasoning',
+    priority=PRIORITY_NORMAL,
+    scheduler=None,
+    transport_tries=5,
+    backoff_base=1.0,
+    backoff_max=60.0,
+    stream_fn=None,
 ):
     """
     LM call, then parse messages. with retries upon failure.
 
+    LM call (transport) errors and parse errors have separate budgets. Transport errors are retried with
+    exponential backoff and jitter, honouring Retry-After when the API sends it. Parse errors are retried
+    immediately, with the error message appended for the LM to fix.
+
     Parameters:
     - messages (list): List of messages to parse.
     - parse_fn (function): The parsing function to use.
@@ -120,29 +324,68 @@ def parse_retry_loop(
     - return_messages (bool): If True, returns the messages along with the parsed result.
     - verbose (bool): If True, prints verbose output.
     - return_type (str): The type of return value for message conversion.
+    - priority (int): Scheduling priority of the LM call, see utils/lm_scheduler.py. Lower is served first.
+    - scheduler (LMScheduler): Defaults to the process-wide scheduler.
+    - transport_tries (int): Number of LM call errors tolerated before giving up.
+    - backoff_base (float): Base delay in seconds for exponential backoff.
+    - backoff_max (float): Max delay in seconds between LM call retries.
+    - stream_fn (callable): If given, the response is streamed and cut off early, see stream_lm.
+      Only for return_type 'ai_message'.
 
     Returns:
     - dict or tuple: The parsed result, optionally with messages.
     """
     parsed_result = fallback if (fallback is not None) else {}
+    if scheduler is None:
+        scheduler = get_scheduler()
+    metrics = get_lm_metrics()
 
-    for i in range(parse_tries):
+    parse_success = False
+    parse_attempt = 0
+    transport_failures = 0
+    while parse_attempt < parse_tries:
         if verbose:
             print_messages(messages, f'{name} prompt')
 
-        logger.info(f'LM call n parse attempt {i + 1} / {parse_tries}\n')
+        logger.info(f'LM call n parse attempt {parse_attempt + 1} / {parse_tries}\n')
         try:
-            ai_message = lm.invoke(messages)
+            def call_lm():
+                queued = time.perf_counter()
+                with scheduler.slot_sync(priority, tokens=estimate_tokens(messages)) as slot:
+                    started = time.perf_counter()
+                    with cache_probe() as probe:
+                        if stream_fn is None:
+                            out = lm.invoke(messages)
+                        else:
+                            out = stream_lm(lm, messages, stream_fn)
+                    slot.tokens_used = usage_tokens(out)
+                metrics.record_call(
+                    name, out, time.perf_counter() - started, queue_wait=started - queued, cache_hit=probe.hit
+                )
+                return out
+
+            # identical concurrent requests share one API call. streamed responses may be truncated so never shared
+            key = request_key(messages, lm) if stream_fn is None else None
+            with span('lm.call'):
+                ai_message = single_flight.do(key, call_lm)
 
             msg = ai_message if return_type == 'ai_message' else AIMessage(
                 content=str_from_msg(ai_message, return_type))
             messages.append(msg)
+        except MalformedStreamError as e:
+            parse_attempt += 1
+            metrics.record_parse_error(name)
+            handle_malformed_stream(e, messages)
+            continue
         except Exception as e:
-            error_msg = f"Error during LM call! Retrying. Error msg:\n{str(e)}, {type(e).__name__}\n"
-            logger.warning(error_msg)
-            logger.warning(traceback.format_exc())
-            time.sleep(5)
+            transport_failures += 1
+            metrics.record_transport_error(name, rate_limited=is_rate_limit_error(e))
+            delay = handle_transport_error(e, transport_failures, transport_tries, scheduler, backoff_base, backoff_max)
+            if delay is None:
+                break
+            time.sleep(delay)
             continue
+        parse_attempt += 1
         if verbose or debug_mode:
             # print full thing incase error msg
             pp(ai_message)
@@ -152,17 +395,22 @@ def parse_retry_loop(
         if debug_mode:
             custom_breakpoint()
         try:
-            if parser:
-                parsed_result = parse_fn(ai_message, parser=parser)
-            else:
-                parsed_result = parse_fn(ai_message)
+            with span('lm.parse'):
+                if parser:
+                    parsed_result = parse_fn(ai_message, parser=parser)
+                else:
+                    parsed_result = parse_fn(ai_message)
+            parse_success = True
             break
         except Exception as e:
+            # parse errors are retried immediately with the error as feedback
             error_msg = f"Error during parsing! {str(e)}, {type(e).__name__}\n"
             logger.warning(error_msg)
             messages.append(HumanMessage(content=error_msg))
-    else:
+            metrics.record_parse_error(name)
+    if not parse_success:
         logger.error(f'All parse attempts failed')
+        metrics.record_failure(name)
 
     if return_messages:
         return {'parsed_result': parsed_result, 'messages': messages}
@@ -0,0 +1,39 @@
+"""
+The task the running code works for, so that per-task logs, timings and LM metrics stay apart when several
+tasks run at once (see BaseAgent.parallel_train_loop).
+
+    with task_scope(train_iter):
+        view.train_step()
+
+The scope is held in a ContextVar, so it follows the code into asyncio tasks and executors that copy the
+context. Code outside any task_scope is in the None scope, which is what sequential runs use throughout.
+"""
+import contextvars
+
+from contextlib import contextmanager
+
+_task_scope = contextvars.ContextVar('task_scope', default=None)
+
+
+def current_task_scope():
+    return _task_scope.get()
+
+
+@contextmanager
+def task_scope(scope):
+    """
+    Runs the enclosed block in the given task scope (eg the train_iter of the task).
+    """
+    token = _task_scope.set(scope)
+    try:
+        yield
+    finally:
+        _task_scope.reset(token)
+
+
+def run_in_task_scope(scope, fn, *args, **kwargs):
+    """
+    Calls fn in the given task scope, eg as the target of an executor's worker thread.
+    """
+    with task_scope(scope):
+        return fn(*args, **kwargs)
@@ -0,0 +1,191 @@
+"""
+Lightweight tracing: named spans timed with a monotonic clock and aggregated per task and per run.
+
+    with span('mem.retrieve'):
+        ...
+
+    @traced('code_parse.append_dependencies')
+    def append_dependencies(...):
+        ...
+
+Disabled by default. When disabled, span() returns a shared no-op context manager and traced fns call straight
+through, so leaving spans in hot paths costs about one attribute lookup. Enable with enable_tracing(), the
+COGNITIVE_BASE_TRACE=1 env var or the --trace arg.
+
+Each span records its total time and its self time (total minus time in nested spans), so per-name self times
+add up to the traced wall time without double counting. The parent span is tracked in a ContextVar, so nesting
+is correct across threads and asyncio tasks. Task timings are kept per task scope (see task_scope.py), so tasks
+running at once each get their own.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from .task_scope import current_task_scope
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class SpanStats:
+    __slots__ = ('count', 'total', 'self_total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.self_total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed, self_time):
+        self.count += 1
+        self.total += elapsed
+        self.self_total += self_time
+        self.max = max(self.max, elapsed)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'self_s': self.self_total,
+            'mean_s': self.total / self.count if self.count else 0.0,
+            'max_s': self.max,
+        }
+
+
+class Tracer:
+    """
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._task_stats = {}
+        self._run_stats = {}
+
+    def record(self, name, elapsed, self_time):
+        with self._lock:
+            task_stats = self._task_stats.setdefault(current_task_scope(), {})
+            for stats in (task_stats, self._run_stats):
+                span_stats = stats.get(name)
+                if span_stats is None:
+                    span_stats = stats[name] = SpanStats()
+                span_stats.add(elapsed, self_time)
+
+    @staticmethod
+    def _export(stats):
+        return {name: stats[name].as_dict() for name in sorted(stats)}
+
+    def task_timings(self):
+        """
+        Returns:
+            dict: span name -> {'count', 'total_s', 'self_s', 'mean_s', 'max_s'} since the last reset_task,
+                in the current task scope.
+        """
+        with self._lock:
+            return self._export(self._task_stats.get(current_task_scope(), {}))
+
+    def run_timings(self):
+        """
+        Returns:
+            dict: As task_timings, but over the whole run.
+        """
+        with self._lock:
+            return self._export(self._run_stats)
+
+    def reset_task(self):
+        with self._lock:
+            self._task_stats.pop(current_task_scope(), None)
+
+    def reset(self):
+        with self._lock:
+            self._task_stats = {}
+            self._run_stats = {}
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'start', 'child_time', 'parent', 'token')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.child_time = 0.0
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        if self.parent is not None:
+            self.parent.child_time += elapsed
+        # concurrent children (eg gathered asyncio tasks) can add up to more than the parent's wall time
+        self.tracer.record(self.name, elapsed, max(0.0, elapsed - self.child_time))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+_tracer = Tracer(enabled=os.getenv('COGNITIVE_BASE_TRACE', '').lower() not in ('', '0', 'false'))
+
+
+def get_tracer():
+    """
+    Returns the process-wide tracer.
+    """
+    return _tracer
+
+
+def enable_tracing(enabled=True):
+    _tracer.enabled = enabled
+    return _tracer
+
+
+def span(name):
+    """
+    Context manager timing the enclosed block as the named span. A shared no-op if tracing is disabled.
+    """
+    if not _tracer.enabled:
+        return _NULL_SPAN
+    return Span(_tracer, name)
+
+
+def traced(name=None):
+    """
+    Decorator timing each call of the fn (sync or async) as a span, named after the fn unless given.
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _tracer.enabled:
+                    return await fn(*args, **kwargs)
+                with Span(_tracer, span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return fn(*args, **kwargs)
+            with Span(_tracer, span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator